@@ -1,4 +1,4 @@
-import { PrismaClient } from '@prisma/client';
+import { Prisma, PrismaClient } from '@prisma/client';
 import { randomUUID } from 'crypto';
 import fs from 'fs';
 import path from 'path';
@@ -23,6 +23,8 @@ type GeoSeedRegion = {
   code: string;
   type: string;
   parent_region_id?: string | null;
+  latitude?: number | null;
+  longitude?: number | null;
 };
 
 type GeoSeedCity = {
@@ -49,12 +51,156 @@ type GeoSeedDataset = {
   cities: GeoSeedCity[];
 };
 
+type GeoChangeUpdate<T> = {
+  key: string;
+  changes: Partial<T>;
+};
+
+type GeoTableChanges<T> = {
+  insert: T[];
+  update: GeoChangeUpdate<T>[];
+  delete: string[];
+};
+
+type GeoSeedChangeset = {
+  metadata: Record<string, unknown>;
+  states: GeoTableChanges<GeoSeedState>;
+  regions: GeoTableChanges<GeoSeedRegion>;
+  cities: GeoTableChanges<GeoSeedCity>;
+};
+
+const GEO_DATA_PATH = path.resolve(__dirname, '../../data/geo/eu_locations.json');
+const GEO_CHANGESET_PATH = path.resolve(__dirname, '../../data/geo/eu_locations.changeset.json');
+// Copy of the dataset last loaded into the geo tables; fetch_eu_locations.py
+// diffs against it, and a changeset only applies on top of it.
+const GEO_SEEDED_PATH = path.resolve(__dirname, '../../data/geo/eu_locations.seeded.json');
+
 function loadGeoData(): GeoSeedDataset {
-  const dataPath = path.resolve(__dirname, '../../data/geo/eu_locations.json');
-  const file = fs.readFileSync(dataPath, 'utf-8');
+  const file = fs.readFileSync(GEO_DATA_PATH, 'utf-8');
   return JSON.parse(file) as GeoSeedDataset;
 }
 
+function loadGeoChangeset(): GeoSeedChangeset {
+  if (!fs.existsSync(GEO_CHANGESET_PATH)) {
+    throw new Error(
+      `GEO_SEED_MODE=changeset but ${path.basename(GEO_CHANGESET_PATH)} does not exist; rerun fetch_eu_locations.py ` +
+        'after a seed, or run the seed without GEO_SEED_MODE=changeset to reload the geography tables.',
+    );
+  }
+  const file = fs.readFileSync(GEO_CHANGESET_PATH, 'utf-8');
+  return JSON.parse(file) as GeoSeedChangeset;
+}
+
+function loadSeededGeneratedAt(): unknown {
+  if (!fs.existsSync(GEO_SEEDED_PATH)) {
+    return null;
+  }
+  const seeded = JSON.parse(fs.readFileSync(GEO_SEEDED_PATH, 'utf-8')) as GeoSeedDataset;
+  return seeded.metadata?.generated_at ?? null;
+}
+
+function assertChangesetApplies(changeset: GeoSeedChangeset, data: GeoSeedDataset) {
+  const base = changeset.metadata.base_generated_at;
+  const seeded = loadSeededGeneratedAt();
+  if (!base || base !== seeded) {
+    throw new Error(
+      `Geography changeset starts from the dataset generated at ${base ?? 'unknown'}, but the database was ` +
+        `last seeded from ${seeded ?? 'an unknown dataset'}; run the seed without GEO_SEED_MODE=changeset.`,
+    );
+  }
+  if (changeset.metadata.target_generated_at !== data.metadata.generated_at) {
+    throw new Error(
+      'Geography changeset does not lead to the current eu_locations.json; rerun fetch_eu_locations.py.',
+    );
+  }
+}
+
+function recordSeededGeoData() {
+  fs.copyFileSync(GEO_DATA_PATH, GEO_SEEDED_PATH);
+}
+
+function toStateRow(state: GeoSeedState) {
+  return {
+    state_id: state.state_id,
+    name: state.name,
+    iso2: state.iso2 ?? null,
+    iso3: state.iso3 ?? null,
+    wikidata_id: null,
+    latitude: null,
+    longitude: null,
+  };
+}
+
+function toRegionRow(region: GeoSeedRegion) {
+  return {
+    region_id: region.region_id,
+    state_id: region.state_id,
+    parent_region_id: region.parent_region_id ?? null,
+    name: region.name,
+    name_native: null,
+    code: region.code ?? null,
+    type: region.type,
+    seat: null,
+    wikidata_id: null,
+    latitude: region.latitude ?? null,
+    longitude: region.longitude ?? null,
+  };
+}
+
+function toCityRow(city: GeoSeedCity) {
+  return {
+    city_id: city.city_id,
+    state_id: city.state_id,
+    region_id: city.region_id ?? null,
+    entity_region_id: null,
+    name: city.name,
+    slug: city.slug,
+    city_code: city.city_code,
+    wikidata_id: null,
+    is_official_city: city.is_official_city,
+    latitude: city.latitude ?? null,
+    longitude: city.longitude ?? null,
+    population_2013: null,
+    num_settlements: null,
+    density_per_km2: null,
+    area_km2: city.area_km2 ?? null,
+  };
+}
+
+// Dataset fields that are persisted, keyed by dataset name -> column name.
+const STATE_COLUMNS: Record<string, string> = { name: 'name', iso2: 'iso2', iso3: 'iso3' };
+const REGION_COLUMNS: Record<string, string> = {
+  state_id: 'state_id',
+  parent_region_id: 'parent_region_id',
+  name: 'name',
+  code: 'code',
+  type: 'type',
+  latitude: 'latitude',
+  longitude: 'longitude',
+};
+const CITY_COLUMNS: Record<string, string> = {
+  state_id: 'state_id',
+  region_id: 'region_id',
+  name: 'name',
+  slug: 'slug',
+  city_code: 'city_code',
+  is_official_city: 'is_official_city',
+  latitude: 'latitude',
+  longitude: 'longitude',
+  area_km2: 'area_km2',
+};
+
+function toColumnChanges(changes: Record<string, unknown>, columns: Record<string, string>) {
+  const data: Record<string, unknown> = {};
+  for (const [field, value] of Object.entries(changes)) {
+    const column = columns[field];
+    if (column) {
+      data[column] = value ?? null;
+    }
+  }
+  return data;
+}
+
 async function seedGeoLov(data: GeoSeedDataset) {
   console.log('➡️  Resetting geography tables...');
 
@@ -65,15 +211,7 @@ async function seedGeoLov(data: GeoSeedDataset) {
   console.log('➡️  Seeding geo_states...');
   if (data.states.length) {
     await prisma.geo_states.createMany({
-      data: data.states.map((state) => ({
-        state_id: state.state_id,
-        name: state.name,
-        iso2: state.iso2 ?? null,
-        iso3: state.iso3 ?? null,
-        wikidata_id: null,
-        latitude: null,
-        longitude: null,
-      })),
+      data: data.states.map(toStateRow),
     });
   }
 
@@ -83,19 +221,7 @@ async function seedGeoLov(data: GeoSeedDataset) {
     for (let i = 0; i < data.regions.length; i += chunkSize) {
       const chunk = data.regions.slice(i, i + chunkSize);
       await prisma.geo_regions.createMany({
-        data: chunk.map((region) => ({
-          region_id: region.region_id,
-          state_id: region.state_id,
-          parent_region_id: region.parent_region_id ?? null,
-          name: region.name,
-          name_native: null,
-          code: region.code ?? null,
-          type: region.type,
-          seat: null,
-          wikidata_id: null,
-          latitude: null,
-          longitude: null,
-        })),
+        data: chunk.map(toRegionRow),
       });
     }
   }
@@ -106,23 +232,7 @@ async function seedGeoLov(data: GeoSeedDataset) {
     for (let i = 0; i < data.cities.length; i += chunkSize) {
       const chunk = data.cities.slice(i, i + chunkSize);
       await prisma.geo_cities.createMany({
-        data: chunk.map((city) => ({
-          city_id: city.city_id,
-          state_id: city.state_id,
-          region_id: city.region_id ?? null,
-          entity_region_id: null,
-          name: city.name,
-          slug: city.slug,
-          city_code: city.city_code,
-          wikidata_id: null,
-          is_official_city: city.is_official_city,
-          latitude: city.latitude ?? null,
-          longitude: city.longitude ?? null,
-          population_2013: null,
-          num_settlements: null,
-          density_per_km2: null,
-          area_km2: city.area_km2 ?? null,
-        })),
+        data: chunk.map(toCityRow),
       });
     }
   }
@@ -132,6 +242,75 @@ async function seedGeoLov(data: GeoSeedDataset) {
   );
 }
 
+async function applyGeoChangeset(changeset: GeoSeedChangeset) {
+  console.log('➡️  Applying geography changeset...');
+  const now = new Date();
+
+  await prisma.$transaction(
+    async (tx) => {
+      // Inserts parents-first, then updates, then deletes children-first so
+      // foreign keys hold at every step (the generator orders region lists).
+      for (const state of changeset.states.insert) {
+        const row = { ...toStateRow(state), updated_at: now };
+        await tx.geo_states.upsert({ where: { state_id: state.state_id }, update: row, create: row });
+      }
+      for (const region of changeset.regions.insert) {
+        const row = { ...toRegionRow(region), updated_at: now };
+        await tx.geo_regions.upsert({ where: { region_id: region.region_id }, update: row, create: row });
+      }
+      for (const city of changeset.cities.insert) {
+        const row = { ...toCityRow(city), updated_at: now };
+        await tx.geo_cities.upsert({ where: { city_id: city.city_id }, update: row, create: row });
+      }
+
+      for (const { key, changes } of changeset.states.update) {
+        const data = toColumnChanges(changes, STATE_COLUMNS);
+        if (Object.keys(data).length) {
+          await tx.geo_states.updateMany({
+            where: { state_id: key },
+            data: { ...data, updated_at: now } as Prisma.geo_statesUpdateManyMutationInput,
+          });
+        }
+      }
+      for (const { key, changes } of changeset.regions.update) {
+        const data = toColumnChanges(changes, REGION_COLUMNS);
+        if (Object.keys(data).length) {
+          await tx.geo_regions.updateMany({
+            where: { region_id: key },
+            data: { ...data, updated_at: now } as Prisma.geo_regionsUncheckedUpdateManyInput,
+          });
+        }
+      }
+      for (const { key, changes } of changeset.cities.update) {
+        const data = toColumnChanges(changes, CITY_COLUMNS);
+        if (Object.keys(data).length) {
+          await tx.geo_cities.updateMany({
+            where: { city_id: key },
+            data: { ...data, updated_at: now } as Prisma.geo_citiesUncheckedUpdateManyInput,
+          });
+        }
+      }
+
+      if (changeset.cities.delete.length) {
+        await tx.geo_cities.deleteMany({ where: { city_id: { in: changeset.cities.delete } } });
+      }
+      for (const regionId of changeset.regions.delete) {
+        await tx.geo_regions.deleteMany({ where: { region_id: regionId } });
+      }
+      if (changeset.states.delete.length) {
+        await tx.geo_states.deleteMany({ where: { state_id: { in: changeset.states.delete } } });
+      }
+    },
+    { timeout: 120_000 },
+  );
+
+  const count = (table: GeoTableChanges<unknown>) =>
+    `+${table.insert.length} ~${table.update.length} -${table.delete.length}`;
+  console.log(
+    `✅ Applied changeset: states ${count(changeset.states)}, regions ${count(changeset.regions)}, cities ${count(changeset.cities)}`,
+  );
+}
+
 async function syncAdminRegionsFromStates() {
   console.log('➡️  Syncing admin regions from geo_states...');
   const states = await prisma.geo_states.findMany({
@@ -302,7 +481,16 @@ async function main() {
   console.log('🌱 Starting database seed...');
 
   const geoData = loadGeoData();
-  await seedGeoLov(geoData);
+  // GEO_SEED_MODE=changeset applies the diff written by fetch_eu_locations.py
+  // against the last seeded dataset instead of wiping and reloading geo tables.
+  if (process.env.GEO_SEED_MODE === 'changeset') {
+    const changeset = loadGeoChangeset();
+    assertChangesetApplies(changeset, geoData);
+    await applyGeoChangeset(changeset);
+  } else {
+    await seedGeoLov(geoData);
+  }
+  recordSeededGeoData();
   await syncAdminRegionsFromStates();
 
   const { testUser, superGuruUser } = await ensureBaselineUsers();
@@ -2,6 +2,7 @@ import { PrismaClient } from '@prisma/client';
 
 const prisma = new PrismaClient();
 
+// Mirrored by ADMIN_LEVEL_BY_TYPE in scripts/data/geo_pgcopy.py (COPY bulk load); keep them in sync.
 const LEVEL_BY_TYPE: Record<string, number> = {
   state: 1,
   entity: 2,
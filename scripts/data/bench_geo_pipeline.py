@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Benchmark the geography pipeline stages against recorded HTTP fixtures.
+
+Fixtures are an ``HttpCache`` directory: ``--record`` runs every stage online
+once and keeps the MediaWiki, Wikidata and GISCO responses; later runs replay
+them with the cache in offline mode, so no request leaves the machine. Each
+stage is timed over ``--repeat`` runs (best time wins) and then run once more
+under ``tracemalloc`` for its peak Python allocation. Results are compared
+with a stored baseline; a stage that got slower or hungrier than
+``--tolerance`` allows, or whose record count changed, is flagged and the
+script exits with status 1.
+
+Usage:
+    python3 scripts/data/bench_geo_pipeline.py --record         # needs network
+    python3 scripts/data/bench_geo_pipeline.py --save-baseline  # before a change
+    python3 scripts/data/bench_geo_pipeline.py                  # after it
+
+Fixtures and baseline default to data/geo/.bench/ (not committed, since
+timings are machine-specific); point ``--fixtures``/``--baseline`` elsewhere
+to share them.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import fetch_bih_locations as bih
+import fetch_eu_locations as eu
+from http_cache import CacheMiss, HttpCache
+from http_client import HttpClient
+
+BENCH_DIR = Path(__file__).resolve().parents[2] / "data" / "geo" / ".bench"
+DEFAULT_FIXTURES_DIR = BENCH_DIR / "fixtures"
+DEFAULT_BASELINE_PATH = BENCH_DIR / "baseline.json"
+DEFAULT_REPEAT = 3
+DEFAULT_TOLERANCE = 0.25
+# Differences below these floors are noise, whatever the ratio says.
+MIN_SECONDS_DELTA = 0.005
+MIN_BYTES_DELTA = 1 << 20
+
+
+@dataclass
+class BenchStage:
+    name: str
+    run: Callable[[Dict[str, Any]], Any]
+
+
+@dataclass
+class StageResult:
+    name: str
+    seconds: float
+    peak_bytes: int
+    records: Optional[int]
+
+
+def _count(value: Any) -> Optional[int]:
+    if isinstance(value, tuple):
+        counts = [_count(item) for item in value]
+        return sum(count for count in counts if count is not None)
+    if isinstance(value, int):
+        return value
+    if isinstance(value, bih.WikidataResolver):
+        return len(value.cache)
+    if isinstance(value, dict) and "cities" in value:
+        return sum(len(value.get(table) or []) for table in ("states", "regions", "cities"))
+    if isinstance(value, (list, dict)):
+        return len(value)
+    return None
+
+
+def bih_stages(client: HttpClient, scratch: Path) -> List[BenchStage]:
+    def wikibase_ids(ctx: Dict[str, Any]) -> Dict[str, str]:
+        return bih.fetch_wikibase_ids([row["wiki_title"] for row in ctx["bih.fetch_municipality_rows"]], client)
+
+    def qids(ctx: Dict[str, Any]) -> List[str]:
+        return list(ctx["bih.fetch_wikibase_ids"].values())
+
+    def prefetch(ctx: Dict[str, Any]) -> bih.WikidataResolver:
+        resolver = bih.WikidataResolver(client)
+        resolver.ensure_entities(
+            qids(ctx) + list(bih.ENTITY_QIDS) + list(bih.CANTON_QIDS) + [bih.STATE_QID]
+        )
+        bih.prefetch_hierarchy(resolver, qids(ctx))
+        return resolver
+
+    def resolve(ctx: Dict[str, Any]) -> List[Dict[str, Optional[str]]]:
+        resolver = ctx["bih.prefetch_hierarchy"]
+        graph = bih.AncestorGraph(resolver)
+        return [bih.resolve_hierarchy(resolver, qid, graph) for qid in qids(ctx)]
+
+    return [
+        BenchStage("bih.fetch_municipality_rows", lambda ctx: bih.fetch_municipality_rows(client)),
+        BenchStage("bih.fetch_wikibase_ids", wikibase_ids),
+        BenchStage("bih.prefetch_hierarchy", prefetch),
+        BenchStage("bih.resolve_hierarchy", resolve),
+        BenchStage("bih.build", lambda ctx: bih.build(client)),
+        BenchStage("bih.write_output", lambda ctx: bih.write_output(ctx["bih.build"], scratch / "bih_locations.json")),
+    ]
+
+
+def eu_stages(client: HttpClient, scratch: Path) -> List[BenchStage]:
+    def nuts(ctx: Dict[str, Any]) -> Any:
+        return eu.fetch_nuts_regions(ctx["eu.fetch_eu_member_states"], client)
+
+    def cities(ctx: Dict[str, Any]) -> List[dict]:
+        return eu.fetch_urban_cities(ctx["eu.fetch_eu_member_states"], client)
+
+    def assemble(ctx: Dict[str, Any]) -> dict:
+        nuts_level2, nuts_level3 = ctx["eu.fetch_nuts_regions"]
+        records = eu.build_gisco_records(
+            ctx["eu.fetch_eu_member_states"], nuts_level2, nuts_level3, ctx["eu.fetch_urban_cities"]
+        )
+        return eu.assemble_dataset([records])
+
+    def place(ctx: Dict[str, Any]) -> int:
+        # Placing links cities in place, so each run starts from fresh records.
+        nuts_level2, nuts_level3 = ctx["eu.fetch_nuts_regions"]
+        records = eu.build_gisco_records(
+            ctx["eu.fetch_eu_member_states"], nuts_level2, nuts_level3, ctx["eu.fetch_urban_cities"]
+        )
+        return eu.place_in_regions(records, nuts_level2, nuts_level3)
+
+    def slugify(ctx: Dict[str, Any]) -> List[str]:
+        dataset = ctx["eu.build_gisco_records"]
+        names = [record["name"] for table in ("states", "regions", "cities") for record in dataset[table]]
+        return [eu.slugify(name) for name in names]
+
+    return [
+        BenchStage("eu.fetch_eu_member_states", lambda ctx: eu.fetch_eu_member_states(client)),
+        BenchStage("eu.fetch_nuts_regions", nuts),
+        BenchStage("eu.fetch_urban_cities", cities),
+        BenchStage("eu.build_gisco_records", assemble),
+        BenchStage("eu.place_in_regions", place),
+        BenchStage("eu.slugify", slugify),
+        BenchStage("eu.write_output", lambda ctx: eu.write_output(ctx["eu.build_gisco_records"], scratch / "eu_locations.json")),
+    ]
+
+
+def measure(stage: BenchStage, ctx: Dict[str, Any], repeat: int) -> StageResult:
+    best = float("inf")
+    value: Any = None
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        value = stage.run(ctx)
+        best = min(best, time.perf_counter() - started)
+
+    tracemalloc.start()
+    try:
+        stage.run(ctx)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    ctx[stage.name] = value
+    return StageResult(stage.name, best, peak, _count(value))
+
+
+def run_suite(stages: List[BenchStage], repeat: int, quiet: bool = True) -> List[StageResult]:
+    ctx: Dict[str, Any] = {}
+    results = []
+    for stage in stages:
+        sink = io.StringIO()
+        with contextlib.redirect_stdout(sink), contextlib.redirect_stderr(sink):
+            result = measure(stage, ctx, repeat)
+        if not quiet:
+            print(sink.getvalue(), end="")
+        results.append(result)
+    return results
+
+
+def load_baseline(path: Path) -> Dict[str, dict]:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8")).get("stages", {})
+
+
+def save_baseline(results: List[StageResult], path: Path) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {
+        "generated_at": datetime.now(UTC).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "stages": {
+            result.name: {"seconds": result.seconds, "peak_bytes": result.peak_bytes, "records": result.records}
+            for result in results
+        },
+    }
+    path.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+    return path
+
+
+def regressions(result: StageResult, baseline: Optional[dict], tolerance: float) -> List[str]:
+    if not baseline:
+        return []
+    flags = []
+    seconds = baseline["seconds"]
+    if result.seconds > seconds * (1 + tolerance) and result.seconds - seconds > MIN_SECONDS_DELTA:
+        flags.append("time")
+    peak = baseline["peak_bytes"]
+    if result.peak_bytes > peak * (1 + tolerance) and result.peak_bytes - peak > MIN_BYTES_DELTA:
+        flags.append("memory")
+    if baseline.get("records") is not None and result.records != baseline["records"]:
+        flags.append("records")
+    return flags
+
+
+def _change(current: float, previous: Optional[float]) -> str:
+    if not previous:
+        return "-"
+    return f"{(current - previous) / previous * 100:+.0f}%"
+
+
+def report(results: List[StageResult], baseline: Dict[str, dict], tolerance: float) -> int:
+    print(f"{'stage':<30} {'time ms':>9} {'Δ':>6} {'peak MB':>8} {'Δ':>6} {'records':>8}  flags")
+    flagged = 0
+    for result in results:
+        previous = baseline.get(result.name)
+        flags = regressions(result, previous, tolerance)
+        flagged += bool(flags)
+        print(
+            f"{result.name:<30} {result.seconds * 1000:>9.1f} "
+            f"{_change(result.seconds, previous and previous['seconds']):>6} "
+            f"{result.peak_bytes / 1e6:>8.1f} "
+            f"{_change(result.peak_bytes, previous and previous['peak_bytes']):>6} "
+            f"{'' if result.records is None else result.records:>8}  "
+            f"{'REGRESSED: ' + ', '.join(flags) if flags else ''}"
+        )
+    return flagged
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the geography pipeline against recorded fixtures.")
+    parser.add_argument("--fixtures", type=Path, default=DEFAULT_FIXTURES_DIR, help="Recorded HTTP fixtures directory.")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE_PATH, help="Baseline JSON to compare with.")
+    parser.add_argument("--record", action="store_true", help="Fetch from the network and (re)record the fixtures.")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline.")
+    parser.add_argument("--suite", choices=("all", "bih", "eu"), default="all", help="Which pipeline to benchmark.")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Timed runs per stage (best is kept).")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help="Allowed slowdown / memory growth vs the baseline, as a fraction (default 0.25).",
+    )
+    parser.add_argument("--verbose", action="store_true", help="Show the stages' own progress output.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    cache = HttpCache(args.fixtures, offline=not args.record)
+    repeat = 1 if args.record else args.repeat
+    bih_client = HttpClient(user_agent=bih.USER_AGENT, cache=cache)
+    eu_client = eu.create_client(cache)
+
+    results: List[StageResult] = []
+    try:
+        with tempfile.TemporaryDirectory(prefix="geo-bench-") as scratch:
+            if args.suite in ("all", "bih"):
+                results += run_suite(bih_stages(bih_client, Path(scratch)), repeat, quiet=not args.verbose)
+            if args.suite in ("all", "eu"):
+                results += run_suite(eu_stages(eu_client, Path(scratch)), repeat, quiet=not args.verbose)
+    except (CacheMiss, eu.DataFetchError) as error:
+        print(f"❌ Missing fixture: {error}\n   Record fixtures first with --record.")
+        return 1
+    finally:
+        bih_client.close()
+        eu_client.close()
+
+    if args.record:
+        print(f"Recorded {cache.summary()} into {args.fixtures}")
+        return 0
+
+    baseline = {} if args.save_baseline else load_baseline(args.baseline)
+    flagged = report(results, baseline, args.tolerance)
+    if args.save_baseline:
+        print(f"Baseline written to: {save_baseline(results, args.baseline)}")
+        return 0
+    if not baseline:
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one.")
+    elif flagged:
+        print(f"\n⚠️  {flagged} stage(s) regressed beyond {args.tolerance:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
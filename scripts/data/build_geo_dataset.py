@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Build data/geo/eu_locations.json from every registered geography source.
+
+Each source (Eurostat / GISCO, the Bosnia & Herzegovina Wikipedia/Wikidata
+scraper, ...) is a ``SourceAdapter``. Their fetch and transform stages run
+concurrently through ``geo_pipeline.run_stages``. The results are merged in
+memory, so there is no need to run fetch_bih_locations.py first and re-read
+its output. The BiH payload is still written to bih_locations.json.
+
+Usage:
+    python3 scripts/data/build_geo_dataset.py [--sources eu,bih] [--offline]
+
+Takes the same cache, concurrency, checkpoint (``--resume``), selection
+(``--states``/``--regions``) and sidecar flags as fetch_eu_locations.py.
+Sources that cannot contribute to the selection are not run.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from typing import Any, Dict, List, Optional
+
+import fetch_bih_locations as bih
+import fetch_eu_locations as eu
+from geo_changeset import load_dataset
+from geo_checkpoint import RunCheckpoint, add_checkpoint_arguments, checkpoint_from_args
+from geo_pipeline import (
+    MERGE_STAGE,
+    SOURCES,
+    SourceAdapter,
+    Stage,
+    add_publish_arguments,
+    build_stages,
+    register_source,
+    run_stages,
+)
+from geo_selection import add_selection_arguments, merge_into, selection_from_args
+from http_cache import CacheMiss, HttpCache, add_cache_arguments, cache_from_args
+from http_client import HttpClient, add_client_arguments, client_options_from_args
+
+
+@register_source
+class GiscoSource(SourceAdapter):
+    name = "eu"
+    description = "EU member states, NUTS 2/3 regions and Urban Audit cities (Eurostat / GISCO)"
+
+    def __init__(self, args: argparse.Namespace, cache: HttpCache, checkpoint: Optional[RunCheckpoint] = None):
+        super().__init__(args, cache, checkpoint)
+        self.client = eu.create_client(cache, **client_options_from_args(args))
+
+    def fetch(self) -> eu.GiscoLayers:
+        return eu.fetch_gisco_datasets(self.client, self.checkpoint, self.selection)
+
+    def transform(self, raw: eu.GiscoLayers) -> dict:
+        records = eu.build_gisco_records(*raw)
+        eu.place_in_regions(records, raw[1], raw[2])
+        return self.selection.filter(records)
+
+    def covers_selection(self) -> bool:
+        return self.selection.reaches_beyond({eu.BIH_STATE_ID})
+
+    def sources(self) -> Dict[str, str]:
+        return dict(eu.GISCO_SOURCES)
+
+    @property
+    def request_count(self) -> int:
+        return self.client.request_count
+
+    def close(self) -> None:
+        self.client.close()
+
+
+@register_source
+class BihSource(SourceAdapter):
+    name = "bih"
+    description = "Bosnia & Herzegovina municipalities, cantons and entities (Wikipedia / Wikidata)"
+
+    def __init__(self, args: argparse.Namespace, cache: HttpCache, checkpoint: Optional[RunCheckpoint] = None):
+        super().__init__(args, cache, checkpoint)
+        self.client = HttpClient(user_agent=bih.USER_AGENT, cache=cache, **client_options_from_args(args))
+
+    def fetch(self) -> Dict[str, Any]:
+        resolver = bih.resolver_from_args(self.args, self.client)
+        try:
+            return bih.build(self.client, resolver=resolver, checkpoint=self.checkpoint)
+        finally:
+            resolver.cache.close()
+
+    def transform(self, raw: Dict[str, Any]) -> dict:
+        return self.selection.filter(eu.bih_records(raw))
+
+    def covers_selection(self) -> bool:
+        return self.selection.includes_state(eu.BIH_STATE_ID)
+
+    def write(self, payload: Dict[str, Any]) -> None:
+        output_path = bih.write_output(payload)
+        if self.args.parquet:
+            for path in bih.export_bih_dataset(payload, output_path):
+                print(f"   Columnar table written to: {path}")
+
+    def sources(self) -> Dict[str, str]:
+        return {"bih": bih.SOURCE_URL}
+
+    @property
+    def request_count(self) -> int:
+        return self.client.request_count
+
+    def close(self) -> None:
+        self.client.close()
+
+    def stages(self) -> List[Stage]:
+        return super().stages() + [
+            Stage(f"{self.name}.write", lambda results: self.write(results[self.fetch_stage]), (self.fetch_stage,)),
+        ]
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build data/geo/eu_locations.json from all geography sources.")
+    add_cache_arguments(parser)
+    add_client_arguments(parser)
+    bih.add_resolver_arguments(parser)
+    add_checkpoint_arguments(parser)
+    add_selection_arguments(parser)
+    parser.add_argument(
+        "--sources",
+        default=",".join(SOURCES),
+        help=f"Comma-separated sources to merge, in output order (default: {','.join(SOURCES)}).",
+    )
+    add_publish_arguments(parser)
+    args = parser.parse_args(argv)
+    args.sources = [name.strip() for name in args.sources.split(",") if name.strip()]
+    unknown = [name for name in args.sources if name not in SOURCES]
+    if unknown or not args.sources:
+        parser.error(f"Unknown sources {unknown}; choose from {', '.join(SOURCES)}")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    selection = selection_from_args(args)
+    previous = load_dataset(eu.OUTPUT_PATH) if selection.partial else None
+    if selection.partial and previous is None:
+        print(f"❌ A partial build merges into {eu.OUTPUT_PATH}, which does not exist; run a full build first")
+        return 1
+    cache = cache_from_args(args)
+    checkpoint = checkpoint_from_args(args, selection.run_name("build_geo_dataset"))
+    adapters = [SOURCES[name](args, cache, checkpoint) for name in args.sources]
+    skipped = [adapter for adapter in adapters if not adapter.covers_selection()]
+    for adapter in skipped:
+        adapter.close()
+    adapters = [adapter for adapter in adapters if adapter not in skipped]
+    if not adapters:
+        print(f"❌ None of the sources {', '.join(args.sources)} covers {selection.describe()}")
+        return 1
+
+    print("=" * 72)
+    print(f"Building geography dataset from: {', '.join(adapter.name for adapter in adapters)}")
+    if selection.partial:
+        print(f"Partial build: {selection.describe()}; other states are kept from {eu.OUTPUT_PATH.name}")
+    print("=" * 72)
+
+    source_urls: Dict[str, str] = {}
+    for adapter in adapters:
+        source_urls.update(adapter.sources())
+    stages = build_stages(adapters, lambda parts: eu.assemble_dataset(parts, source_urls))
+
+    try:
+        results = run_stages(stages, on_done=lambda name, seconds: print(f"   ✓ {name} ({seconds:.1f}s)"))
+    except (eu.DataFetchError, CacheMiss) as error:
+        print(f"\n❌ Data download failed: {error}")
+        print(f"   Finished stages are kept in {checkpoint.run_dir}; rerun with --resume to continue.")
+        return 1
+    except Exception:
+        print(f"\n   Finished stages are kept in {checkpoint.run_dir}; rerun with --resume to continue.")
+        raise
+    finally:
+        for adapter in adapters:
+            adapter.close()
+        cache.evict()
+    requests_made = sum(adapter.request_count for adapter in adapters)
+    print(f"   {requests_made} HTTP requests, {cache.summary()}")
+    if args.resume:
+        print(f"   Resumed: {checkpoint.summary()}")
+
+    dataset = results[MERGE_STAGE]
+    if selection.partial:
+        if not any(dataset[table] for table in ("states", "regions", "cities")):
+            print(f"\n❌ Nothing matched {selection.describe()}; {eu.OUTPUT_PATH.name} is left unchanged")
+            return 1
+        dataset = merge_into(previous, dataset, selection)
+    output_path = eu.publish_dataset(
+        dataset, parquet=args.parquet, spatial_index=args.spatial_index, pg_copy=args.pg_copy
+    )
+    checkpoint.finish()
+
+    print("\nSuccess!")
+    print(f"   States: {dataset['metadata']['counts']['states']}")
+    print(f"   Regions: {dataset['metadata']['counts']['regions']}")
+    print(f"   Cities: {dataset['metadata']['counts']['cities']}")
+    print(f"Output written to: {output_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        print("\n⚠️  Interrupted by user")
+        sys.exit(1)
@@ -5,10 +5,24 @@ Fetch Bosnia and Herzegovina administrative LOV data from Wikipedia/Wikidata.
 Outputs a structured JSON file under data/geo/bih_locations.json containing
 state, region (entities/cantons/district) and city/municipality records with
 local names, Wikidata IDs, and coordinates.
+
+Entity facts come from ``wbgetentities`` by default. ``--resolver sparql``
+asks the Wikidata Query Service instead (``--sparql-endpoint`` points it at a
+mirror or a local stand-in): a handful of bulk queries return P31, P131,
+P625 and labels for every municipality and its whole P131 closure. Either
+way the facts are kept as compact records in an SQLite store next to the
+HTTP cache (see wikidata_store.py), so a repeat run only fetches entities it
+has not seen within the cache TTL.
+
+Each stage (municipality table, title -> QID map, Wikidata entity chunks) is
+checkpointed under data/geo/.runs/bih_locations/ as it completes; after a
+failure, ``--resume`` continues from the first stage or chunk that was not
+finished (see geo_checkpoint.py).
 """
 
 from __future__ import annotations
 
+import argparse
 import json
 import math
 import os
@@ -17,16 +31,33 @@ import sys
 from collections import deque
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
-
-import requests
-from bs4 import BeautifulSoup
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from geo_checkpoint import Journal, RunCheckpoint, add_checkpoint_arguments, checkpoint_from_args
+from geo_columnar import export_bih_dataset
+from geo_metrics import RunMetrics, add_metrics_arguments, http_probes, metrics_path_for, profile_dir_for
+from http_cache import CacheMiss, add_cache_arguments, cache_from_args
+from http_client import HttpClient, add_client_arguments, chunked, client_options_from_args
+from transliteration import ascii_slug, to_ascii, to_latin
+from wiki_tables import (
+    Column,
+    TableSpec,
+    extract_table,
+    link_slug,
+    link_title,
+    parse_numeric_float,
+    parse_numeric_int,
+    row_background,
+)
+from wikidata_store import EntityRecord, EntityStore, entity_store_from_args
 
 ROOT = Path(__file__).resolve().parents[2]
 DATA_PATH = ROOT / "data" / "geo" / "bih_locations.json"
 
 WIKI_API = "https://bs.wikipedia.org/w/api.php"
 WIKIDATA_API = "https://www.wikidata.org/w/api.php"
+WIKIDATA_SPARQL = "https://query.wikidata.org/sparql"
+SOURCE_URL = "https://bs.wikipedia.org/wiki/Općine_Bosne_i_Hercegovine"
 USER_AGENT = "pustikorijen-data-fetcher/0.1 (https://github.com/bohhem/pustikorijen)"
 
 STATE_QID = "Q225"  # Bosna i Hercegovina
@@ -57,47 +88,16 @@ MUNICIPALITY_TYPES = {
     "Q902814",  # city municipality of Republika Srpska
 }
 CANTON_TYPE = "Q18279"
-
-CHAR_REPLACEMENTS = {
-    "š": "s",
-    "Š": "s",
-    "č": "c",
-    "Č": "c",
-    "ć": "c",
-    "Ć": "c",
-    "ž": "z",
-    "Ž": "z",
-    "đ": "dj",
-    "Đ": "dj",
-    "á": "a",
-    "Á": "a",
-    "é": "e",
-    "É": "e",
-    "í": "i",
-    "Í": "i",
-    "ó": "o",
-    "Ó": "o",
-    "ú": "u",
-    "Ú": "u",
-}
-
-
-def normalize_ascii(value: str) -> str:
-    normalized = value
-    for src, dst in CHAR_REPLACEMENTS.items():
-        normalized = normalized.replace(src, dst)
-    return normalized
+HIERARCHY_MAX_DEPTH = 5
 
 
 def slugify(name: str) -> str:
-    ascii_name = normalize_ascii(name)
-    result = re.sub(r"[^a-zA-Z0-9]+", "-", ascii_name.lower()).strip("-")
-    return result
+    return ascii_slug(name)
 
 
 def generate_city_code(name: str, slug: Optional[str]) -> str:
     source = slug or slugify(name)
-    ascii_source = normalize_ascii(source).upper()
+    ascii_source = to_ascii(source).upper()
     ascii_source = re.sub(r"[^A-Z0-9]", "", ascii_source)
     if not ascii_source:
         ascii_source = "BIH"
@@ -105,48 +105,30 @@ def generate_city_code(name: str, slug: Optional[str]) -> str:
     return code
 
 
-def contains_cyrillic(text: str) -> bool:
-    return any("\u0400" <= ch <= "\u04FF" for ch in text)
+WIKIBASE_CHUNK_SIZE = 40
+LABEL_LANGUAGES = ("bs", "sh", "hr", "sr", "en")
 
 
-def request_json(url: str, params: Dict[str, Any]) -> Dict[str, Any]:
-    resp = requests.get(url, params=params, headers={"User-Agent": USER_AGENT})
-    resp.raise_for_status()
-    return resp.json()
+def request_json(url: str, params: Dict[str, Any], client: Optional[HttpClient] = None) -> Dict[str, Any]:
+    client = client or HttpClient(user_agent=USER_AGENT)
+    return client.get_json(url, params)
 
 
-def parse_numeric_int(text: str) -> Optional[int]:
-    cleaned = text.split("(")[0].strip()
-    if not cleaned:
-        return None
-    cleaned = (
-        cleaned.replace(".", "")
-        .replace(",", "")
-        .replace(" ", "")
-        .replace("\xa0", "")
-        .replace("\u00a0", "")
-    )
-    return int(cleaned) if cleaned.isdigit() else None
-
-
-def parse_numeric_float(text: str) -> Optional[float]:
-    cleaned = text.split("(")[0].strip()
-    if not cleaned:
-        return None
-    cleaned = (
-        cleaned.replace(".", "")
-        .replace(" ", "")
-        .replace("\xa0", "")
-        .replace("\u00a0", "")
-        .replace(",", ".")
-    )
-    try:
-        return float(cleaned)
-    except ValueError:
-        return None
+MUNICIPALITY_TABLE = TableSpec(
+    columns=(
+        Column("display_name", index=0),
+        Column("wiki_title", index=0, value=link_title),
+        Column("wiki_slug", index=0, value=link_slug),
+        Column("num_settlements", index=1, parse=parse_numeric_int),
+        Column("population_2013", index=2, parse=parse_numeric_int),
+        Column("density_per_km2", index=3, parse=parse_numeric_float),
+        Column("area_km2", index=4, parse=parse_numeric_float),
+    ),
+    row_fields={"is_official_city": row_background("#bbf3ff")},  # cities are highlighted on the page
+)
 
 
-def fetch_municipality_rows() -> List[Dict[str, Any]]:
+def fetch_municipality_rows(client: Optional[HttpClient] = None) -> List[Dict[str, Any]]:
     html = request_json(
         WIKI_API,
         {
@@ -155,49 +137,21 @@ def fetch_municipality_rows() -> List[Dict[str, Any]]:
             "prop": "text",
             "format": "json",
         },
+        client,
     )["parse"]["text"]["*"]
-    soup = BeautifulSoup(html, "html.parser")
-    table = soup.find("table", {"class": "wikitable"})
-    if table is None:
+    rows = extract_table(html, MUNICIPALITY_TABLE)
+    if rows is None:
         raise RuntimeError("Could not find municipality table on Wikipedia page.")
-
-    rows: List[Dict[str, Any]] = []
-    for tr in table.find_all("tr"):
-        cells = tr.find_all("td")
-        if not cells:
-            continue
-        name_cell = cells[0]
-        display_name = name_cell.get_text(" ", strip=True)
-        link = name_cell.find("a")
-        wiki_title = link["title"] if link else display_name
-        wiki_link = link["href"] if link else None
-        wiki_slug = None
-        if wiki_link and wiki_link.startswith("/wiki/"):
-            wiki_slug = wiki_link.split("/wiki/")[1]
-
-        entry = {
-            "display_name": display_name,
-            "wiki_title": wiki_title,
-            "wiki_slug": wiki_slug,
-            "num_settlements": parse_numeric_int(cells[1].get_text(" ", strip=True)) if len(cells) > 1 else None,
-            "population_2013": parse_numeric_int(cells[2].get_text(" ", strip=True)) if len(cells) > 2 else None,
-            "density_per_km2": parse_numeric_float(cells[3].get_text(" ", strip=True)) if len(cells) > 3 else None,
-            "area_km2": parse_numeric_float(cells[4].get_text(" ", strip=True)) if len(cells) > 4 else None,
-            "is_official_city": tr.get("bgcolor", "").lower() == "#bbf3ff",
-        }
-        rows.append(entry)
-
     if not rows:
         raise RuntimeError("Municipality table parsing yielded zero rows.")
     return rows
 
 
-def fetch_wikibase_ids(titles: List[str]) -> Dict[str, str]:
-    title_to_qid: Dict[str, str] = {}
-    chunk_size = 40
-    for i in range(0, len(titles), chunk_size):
-        chunk = titles[i : i + chunk_size]
-        data = request_json(
+def fetch_wikibase_ids(titles: List[str], client: Optional[HttpClient] = None) -> Dict[str, str]:
+    client = client or HttpClient(user_agent=USER_AGENT)
+
+    def fetch_chunk(chunk: List[str]) -> Dict[str, Any]:
+        return request_json(
             WIKI_API,
             {
                 "action": "query",
@@ -206,7 +160,11 @@ def fetch_wikibase_ids(titles: List[str]) -> Dict[str, str]:
                 "titles": "|".join(chunk),
                 "format": "json",
             },
+            client,
         )
+
+    title_to_qid: Dict[str, str] = {}
+    for data in client.map(fetch_chunk, chunked(list(dict.fromkeys(titles)), WIKIBASE_CHUNK_SIZE)):
         pages = data.get("query", {}).get("pages", {})
         for page in pages.values():
             title = page.get("title")
@@ -217,113 +175,417 @@ def fetch_wikibase_ids(titles: List[str]) -> Dict[str, str]:
 
 
 class WikidataResolver:
-    def __init__(self):
-        self.cache: Dict[str, Dict[str, Any]] = {}
+    chunk_size = WIKIBASE_CHUNK_SIZE
+    store_namespace = "wbgetentities"
+
+    def __init__(self, client: Optional[HttpClient] = None, store: Optional[EntityStore] = None):
+        self.cache = store if store is not None else EntityStore(None, self.namespace())
+        self.client = client or HttpClient(user_agent=USER_AGENT)
+        self.journal: Optional[Journal] = None
+        self.hits = 0  # get_entity calls served from the entity store
+        self.misses = 0  # entities that had to be fetched
+
+    @classmethod
+    def namespace(cls) -> str:
+        """Entity store namespace: resolvers and label languages change what a record holds."""
+        return f"{cls.store_namespace}:{'|'.join(LABEL_LANGUAGES)}"
+
+    def attach_journal(self, journal: Journal) -> int:
+        """Restore entities checkpointed by an earlier run and journal new ones."""
+        restored = sum(self.cache.put_many(EntityRecord.from_row(row) for row in rows) for rows in journal)
+        self.journal = journal
+        return restored
+
+    def _fetch_chunk(self, chunk: List[str]) -> Dict[str, Any]:
+        return request_json(
+            WIKIDATA_API,
+            {
+                "action": "wbgetentities",
+                "ids": "|".join(chunk),
+                "props": "labels|claims",
+                "languages": "|".join(LABEL_LANGUAGES),
+                "format": "json",
+            },
+            self.client,
+        )
+
+    def _fetch_entities(self, chunk: List[str]) -> List[EntityRecord]:
+        entities = self._fetch_chunk(chunk).get("entities", {})
+        # Reduced on the worker so the raw claims are dropped as soon as a chunk arrives.
+        found = [EntityRecord.from_entity(qid, entity) for qid, entity in entities.items() if "missing" not in entity]
+        # Journaled from the worker, so chunks that finished survive a failing sibling.
+        if self.journal is not None:
+            self.journal.append([record.to_row() for record in found])
+        return found
 
     def ensure_entities(self, qids: Iterable[str]) -> None:
-        qids = [qid for qid in qids if qid and qid not in self.cache]
+        qids = self.cache.missing(qid for qid in qids if qid)
         if not qids:
             return
-        chunk_size = 40
-        for i in range(0, len(qids), chunk_size):
-            chunk = qids[i : i + chunk_size]
-            data = request_json(
-                WIKIDATA_API,
-                {
-                    "action": "wbgetentities",
-                    "ids": "|".join(chunk),
-                    "props": "labels|claims",
-                    "languages": "bs|sh|hr|sr|en",
-                    "format": "json",
-                },
-            )
-            entities = data.get("entities", {})
-            for qid, entity in entities.items():
-                if "missing" not in entity:
-                    self.cache[qid] = entity
-
-    def get_entity(self, qid: str) -> Dict[str, Any]:
-        if qid not in self.cache:
-            self.ensure_entities([qid])
-        if qid not in self.cache:
+        self.misses += len(qids)
+        # Chunks run in parallel; results are stored here on the calling thread.
+        for records in self.client.map(self._fetch_entities, chunked(qids, self.chunk_size)):
+            self.cache.put_many(records)
+
+    def get_entity(self, qid: str) -> EntityRecord:
+        record = self.cache.get(qid)
+        if record is not None:
+            self.hits += 1
+            return record
+        self.ensure_entities([qid])
+        record = self.cache.get(qid)
+        if record is None:
             raise KeyError(f"Wikidata entity {qid} not found")
-        return self.cache[qid]
+        return record
 
     def get_labels(self, qid: str) -> Dict[str, str]:
-        entity = self.get_entity(qid)
-        labels = entity.get("labels", {})
-        return {lang: data["value"] for lang, data in labels.items()}
+        return self.get_entity(qid).label_map()
 
     def best_label(self, qid: Optional[str]) -> Optional[str]:
         if not qid:
             return None
         labels = self.get_labels(qid)
-        for lang in ("bs", "sh", "hr", "sr", "en"):
+        for lang in LABEL_LANGUAGES:
             if lang in labels:
-                return labels[lang]
-        return next(iter(labels.values()), None)
+                return to_latin(labels[lang])
+        label = next(iter(labels.values()), None)
+        return to_latin(label) if label else None
 
     def get_types(self, qid: str) -> Set[str]:
-        entity = self.get_entity(qid)
-        types = set()
-        for claim in entity.get("claims", {}).get("P31", []):
-            target = claim.get("mainsnak", {}).get("datavalue", {}).get("value", {}).get("id")
-            if target:
-                types.add(target)
-        return types
+        return set(self.get_entity(qid).type_ids())
 
     def get_parents(self, qid: str) -> List[str]:
-        entity = self.get_entity(qid)
-        parents = []
-        for claim in entity.get("claims", {}).get("P131", []):
-            target = claim.get("mainsnak", {}).get("datavalue", {}).get("value", {}).get("id")
-            if target:
-                parents.append(target)
-        return parents
+        return self.get_entity(qid).parent_ids()
 
     def get_coordinates(self, qid: str) -> Tuple[Optional[float], Optional[float]]:
-        entity = self.get_entity(qid)
-        coords_claims = entity.get("claims", {}).get("P625", [])
-        if not coords_claims:
-            return None, None
-        coord_value = coords_claims[0].get("mainsnak", {}).get("datavalue", {}).get("value")
-        if not coord_value:
-            return None, None
-        return coord_value.get("latitude"), coord_value.get("longitude")
-
-
-def resolve_hierarchy(resolver: WikidataResolver, qid: str) -> Dict[str, Optional[str]]:
-    result = {"municipality": None, "region": None, "entity": None, "state": None}
-    queue: deque[Tuple[str, int]] = deque([(qid, 0)])
-    visited: Set[str] = set()
-
-    while queue:
-        current, depth = queue.popleft()
-        if depth > 5 or current in visited:
-            continue
-        visited.add(current)
-        try:
-            types = resolver.get_types(current)
-        except KeyError:
-            continue
+        record = self.get_entity(qid)
+        return record.latitude, record.longitude
+
+    def prefetch_ancestors(self, qids: Iterable[str], max_depth: int = HIERARCHY_MAX_DEPTH) -> None:
+        """
+        Load every P131 ancestor that resolve_hierarchy can reach from ``qids``.
+
+        The walk is level-synchronous across all start nodes: each depth's
+        missing QIDs are fetched in one batched ensure_entities call, so round
+        trips scale with hierarchy depth rather than with the number of
+        distinct ancestors.
+        """
+        frontier = list(dict.fromkeys(qid for qid in qids if qid))
+        seen: Set[str] = set()
+        for _ in range(max_depth + 1):
+            if not frontier:
+                break
+            self.ensure_entities(frontier)
+            seen.update(frontier)
+            next_frontier: List[str] = []
+            for qid in frontier:
+                if qid not in self.cache:
+                    continue
+                next_frontier.extend(parent for parent in self.get_parents(qid) if parent not in seen)
+            frontier = list(dict.fromkeys(next_frontier))
+
+
+# WDQS predefines these prefixes; they are spelled out for other endpoints.
+SPARQL_PREFIXES = """
+PREFIX wd: <http://www.wikidata.org/entity/>
+PREFIX p: <http://www.wikidata.org/prop/>
+PREFIX ps: <http://www.wikidata.org/prop/statement/>
+PREFIX psv: <http://www.wikidata.org/prop/statement/value/>
+PREFIX wikibase: <http://wikiba.se/ontology#>
+PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+"""
+
+SPARQL_FACTS_QUERY = SPARQL_PREFIXES + """
+SELECT ?item ?property ?value ?lat ?lon WHERE {
+  VALUES ?item { %(items)s }
+  { ?item wikibase:sitelinks ?value . BIND("sitelinks" AS ?property) }
+  UNION { ?item p:P31/ps:P31 ?value . BIND("P31" AS ?property) }
+  UNION { ?item p:P131/ps:P131 ?value . BIND("P131" AS ?property) }
+  UNION {
+    ?item p:P625/psv:P625 ?node .
+    ?node wikibase:geoLatitude ?lat ; wikibase:geoLongitude ?lon .
+    BIND("P625" AS ?property)
+  }
+  UNION {
+    ?item rdfs:label ?value .
+    FILTER(LANG(?value) IN (%(languages)s))
+    BIND("label" AS ?property)
+  }
+}
+"""
+
+SPARQL_CLOSURE_QUERY = SPARQL_PREFIXES + """
+SELECT DISTINCT ?item WHERE {
+  VALUES ?start { %(items)s }
+  ?start (p:P131/ps:P131)* ?item .
+}
+"""
+
+SPARQL_CHUNK_SIZE = 200
 
-        if current != qid and not result["municipality"] and (types & MUNICIPALITY_TYPES):
-            result["municipality"] = current
 
-        if not result["region"]:
-            if CANTON_TYPE in types:
-                result["region"] = current
-            elif current in ENTITY_QIDS or current == "Q194483":
-                result["region"] = current
+def _entity_id(uri: str) -> str:
+    return uri.rsplit("/", 1)[-1]
 
-        if not result["entity"] and current in ENTITY_QIDS:
-            result["entity"] = current
 
-        if not result["state"] and current == STATE_QID:
-            result["state"] = current
+def _qid_order(qid: str) -> Tuple[int, str]:
+    return (int(qid[1:]) if qid[1:].isdigit() else 0, qid)
 
-        for parent in resolver.get_parents(current):
-            queue.append((parent, depth + 1))
+
+class SparqlWikidataResolver(WikidataResolver):
+    """
+    ``WikidataResolver`` backed by the Wikidata Query Service.
+
+    One query per chunk of QIDs returns every P31, P131, P625 and label row,
+    which is folded into the same entity layout ``wbgetentities`` returns, so
+    the hierarchy code runs unchanged. ``prefetch_ancestors`` asks for the
+    whole P131 closure of the municipalities in one query instead of walking
+    it level by level. Queries go out as GET requests, so they are cached and
+    replayed offline like every other response.
+
+    SPARQL does not expose statement order; P31/P131 values are sorted by
+    numeric id, which only matters when an item has several parents that
+    match the same hierarchy level.
+    """
+
+    chunk_size = SPARQL_CHUNK_SIZE
+    store_namespace = "sparql"
+
+    def __init__(
+        self,
+        client: Optional[HttpClient] = None,
+        endpoint: str = WIKIDATA_SPARQL,
+        store: Optional[EntityStore] = None,
+    ):
+        super().__init__(client, store)
+        self.endpoint = endpoint
+
+    def _select(self, query: str) -> List[Dict[str, Any]]:
+        data = self.client.get_json(
+            self.endpoint,
+            {"query": query, "format": "json"},
+            headers={"Accept": "application/sparql-results+json"},
+        )
+        return data.get("results", {}).get("bindings", [])
+
+    def _fetch_chunk(self, chunk: List[str]) -> Dict[str, Any]:
+        query = SPARQL_FACTS_QUERY % {
+            "items": " ".join(f"wd:{qid}" for qid in chunk),
+            "languages": ", ".join(f'"{lang}"' for lang in LABEL_LANGUAGES),
+        }
+        entities: Dict[str, Dict[str, Any]] = {}
+        for row in self._select(query):
+            qid = _entity_id(row["item"]["value"])
+            entity = entities.setdefault(qid, {"id": qid, "labels": {}, "claims": {}})
+            prop = row["property"]["value"]
+            if prop == "label":
+                lang = row["value"].get("xml:lang")
+                entity["labels"][lang] = {"language": lang, "value": row["value"]["value"]}
+            elif prop == "P625":
+                value = {"latitude": float(row["lat"]["value"]), "longitude": float(row["lon"]["value"])}
+                entity["claims"].setdefault(prop, []).append({"mainsnak": {"datavalue": {"value": value}}})
+            elif prop in ("P31", "P131"):
+                value = {"id": _entity_id(row["value"]["value"])}
+                entity["claims"].setdefault(prop, []).append({"mainsnak": {"datavalue": {"value": value}}})
+
+        for entity in entities.values():
+            for prop in ("P31", "P131"):
+                claims = entity["claims"].get(prop)
+                if claims:
+                    unique = {claim["mainsnak"]["datavalue"]["value"]["id"]: claim for claim in claims}
+                    entity["claims"][prop] = [unique[qid] for qid in sorted(unique, key=_qid_order)]
+        # Items that do not exist return no rows and stay missing, as with wbgetentities.
+        return {"entities": entities}
+
+    def ancestors_of(self, qids: Iterable[str]) -> List[str]:
+        """``qids`` plus every item reachable from them over P131 statements."""
+        def fetch_closure(chunk: List[str]) -> List[str]:
+            query = SPARQL_CLOSURE_QUERY % {"items": " ".join(f"wd:{qid}" for qid in chunk)}
+            return [_entity_id(row["item"]["value"]) for row in self._select(query)]
+
+        starts = list(dict.fromkeys(qid for qid in qids if qid))
+        closure = dict.fromkeys(starts)
+        for items in self.client.map(fetch_closure, chunked(starts, SPARQL_CHUNK_SIZE)):
+            closure.update(dict.fromkeys(items))
+        return list(closure)
+
+    def prefetch_ancestors(self, qids: Iterable[str], max_depth: int = HIERARCHY_MAX_DEPTH) -> None:
+        # The closure is not depth-limited; the extra far ancestors are a few rows.
+        self.ensure_entities(self.ancestors_of(qids))
+
+
+RESOLVERS = ("api", "sparql")
+
+
+def add_resolver_arguments(parser: Any) -> None:
+    parser.add_argument(
+        "--resolver",
+        choices=RESOLVERS,
+        default="api",
+        help="Wikidata backend: wbgetentities per entity chunk (api) or bulk SPARQL queries (sparql).",
+    )
+    parser.add_argument(
+        "--sparql-endpoint",
+        default=WIKIDATA_SPARQL,
+        help=f"SPARQL endpoint for --resolver sparql (default {WIKIDATA_SPARQL}).",
+    )
+
+
+def resolver_from_args(args: Any, client: HttpClient) -> WikidataResolver:
+    if getattr(args, "resolver", "api") == "sparql":
+        store = entity_store_from_args(args, SparqlWikidataResolver.namespace())
+        return SparqlWikidataResolver(client, endpoint=args.sparql_endpoint, store=store)
+    return WikidataResolver(client, entity_store_from_args(args, WikidataResolver.namespace()))
+
+
+def prefetch_hierarchy(resolver: WikidataResolver, qids: Iterable[str], max_depth: int = HIERARCHY_MAX_DEPTH) -> None:
+    """Load every P131 ancestor that resolve_hierarchy can reach from ``qids``."""
+    resolver.prefetch_ancestors(qids, max_depth)
+
+
+HierarchyMatch = Tuple[int, Tuple[int, ...], str]
+
+
+class AncestorGraph:
+    """
+    Memoized P131 ancestor graph shared by every resolve_hierarchy call in a run.
+
+    Each node stores, per hierarchy key, its nearest matching ancestor (itself
+    included) as ``(distance, path, qid)``, where ``path`` lists the parent
+    indices taken. Ordering candidates by that tuple reproduces the visiting
+    order of a per-row breadth-first walk, so a row's answer is assembled from
+    its parents' memoized answers instead of re-walking shared cantons,
+    entities and the state.
+
+    P131 cycles are cut where the walk reaches a node it is already inside.
+    A node whose answer lost such a path to a node further up the walk is not
+    memoized: its answer is only right for that walk (the lost paths loop
+    back and are never the nearest from the row), so it is recomputed when
+    another walk reaches it.
+    """
+
+    KEYS = ("municipality", "region", "entity", "state")
+    NO_CUT = sys.maxsize
+
+    def __init__(self, resolver: WikidataResolver, max_depth: int = HIERARCHY_MAX_DEPTH):
+        self.resolver = resolver
+        self.max_depth = max_depth
+        self._memo: Dict[str, Dict[str, HierarchyMatch]] = {}
+        self._missing: Set[str] = set()
+        self._active: Dict[str, int] = {}  # qid -> depth in the current walk
+
+    @staticmethod
+    def _own_keys(qid: str, types: Set[str]) -> List[str]:
+        keys = []
+        if types & MUNICIPALITY_TYPES:
+            keys.append("municipality")
+        if CANTON_TYPE in types or qid in ENTITY_QIDS:
+            keys.append("region")
+        if qid in ENTITY_QIDS:
+            keys.append("entity")
+        if qid == STATE_QID:
+            keys.append("state")
+        return keys
+
+    def _inherit(self, qid: str) -> Tuple[Dict[str, HierarchyMatch], int]:
+        """Best matches through ``qid``'s parents, and the shallowest walk depth a cycle was cut at."""
+        best: Dict[str, HierarchyMatch] = {}
+        cut = self.NO_CUT
+        for index, parent in enumerate(self.resolver.get_parents(qid)):
+            found, parent_cut = self._walk(parent)
+            cut = min(cut, parent_cut)
+            for key, (distance, path, match) in found.items():
+                candidate = (distance + 1, (index,) + path, match)
+                if candidate[0] <= self.max_depth and (key not in best or candidate < best[key]):
+                    best[key] = candidate
+        return best, cut
+
+    def _walk(self, qid: str) -> Tuple[Dict[str, HierarchyMatch], int]:
+        if qid in self._memo:
+            return self._memo[qid], self.NO_CUT
+        if qid in self._active:
+            # A P131 cycle back into the current walk.
+            return {}, self._active[qid]
+        if qid in self._missing:
+            return {}, self.NO_CUT
+        try:
+            types = self.resolver.get_types(qid)
+        except KeyError:
+            self._missing.add(qid)
+            return {}, self.NO_CUT
+
+        depth = len(self._active)
+        self._active[qid] = depth
+        try:
+            best, cut = self._inherit(qid)
+        finally:
+            del self._active[qid]
+        for key in self._own_keys(qid, types):
+            best[key] = (0, (), qid)
+        if cut >= depth:
+            # Only cycles through qid itself were cut, which never shorten its answer.
+            self._memo[qid] = best
+            cut = self.NO_CUT
+        return best, cut
+
+    def matches(self, qid: str) -> Dict[str, HierarchyMatch]:
+        return self._walk(qid)[0]
+
+    def resolve(self, qid: str) -> Dict[str, Optional[str]]:
+        result: Dict[str, Optional[str]] = dict.fromkeys(self.KEYS)
+        own = self.matches(qid)
+        if qid in self._missing:
+            return result
+        for key, (_, _, match) in own.items():
+            result[key] = match
+        result["municipality"] = self._nearest_municipality(qid)
+        return result
+
+    def _nearest_municipality(self, qid: str) -> Optional[str]:
+        """A row never counts as its own municipality; take the nearest ancestor."""
+        nearest: Optional[HierarchyMatch] = None
+        self._active[qid] = 0
+        try:
+            for index, parent in enumerate(self.resolver.get_parents(qid)):
+                found = self._walk(parent)[0].get("municipality")
+                if found is None:
+                    continue
+                if found[2] == qid:
+                    # An earlier walk memoized the row as this parent's nearest
+                    # municipality (a cycle back to it), hiding the runner-up.
+                    return self._walk_municipality(qid)
+                candidate = (found[0] + 1, (index,) + found[1], found[2])
+                if candidate[0] <= self.max_depth and (nearest is None or candidate < nearest):
+                    nearest = candidate
+        finally:
+            del self._active[qid]
+        return nearest[2] if nearest else None
+
+    def _walk_municipality(self, qid: str) -> Optional[str]:
+        """Per-row breadth-first search for the nearest municipality above ``qid``."""
+        queue: Deque[Tuple[str, int]] = deque([(qid, 0)])
+        visited: Set[str] = set()
+        while queue:
+            current, depth = queue.popleft()
+            if depth > self.max_depth or current in visited:
+                continue
+            visited.add(current)
+            try:
+                types = self.resolver.get_types(current)
+            except KeyError:
+                continue
+            if current != qid and types & MUNICIPALITY_TYPES:
+                return current
+            queue.extend((parent, depth + 1) for parent in self.resolver.get_parents(current))
+        return None
+
+
+def resolve_hierarchy(
+    resolver: WikidataResolver,
+    qid: str,
+    graph: Optional[AncestorGraph] = None,
+) -> Dict[str, Optional[str]]:
+    result = (graph or AncestorGraph(resolver)).resolve(qid)
 
     # Fallbacks
     if not result["entity"] and result["region"]:
@@ -396,10 +658,38 @@ def build_regions_payload(resolver: WikidataResolver) -> List[Dict[str, Any]]:
     return regions
 
 
-def main() -> None:
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build data/geo/bih_locations.json from Wikipedia/Wikidata.")
+    add_cache_arguments(parser)
+    add_client_arguments(parser)
+    add_metrics_arguments(parser)
+    add_resolver_arguments(parser)
+    add_checkpoint_arguments(parser)
+    parser.add_argument(
+        "--parquet",
+        action="store_true",
+        help="Also write typed Parquet tables under data/geo/parquet/bih_locations/ (needs pyarrow).",
+    )
+    return parser.parse_args(argv)
+
+
+def build(
+    client: HttpClient,
+    metrics: Optional[RunMetrics] = None,
+    resolver: Optional[WikidataResolver] = None,
+    checkpoint: Optional[RunCheckpoint] = None,
+) -> Dict[str, Any]:
+    metrics = metrics or RunMetrics("bih_locations")
+    checkpoint = checkpoint or RunCheckpoint()
     print("Fetching municipality table...", file=sys.stderr)
-    rows = fetch_municipality_rows()
-    title_to_qid = fetch_wikibase_ids([row["wiki_title"] for row in rows])
+    with metrics.stage("municipality_rows") as stage:
+        rows = checkpoint.stage("bih.municipality_rows", lambda: fetch_municipality_rows(client))
+        stage.records_out = len(rows)
+    with metrics.stage("wikibase_ids", records_in=len(rows)) as stage:
+        title_to_qid = checkpoint.stage(
+            "bih.wikibase_ids", lambda: fetch_wikibase_ids([row["wiki_title"] for row in rows], client)
+        )
+        stage.records_out = len(title_to_qid)
     missing_titles = [title for title in title_to_qid if not title_to_qid[title]]
     if missing_titles:
         raise RuntimeError(f"Missing Wikidata IDs for titles: {missing_titles}")
@@ -411,17 +701,54 @@ def main() -> None:
         row["slug"] = slugify(row["display_name"])
         row["code"] = generate_city_code(row["display_name"], row["slug"])
 
-    resolver = WikidataResolver()
-    resolver.ensure_entities([row["wikidata_id"] for row in rows])
-    resolver.ensure_entities(list(ENTITY_QIDS.keys()))
-    resolver.ensure_entities(list(CANTON_QIDS.keys()))
-    resolver.ensure_entities([STATE_QID])
+    resolver = resolver or WikidataResolver(client)
+    resolver.attach_journal(checkpoint.journal("bih.entities"))
+    metrics.add_probes(
+        resolver_hits=lambda: resolver.hits,
+        resolver_misses=lambda: resolver.misses,
+        resolver_store_reads=lambda: resolver.cache.disk_reads,
+    )
+    with metrics.stage("entities", records_in=len(rows)) as stage:
+        resolver.ensure_entities(
+            [row["wikidata_id"] for row in rows] + list(ENTITY_QIDS.keys()) + list(CANTON_QIDS.keys()) + [STATE_QID]
+        )
+        prefetch_hierarchy(resolver, [row["wikidata_id"] for row in rows])
+        stage.records_out = len(resolver.cache)
+
+    with metrics.stage("resolve", records_in=len(rows)) as stage:
+        processed = resolve_rows(resolver, rows)
+        stage.records_out = len(processed)
 
+    with metrics.stage("regions") as stage:
+        regions = build_regions_payload(resolver)
+        stage.records_out = len(regions)
+
+    payload = {
+        "metadata": {
+            "generated_at": datetime.now(timezone.utc).isoformat(),
+            "source": SOURCE_URL,
+            "records": len(processed),
+        },
+        "state": {
+            "state_id": "bih",
+            "name": "Bosna i Hercegovina",
+            "iso2": "BA",
+            "wikidata_id": STATE_QID,
+        },
+        "regions": regions,
+        "cities": processed,
+    }
+
+    return payload
+
+
+def resolve_rows(resolver: WikidataResolver, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    graph = AncestorGraph(resolver)
     processed: List[Dict[str, Any]] = []
     for row in rows:
         qid = row["wikidata_id"]
         lat, lng = resolver.get_coordinates(qid)
-        hierarchy = resolve_hierarchy(resolver, qid)
+        hierarchy = resolve_hierarchy(resolver, qid, graph)
 
         municipality_label = resolver.best_label(hierarchy["municipality"])
         region_qid = hierarchy["region"]
@@ -454,8 +781,6 @@ def main() -> None:
         if not fallback_muni_name.lower().startswith(prefix.lower()):
             fallback_muni_name = f"{prefix} {fallback_muni_name}"
         muni_label = municipality_label or fallback_muni_name
-        if contains_cyrillic(muni_label):
-            muni_label = fallback_muni_name
 
         processed.append(
             {
@@ -494,25 +819,56 @@ def main() -> None:
             }
         )
 
-    payload = {
-        "metadata": {
-            "generated_at": datetime.now(timezone.utc).isoformat(),
-            "source": "https://bs.wikipedia.org/wiki/Općine_Bosne_i_Hercegovine",
-            "records": len(processed),
-        },
-        "state": {
-            "state_id": "bih",
-            "name": "Bosna i Hercegovina",
-            "iso2": "BA",
-            "wikidata_id": STATE_QID,
-        },
-        "regions": build_regions_payload(resolver),
-        "cities": processed,
-    }
+    return processed
 
-    DATA_PATH.parent.mkdir(parents=True, exist_ok=True)
-    DATA_PATH.write_text(json.dumps(payload, ensure_ascii=False, indent=2))
-    print(f"Wrote {len(processed)} city records to {DATA_PATH}", file=sys.stderr)
+
+def write_output(payload: Dict[str, Any], output_path: Optional[Path] = None) -> Path:
+    output_path = output_path or DATA_PATH
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_text(json.dumps(payload, ensure_ascii=False, indent=2))
+    print(f"Wrote {len(payload['cities'])} city records to {output_path}", file=sys.stderr)
+    return output_path
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    cache = cache_from_args(args)
+    client = HttpClient(user_agent=USER_AGENT, cache=cache, **client_options_from_args(args))
+    checkpoint = checkpoint_from_args(args, "bih_locations")
+    metrics = RunMetrics(
+        "bih_locations",
+        probes=http_probes(client),
+        profile_dir=profile_dir_for(DATA_PATH) if args.profile else None,
+    )
+    resolver = resolver_from_args(args, client)
+    try:
+        payload = build(client, metrics, resolver, checkpoint)
+    except CacheMiss as error:
+        raise SystemExit(f"Offline build failed: {error}")
+    except Exception:
+        print(f"Checkpoints kept in {checkpoint.run_dir}; rerun with --resume to continue.", file=sys.stderr)
+        raise
+    finally:
+        client.close()
+        resolver.cache.close()
+        cache.evict()
+        metrics_path = metrics.write(metrics_path_for(DATA_PATH))
+    print(
+        f"{client.request_count} HTTP requests ({client.controller.summary()}), {cache.summary()}",
+        file=sys.stderr,
+    )
+    print(f"Wikidata: {resolver.misses} entities fetched, {resolver.cache.summary()}", file=sys.stderr)
+    if args.resume:
+        print(f"Resumed: {checkpoint.summary()}", file=sys.stderr)
+
+    with metrics.stage("write", records_in=len(payload["cities"])):
+        output_path = write_output(payload)
+        if args.parquet:
+            for path in export_bih_dataset(payload, output_path):
+                print(f"Wrote {path}", file=sys.stderr)
+    metrics.write(metrics_path)
+    checkpoint.finish()
+    print(f"Run metrics written to {metrics_path}", file=sys.stderr)
 
 
 if __name__ == "__main__":
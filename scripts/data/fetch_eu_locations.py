@@ -13,80 +13,200 @@ List-of-Values (LOV) selectors that require EU countries, regions, and cities.
 Output file: data/geo/eu_locations.json
 
 Usage:
-    python3 scripts/data/fetch_eu_locations.py
+    python3 scripts/data/fetch_eu_locations.py [--offline] [--no-cache]
+
+Downloads are cached under data/geo/.cache (see http_cache.py), so a rebuild
+that changes nothing only revalidates the GISCO files. ``--offline`` builds
+from the cache alone. The three GISCO files are downloaded in parallel under
+a per-host rate limit. bih_locations.json is merged in when present;
+build_geo_dataset.py instead runs both fetchers concurrently and merges in
+memory. Either way, a city that two sources describe is kept once, with a
+``provenance`` list of the merged records (see geo_dedupe.py).
+
+When the database has been seeded, the script also writes
+eu_locations.changeset.json with the inserts, updates (changed fields only)
+and deletes against the seeded dataset (eu_locations.seeded.json, a copy the
+seed keeps of what it loaded); `GEO_SEED_MODE=changeset npm run db:seed`
+applies just those rows instead of reloading the geography tables, and
+refuses a changeset whose base is not the seeded dataset. Without a seeded
+copy, a stale changeset is removed. It always writes
+eu_locations.autocomplete.json, a prefix/trigram index over city and region
+names folded with the shared transliteration rules (see geo_autocomplete.py),
+eu_locations.shards/ with one minified, precompressed (gzip/brotli) file per
+state and a manifest of counts and SHA-256 hashes (see geo_shards.py),
+and eu_locations.metrics.json with per-stage timings, HTTP counters and peak
+RSS (``--profile`` adds a cProfile dump per stage; see geo_metrics.py).
+
+Each GISCO layer and the transformed records are checkpointed under
+data/geo/.runs/eu_locations/ as they complete. If a run fails, ``--resume``
+restores them and only fetches what is missing (see geo_checkpoint.py).
+
+``--lau`` also streams GISCO's LAU layer (every municipality, ~100k
+polygons) into data/geo/eu_lau.ndjson, one record per line. Features are
+parsed one at a time and polygons are reduced to a centroid and bounding
+box while they are read, so memory stays flat however large the layer is.
+The layer carries no NUTS code; pass Eurostat's LAU -> NUTS 3
+correspondence table as CSV with ``--lau-nuts-csv`` to fill region_id.
+
+NUTS polygons are kept (the 1:60M layer is small). With numpy installed,
+regions get an area-weighted centroid and bounding box, and cities or LAUs
+left without a NUTS 3 region are placed by point-in-polygon against the
+NUTS 3 polygons of their country (see geo_polygons.py).
+
+``--states de,at`` / ``--regions DE1,AT13`` rebuild only those states or
+NUTS regions and merge them into the existing eu_locations.json, keeping
+every other state's records as they are (see geo_selection.py). ``bih``
+selects the BiH records; GISCO is then skipped.
+
+``--pg-copy`` also writes eu_locations.pgcopy/: COPY-format TSV files for
+geo_states, geo_regions, geo_cities and a precomputed admin_regions, with a
+load.sql that reloads all four in one transaction (see geo_pgcopy.py).
 
 Requirements:
     pip install requests
+    pip install ijson   # optional: streams the GeoJSON instead of loading it whole
+    pip install pyarrow # optional: --parquet columnar export
+    pip install numpy   # optional: region centroids, point-in-polygon linking, --spatial-index
+    pip install brotli  # optional: .br copies of the per-state shards
 """
 
 from __future__ import annotations
 
+import argparse
+import csv
 import json
 import sys
-import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import UTC, datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import requests
 
+from geo_autocomplete import autocomplete_path_for, build_index, write_index
+from geo_changeset import (
+    build_changeset,
+    changeset_path_for,
+    is_empty,
+    load_dataset,
+    seeded_path_for,
+    summarize,
+    write_changeset,
+)
+from geo_checkpoint import RunCheckpoint, add_checkpoint_arguments, checkpoint_from_args
+from geo_columnar import export_eu_dataset
+from geo_dedupe import merge_duplicate_cities
+from geo_metrics import RunMetrics, add_metrics_arguments, http_probes, metrics_path_for, profile_dir_for
+from geo_ndjson import DEFAULT_CHUNK_SIZE, write_ndjson
+from geo_pgcopy import copy_dir_for, write_copy_files
+from geo_pipeline import add_publish_arguments
+from geo_polygons import AVAILABLE as POLYGONS_AVAILABLE, RegionPolygons
+from geo_selection import Selection, add_selection_arguments, merge_into, selection_from_args
+from geo_shards import describe as describe_shards, shards_dir_for, write_shards
+from geo_spatial import CityKDTree, spatial_index_path_for
+from geojson_stream import STREAMING, iter_features
+from http_cache import CacheMiss, HttpCache, add_cache_arguments, cache_from_args
+from http_client import HttpClient, add_client_arguments, client_options_from_args
+from transliteration import ascii_slug, unicode_slug
+
 GISCO_BASE = "https://gisco-services.ec.europa.eu/distribution/v2"
 
 COUNTRIES_URL = f"{GISCO_BASE}/countries/geojson/CNTR_RG_60M_2020_4326.geojson"
 NUTS_URL = f"{GISCO_BASE}/nuts/geojson/NUTS_RG_60M_2021_4326.geojson"
 URBAN_AUDIT_CITIES_URL = f"{GISCO_BASE}/urau/geojson/URAU_LB_2021_4326_CITIES.geojson"
+LAU_URL = f"{GISCO_BASE}/lau/geojson/LAU_RG_01M_2021_4326.geojson"
+
+GISCO_DATASET_URLS = (COUNTRIES_URL, NUTS_URL, URBAN_AUDIT_CITIES_URL)
+GISCO_CHECKPOINTS = ("gisco.countries", "gisco.nuts", "gisco.urban_audit_cities")
+GISCO_SOURCES = {
+    "countries": COUNTRIES_URL,
+    "nuts": NUTS_URL,
+    "urban_audit_cities": URBAN_AUDIT_CITIES_URL,
+}
+
+# Per-host token bucket: the three large downloads may start together, after
+# that GISCO sees at most one new request per second.
+GISCO_REQUESTS_PER_SECOND = 1.0
+GISCO_BURST = len(GISCO_DATASET_URLS)
+GISCO_CONCURRENCY = len(GISCO_DATASET_URLS)
+
+OUTPUT_PATH = Path(__file__).resolve().parents[2] / "data" / "geo" / "eu_locations.json"
+BIH_DATA_PATH = OUTPUT_PATH.with_name("bih_locations.json")
+BIH_STATE_ID = "bih"  # the only state GISCO does not provide
+LAU_OUTPUT_PATH = OUTPUT_PATH.with_name("eu_lau.ndjson")
 
-SPARQL_THROTTLE_SECONDS = 1.0  # conservative pause between large file downloads
+USER_AGENT = "PustikorijenBot/1.0 (EU geography fetcher; data-team@pustikorijen)"
 
 EU_STATUS_FLAG = "T"
 
-GERMAN_CHAR_MAP = {
-    "ä": "ae",
-    "ö": "oe",
-    "ü": "ue",
-    "ß": "ss",
-    "Ä": "ae",
-    "Ö": "oe",
-    "Ü": "ue",
-}
+
+GiscoLayers = Tuple[Dict[str, dict], Dict[str, dict], Dict[str, dict], List[dict]]
 
 
 class DataFetchError(RuntimeError):
     """Raised when a remote dataset cannot be retrieved."""
 
 
-def fetch_json(url: str, session: Optional[requests.Session] = None) -> dict:
-    """Download JSON content with a friendly pause to avoid hammering GISCO."""
-    time.sleep(SPARQL_THROTTLE_SECONDS)
-    session = session or requests.Session()
-    response = session.get(
-        url,
-        headers={
-            "User-Agent": "PustikorijenBot/1.0 (EU geography fetcher; data-team@pustikorijen)",
-            "Accept": "application/json",
-        },
+def create_client(
+    cache: Optional[HttpCache] = None, concurrency: int = GISCO_CONCURRENCY, **options: Any
+) -> HttpClient:
+    """GISCO client; ``options`` are further ``HttpClient`` arguments (retries, maxlag)."""
+    return HttpClient(
+        user_agent=USER_AGENT,
+        cache=cache,
+        concurrency=concurrency,
+        rate=GISCO_REQUESTS_PER_SECOND,
+        burst=GISCO_BURST,
         timeout=120,
+        headers={"Accept": "application/json"},
+        **options,
     )
-    if response.status_code != 200:
-        raise DataFetchError(f"Failed to download {url} (status {response.status_code})")
-    return response.json()
+
+
+@contextmanager
+def open_json_stream(url: str, client: Optional[HttpClient] = None) -> Iterator[IO[bytes]]:
+    """Open a remote JSON document as a decompressed binary stream."""
+    client = client or create_client()
+    try:
+        entry = client.fetch_entry(url)
+    except requests.HTTPError as error:
+        status = error.response.status_code if error.response is not None else "unknown"
+        raise DataFetchError(f"Failed to download {url} (status {status})") from error
+    except requests.RequestException as error:
+        raise DataFetchError(f"Failed to download {url} ({error})") from error
+    except CacheMiss as error:
+        raise DataFetchError(str(error)) from error
+    with client.cache.open(entry) as stream:
+        yield stream
+
+
+def fetch_json(url: str, client: Optional[HttpClient] = None) -> dict:
+    """Download JSON content, rate limited per host to avoid hammering GISCO."""
+    with open_json_stream(url, client=client) as stream:
+        return json.load(stream)
+
+
+def fetch_features(
+    url: str,
+    client: Optional[HttpClient] = None,
+    keep_point_geometry: bool = False,
+    summarize_geometry: bool = False,
+    keep_geometry: bool = False,
+) -> Iterator[dict]:
+    """Stream GeoJSON features; polygon geometry is dropped unless ``keep_geometry``."""
+    with open_json_stream(url, client=client) as stream:
+        yield from iter_features(
+            stream,
+            keep_point_geometry=keep_point_geometry,
+            summarize_geometry=summarize_geometry,
+            keep_geometry=keep_geometry,
+        )
 
 
 def slugify(value: str) -> str:
-    """Slugify a string using ASCII characters."""
-    value = "".join(GERMAN_CHAR_MAP.get(char, char) for char in value)
-    slug = []
-    prev_dash = False
-    for char in value.lower():
-        if char.isalnum():
-            slug.append(char)
-            prev_dash = False
-        else:
-            if not prev_dash:
-                slug.append("-")
-                prev_dash = True
-    result = "".join(slug).strip("-")
-    return result or "unknown"
+    """Slugify a string, expanding German umlauts and keeping other letters."""
+    return unicode_slug(value) or "unknown"
 
 
 def generate_state_id(iso2: str) -> str:
@@ -101,11 +221,15 @@ def generate_city_id(state_iso2: str, name: str) -> str:
     return f"{state_iso2.lower()}-{slugify(name)}"
 
 
-def fetch_eu_member_states(session: Optional[requests.Session] = None) -> Dict[str, dict]:
+def generate_lau_id(state_iso2: str, lau_code: str) -> str:
+    # LAU names repeat heavily within a country, so ids use the national code.
+    return f"{state_iso2.lower()}-lau-{ascii_slug(lau_code)}"
+
+
+def fetch_eu_member_states(client: Optional[HttpClient] = None) -> Dict[str, dict]:
     """Retrieve EU-27 member metadata from the GISCO countries dataset."""
-    payload = fetch_json(COUNTRIES_URL, session=session)
     states: Dict[str, dict] = {}
-    for feature in payload.get("features", []):
+    for feature in fetch_features(COUNTRIES_URL, client=client):
         props = feature.get("properties", {})
         if props.get("EU_STAT") != EU_STATUS_FLAG:
             continue
@@ -126,19 +250,21 @@ def fetch_eu_member_states(session: Optional[requests.Session] = None) -> Dict[s
 
 def fetch_nuts_regions(
     states_by_iso2: Dict[str, dict],
-    session: Optional[requests.Session] = None,
+    client: Optional[HttpClient] = None,
+    selection: Optional[Selection] = None,
 ) -> Tuple[Dict[str, dict], Dict[str, dict]]:
     """
-    Download the NUTS dataset and return region dictionaries.
+    Download the NUTS dataset and return region dictionaries. Each record
+    keeps its (Multi)Polygon for ``place_in_regions``. A ``selection`` keeps
+    its regions and their ancestors.
 
     Returns:
         Tuple of (nuts_level2, nuts_level3) dicts keyed by nuts_id
     """
-    payload = fetch_json(NUTS_URL, session=session)
     level2: Dict[str, dict] = {}
     level3: Dict[str, dict] = {}
 
-    for feature in payload.get("features", []):
+    for feature in fetch_features(NUTS_URL, client=client, keep_geometry=True):
         props = feature.get("properties", {})
         nuts_id = props.get("NUTS_ID")
         level_code = props.get("LEVL_CODE")
@@ -147,12 +273,15 @@ def fetch_nuts_regions(
             continue
         if country_code not in states_by_iso2:
             continue
+        if selection is not None and not selection.keeps_nuts(nuts_id):
+            continue
 
         record = {
             "nuts_id": nuts_id,
             "level": level_code,
             "name": props.get("NAME_LATN") or props.get("NUTS_NAME"),
             "country_code": country_code,
+            "geometry": feature.get("geometry"),
         }
 
         if level_code == 2:
@@ -170,12 +299,12 @@ def parent_nuts_of(nuts3_id: str) -> Optional[str]:
 
 def fetch_urban_cities(
     states_by_iso2: Dict[str, dict],
-    session: Optional[requests.Session] = None,
+    client: Optional[HttpClient] = None,
 ) -> List[dict]:
     """Retrieve the Urban Audit city centroids dataset."""
-    payload = fetch_json(URBAN_AUDIT_CITIES_URL, session=session)
     cities: List[dict] = []
-    for feature in payload.get("features", []):
+    features = fetch_features(URBAN_AUDIT_CITIES_URL, client=client, keep_point_geometry=True)
+    for feature in features:
         props = feature.get("properties", {})
         geom = feature.get("geometry") or {}
         coords = geom.get("coordinates") or [None, None]
@@ -198,23 +327,226 @@ def fetch_urban_cities(
     return cities
 
 
-def build_dataset() -> dict:
-    """Core workflow orchestrating downloads and transformations."""
-    session = requests.Session()
+def region_index_for(regions: Iterable[dict]) -> Dict[str, str]:
+    """Map NUTS ID -> region_id over the GISCO (NUTS 2/3) regions of a dataset."""
+    return {
+        region["nuts_id"]: region["region_id"]
+        for region in regions
+        if region.get("type") in ("nuts2", "nuts3") and region.get("nuts_id")
+    }
 
-    print("Fetching EU member states metadata...")
-    states_map = fetch_eu_member_states(session=session)
-    print(f"   ✓ Retrieved {len(states_map)} EU member states")
 
-    print("Fetching NUTS regions (levels 2 and 3)...")
-    nuts_level2, nuts_level3 = fetch_nuts_regions(states_map, session=session)
+def load_lau_nuts_correspondence(path: Path) -> Dict[Tuple[str, str], str]:
+    """
+    Read Eurostat's LAU -> NUTS 3 correspondence table (the
+    EU-27-LAU-2021-NUTS-2021 workbook saved as CSV, all countries in one
+    sheet). GISCO's LAU layer carries no NUTS code, so this is the link.
+
+    Returns:
+        Dict keyed by (country code, LAU code) -> NUTS 3 ID
+    """
+    with path.open(newline="", encoding="utf-8-sig") as stream:
+        sample = stream.read(4096)
+        stream.seek(0)
+        reader = csv.DictReader(stream, dialect=csv.Sniffer().sniff(sample, delimiters=",;\t"))
+        columns = {(name or "").strip().upper().replace("_", " "): name for name in reader.fieldnames or []}
+        nuts_column = columns.get("NUTS 3 CODE") or columns.get("NUTS3")
+        lau_column = columns.get("LAU CODE") or columns.get("LAU ID")
+        if not nuts_column or not lau_column:
+            raise DataFetchError(f"{path} needs 'NUTS 3 CODE' and 'LAU CODE' columns")
+
+        correspondence: Dict[Tuple[str, str], str] = {}
+        for row in reader:
+            nuts3_id = (row.get(nuts_column) or "").strip()
+            lau_code = (row.get(lau_column) or "").strip()
+            if nuts3_id and lau_code:
+                correspondence[(nuts3_id[:2], lau_code)] = nuts3_id
+    return correspondence
+
+
+def iter_lau_records(
+    region_index: Dict[str, str],
+    correspondence: Optional[Dict[Tuple[str, str], str]] = None,
+    client: Optional[HttpClient] = None,
+    stats: Optional[Dict[str, int]] = None,
+) -> Iterator[dict]:
+    """
+    Stream the GISCO LAU layer as city-like records, one feature at a time.
+
+    Polygons are reduced to a vertex-mean centroid and bounding box while
+    they are parsed. Each LAU is linked to its NUTS 3 region through
+    ``correspondence`` and ``region_index``; only countries present in
+    ``region_index`` are kept.
+    """
+    correspondence = correspondence or {}
+    stats = stats if stats is not None else {}
+    countries = {nuts_id[:2] for nuts_id in region_index}
+    for key in ("read", "written", "linked"):
+        stats.setdefault(key, 0)
+
+    for feature in fetch_features(LAU_URL, client=client, summarize_geometry=True):
+        stats["read"] += 1
+        props = feature.get("properties", {})
+        country = props.get("CNTR_CODE")
+        lau_code = str(props.get("LAU_ID") or "").strip()
+        name = props.get("LAU_NAME")
+        if country not in countries or not lau_code or not name:
+            continue
+
+        nuts3_id = correspondence.get((country, lau_code))
+        region_id = region_index.get(nuts3_id) if nuts3_id else None
+        geometry = feature.get("geometry") or {}
+        centroid = geometry.get("centroid") or [None, None]
+
+        stats["written"] += 1
+        if region_id:
+            stats["linked"] += 1
+        yield {
+            "lau_id": generate_lau_id(country, lau_code),
+            "gisco_id": props.get("GISCO_ID"),
+            "lau_code": lau_code,
+            "name": name,
+            "slug": ascii_slug(name) or ascii_slug(lau_code),
+            "state_id": generate_state_id(country),
+            "country_code": country,
+            "nuts3_id": nuts3_id,
+            "nuts2_id": parent_nuts_of(nuts3_id) if nuts3_id else None,
+            "region_id": region_id,
+            "population": props.get("POP_2021"),
+            "population_density": props.get("POP_DENS_2021"),
+            "area_km2": props.get("AREA_KM2"),
+            "latitude": centroid[1],
+            "longitude": centroid[0],
+            "bbox": geometry.get("bbox"),
+        }
+
+
+def place_lau_records(
+    records: Iterable[dict],
+    polygons: RegionPolygons,
+    region_index: Dict[str, str],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    stats: Optional[Dict[str, int]] = None,
+) -> Iterator[dict]:
+    """Link LAU records the correspondence table missed by the NUTS 3 polygon holding their centroid."""
+    stats = stats if stats is not None else {}
+    stats.setdefault("placed", 0)
+    chunk: List[dict] = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) < chunk_size:
+            continue
+        stats["placed"] += _place_chunk(chunk, polygons, region_index)
+        yield from chunk
+        chunk = []
+    stats["placed"] += _place_chunk(chunk, polygons, region_index)
+    yield from chunk
+
+
+def _place_chunk(chunk: List[dict], polygons: RegionPolygons, region_index: Dict[str, str]) -> int:
+    unlinked = [record for record in chunk if not record["region_id"]]
+    if not unlinked:
+        return 0
+    located = polygons.locate(
+        [record["longitude"] for record in unlinked],
+        [record["latitude"] for record in unlinked],
+        [record["country_code"] for record in unlinked],
+    )
+    placed = 0
+    for record, nuts3_id in zip(unlinked, located):
+        if nuts3_id in region_index:
+            record.update(nuts3_id=nuts3_id, nuts2_id=parent_nuts_of(nuts3_id), region_id=region_index[nuts3_id])
+            placed += 1
+    return placed
+
+
+def ingest_lau(
+    dataset: dict,
+    client: Optional[HttpClient] = None,
+    correspondence_path: Optional[Path] = None,
+    output_path: Path = LAU_OUTPUT_PATH,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Dict[str, int]:
+    """Stream every LAU from GISCO straight into an NDJSON file."""
+    print("Streaming LAU municipalities...")
+    if not STREAMING:
+        print("   ⚠️  ijson is not installed; the LAU layer will be parsed in memory")
+    correspondence = load_lau_nuts_correspondence(correspondence_path) if correspondence_path else {}
+    if not correspondence:
+        print("   ⚠️  No LAU -> NUTS 3 table (--lau-nuts-csv); LAUs stay unlinked")
+
+    stats: Dict[str, int] = {"placed": 0}
+    region_index = region_index_for(dataset["regions"])
+    records = iter_lau_records(region_index, correspondence, client, stats)
+    if POLYGONS_AVAILABLE:
+        states = {state["iso2"]: state for state in dataset["states"]}
+        _, nuts_level3 = fetch_nuts_regions(states, client)
+        records = place_lau_records(records, region_polygons(nuts_level3.values()), region_index, chunk_size, stats)
+    else:
+        print("   ⚠️  numpy is not installed; LAUs missing from the table stay unlinked")
+    write_ndjson(records, output_path, chunk_size=chunk_size)
+    print(
+        f"   ✓ LAU records: {stats['written']} of {stats['read']} "
+        f"({stats['linked']} linked to NUTS 3, {stats['placed']} more by point-in-polygon)"
+    )
+    print(f"   LAU records written to: {output_path}")
+    return stats
+
+
+def fetch_gisco_datasets(
+    client: Optional[HttpClient] = None,
+    checkpoint: Optional[RunCheckpoint] = None,
+    selection: Optional[Selection] = None,
+) -> GiscoLayers:
+    """
+    Download and parse the GISCO countries, NUTS and Urban Audit layers.
+    With a ``selection``, only the selected countries (and NUTS regions) are kept.
+    """
+    client = client or create_client()
+    checkpoint = checkpoint or RunCheckpoint()
+    selection = selection or Selection()
+
+    print("Fetching EU member states, NUTS regions and Urban Audit cities...")
+    # One worker per download plus the NUTS and cities parse tasks, so neither
+    # parse waits in the queue behind a download it does not need.
+    with ThreadPoolExecutor(max_workers=len(GISCO_DATASET_URLS) + 2) as pool:
+        # All three downloads start at once; parsing NUTS and cities only needs
+        # the member states, so each starts as soon as its own file is on disk.
+        # Layers restored from a checkpoint are neither downloaded nor parsed.
+        downloads = [
+            pool.submit(client.fetch_entry, url)
+            for name, url in zip(GISCO_CHECKPOINTS, GISCO_DATASET_URLS)
+            if not checkpoint.has(name)
+        ]
+        states_map = checkpoint.stage("gisco.countries", lambda: fetch_eu_member_states(client=client))
+        states_map = {
+            iso2: state for iso2, state in states_map.items() if selection.includes_state(state["state_id"])
+        }
+        nuts_future = pool.submit(
+            checkpoint.stage, "gisco.nuts", lambda: fetch_nuts_regions(states_map, client, selection), tuple
+        )
+        cities_future = pool.submit(
+            checkpoint.stage, "gisco.urban_audit_cities", lambda: fetch_urban_cities(states_map, client)
+        )
+        nuts_level2, nuts_level3 = nuts_future.result()
+        cities_raw = cities_future.result()
+        for download in downloads:
+            download.result()  # surfaces a failed download the parse stages did not hit
+
+    print(f"   ✓ Retrieved {len(states_map)} EU member states")
     print(f"   ✓ NUTS level 2 regions: {len(nuts_level2)}")
     print(f"   ✓ NUTS level 3 regions: {len(nuts_level3)}")
-
-    print("Fetching Urban Audit city centroids...")
-    cities_raw = fetch_urban_cities(states_map, session=session)
     print(f"   ✓ Urban Audit cities: {len(cities_raw)}")
+    return states_map, nuts_level2, nuts_level3, cities_raw
 
+
+def build_gisco_records(
+    states_map: Dict[str, dict],
+    nuts_level2: Dict[str, dict],
+    nuts_level3: Dict[str, dict],
+    cities_raw: List[dict],
+) -> dict:
+    """Turn the parsed GISCO layers into state, region and city records."""
     # Build state records
     states_output: List[dict] = []
     for iso2, state in sorted(states_map.items()):
@@ -245,6 +577,9 @@ def build_dataset() -> dict:
             "code": nuts["nuts_id"],
             "type": "nuts2",
             "parent_region_id": None,
+            "latitude": None,
+            "longitude": None,
+            "bbox": None,
         })
 
     for nuts in sorted(nuts_level3.values(), key=lambda r: (r["country_code"], r["nuts_id"])):
@@ -263,6 +598,9 @@ def build_dataset() -> dict:
             "code": nuts["nuts_id"],
             "type": "nuts3",
             "parent_region_id": parent_region_id,
+            "latitude": None,
+            "longitude": None,
+            "bbox": None,
         })
 
     # Build city records with references to states/regions
@@ -309,70 +647,140 @@ def build_dataset() -> dict:
             "is_official_city": True,
         })
 
-    bih_data_path = Path(__file__).resolve().parents[2] / "data" / "geo" / "bih_locations.json"
-    if bih_data_path.exists():
-        print("Merging Bosnia & Herzegovina dataset...")
-        bih_payload = json.loads(bih_data_path.read_text(encoding="utf-8"))
-
-        bih_state = bih_payload.get("state", {})
-        bih_state_id = bih_state.get("state_id")
-        if bih_state_id:
-            states_output.append({
-                "state_id": bih_state_id,
-                "name": bih_state.get("name"),
-                "iso2": bih_state.get("iso2"),
-                "iso3": bih_state.get("iso3"),
-                "nuts_id": bih_state.get("state_id"),
-                "capital": bih_state.get("name"),
-            })
-
-        for region in bih_payload.get("regions", []):
-            regions_output.append({
-                "region_id": region.get("region_id"),
-                "state_id": region.get("state_id"),
-                "name": region.get("name"),
-                "nuts_id": region.get("code") or region.get("region_id"),
-                "nuts_level": 2 if region.get("type") in {"entity", "district"} else 3,
-                "code": region.get("code") or region.get("region_id"),
-                "type": region.get("type"),
-                "parent_region_id": region.get("parent_region_id"),
-            })
-
-        for city in bih_payload.get("cities", []):
-            area_km2 = None
-            metrics = city.get("metrics") or {}
-            if metrics.get("area_km2") is not None:
-                area_km2 = metrics["area_km2"]
-
-            cities_output.append({
-                "city_id": city.get("city_id"),
-                "name": city.get("name"),
-                "slug": city.get("slug"),
-                "city_code": city.get("code") or city.get("city_id")[-10:].upper(),
-                "state_id": city.get("state_id") or bih_state_id,
-                "region_id": city.get("region", {}).get("region_id") if city.get("region") else None,
-                "country_code": bih_state.get("iso2") or "BA",
-                "is_official_city": city.get("is_official_city", False),
-                "latitude": (city.get("coordinates") or {}).get("latitude"),
-                "longitude": (city.get("coordinates") or {}).get("longitude"),
-                "area_km2": area_km2,
-                "nuts3_id": city.get("region", {}).get("code") if city.get("region") else None,
-                "nuts2_id": city.get("entity", {}).get("code") if city.get("entity") else None,
-                "functional_area_code": None,
-            })
+    return {"source": "gisco", "states": states_output, "regions": regions_output, "cities": cities_output}
+
+
+def region_polygons(nuts_regions: Iterable[dict]) -> RegionPolygons:
+    """Polygons of NUTS region records keyed by nuts_id, grouped by country."""
+    regions = [region for region in nuts_regions if region.get("geometry")]
+    return RegionPolygons(
+        [region["nuts_id"] for region in regions],
+        [region["geometry"] for region in regions],
+        [region["country_code"] for region in regions],
+    )
+
+
+def place_in_regions(records: dict, nuts_level2: Dict[str, dict], nuts_level3: Dict[str, dict]) -> int:
+    """
+    Give NUTS regions a centroid and bounding box, and link cities that have
+    no region (missing or unknown NUTS3_2021) to the NUTS 3 polygon that
+    contains them, within their own country.
+
+    Returns:
+        Number of cities placed by point-in-polygon
+    """
+    if not POLYGONS_AVAILABLE:
+        print("   ⚠️  numpy is not installed; regions get no coordinates and unlinked cities stay unlinked")
+        return 0
+    level3 = region_polygons(nuts_level3.values())
+    summaries = region_polygons(nuts_level2.values()).summaries()
+    summaries.update(level3.summaries())
+    for region in records["regions"]:
+        region.update(summaries.get(region["nuts_id"], {}))
+
+    unlinked = [city for city in records["cities"] if not city.get("region_id")]
+    if not unlinked:
+        return 0
+    region_index = region_index_for(records["regions"])
+    located = level3.locate(
+        [city.get("longitude") for city in unlinked],
+        [city.get("latitude") for city in unlinked],
+        [city["country_code"] for city in unlinked],
+    )
+    placed = 0
+    for city, nuts3_id in zip(unlinked, located):
+        if nuts3_id in region_index:
+            city.update(nuts3_id=nuts3_id, nuts2_id=parent_nuts_of(nuts3_id), region_id=region_index[nuts3_id])
+            placed += 1
+    print(f"   ✓ Placed {placed} of {len(unlinked)} cities without a NUTS 3 region by point-in-polygon")
+    return placed
+
+
+def load_bih_payload(path: Path = BIH_DATA_PATH) -> Optional[dict]:
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def bih_records(bih_payload: dict) -> dict:
+    """Map a fetch_bih_locations.py payload onto the EU record layout."""
+    states_output: List[dict] = []
+    regions_output: List[dict] = []
+    cities_output: List[dict] = []
+
+    bih_state = bih_payload.get("state", {})
+    bih_state_id = bih_state.get("state_id")
+    if bih_state_id:
+        states_output.append({
+            "state_id": bih_state_id,
+            "name": bih_state.get("name"),
+            "iso2": bih_state.get("iso2"),
+            "iso3": bih_state.get("iso3"),
+            "nuts_id": bih_state.get("state_id"),
+            "capital": bih_state.get("name"),
+        })
+
+    for region in bih_payload.get("regions", []):
+        regions_output.append({
+            "region_id": region.get("region_id"),
+            "state_id": region.get("state_id"),
+            "name": region.get("name"),
+            "nuts_id": region.get("code") or region.get("region_id"),
+            "nuts_level": 2 if region.get("type") in {"entity", "district"} else 3,
+            "code": region.get("code") or region.get("region_id"),
+            "type": region.get("type"),
+            "parent_region_id": region.get("parent_region_id"),
+            "latitude": region.get("latitude"),
+            "longitude": region.get("longitude"),
+        })
+
+    for city in bih_payload.get("cities", []):
+        area_km2 = None
+        metrics = city.get("metrics") or {}
+        if metrics.get("area_km2") is not None:
+            area_km2 = metrics["area_km2"]
+
+        cities_output.append({
+            "city_id": city.get("city_id"),
+            "name": city.get("name"),
+            "slug": city.get("slug"),
+            "city_code": city.get("code") or city.get("city_id")[-10:].upper(),
+            "state_id": city.get("state_id") or bih_state_id,
+            "region_id": city.get("region", {}).get("region_id") if city.get("region") else None,
+            "country_code": bih_state.get("iso2") or "BA",
+            "is_official_city": city.get("is_official_city", False),
+            "latitude": (city.get("coordinates") or {}).get("latitude"),
+            "longitude": (city.get("coordinates") or {}).get("longitude"),
+            "area_km2": area_km2,
+            "nuts3_id": city.get("region", {}).get("code") if city.get("region") else None,
+            "nuts2_id": city.get("entity", {}).get("code") if city.get("entity") else None,
+            "functional_area_code": None,
+        })
+
+    return {"source": "bih", "states": states_output, "regions": regions_output, "cities": cities_output}
+
+
+def assemble_dataset(parts: List[dict], sources: Optional[Dict[str, str]] = None) -> dict:
+    """
+    Concatenate per-source record tables, in order, and attach metadata.
+    Cities that several sources describe are merged first (see geo_dedupe.py).
+    """
+    parts, dedupe = merge_duplicate_cities(parts)
+    if dedupe["merged"]:
+        print(f"Merged {dedupe['merged']} cities that appear in more than one source")
+    states_output = [state for part in parts for state in part.get("states", [])]
+    regions_output = [region for part in parts for region in part.get("regions", [])]
+    cities_output = [city for part in parts for city in part.get("cities", [])]
 
     metadata = {
         "generated_at": datetime.now(UTC).isoformat(timespec="seconds"),
-        "source": {
-            "countries": COUNTRIES_URL,
-            "nuts": NUTS_URL,
-            "urban_audit_cities": URBAN_AUDIT_CITIES_URL,
-        },
+        "source": dict(sources or GISCO_SOURCES),
         "counts": {
             "states": len(states_output),
             "regions": len(regions_output),
             "cities": len(cities_output),
         },
+        "dedupe": dedupe,
     }
 
     dataset = {
@@ -385,33 +793,196 @@ def build_dataset() -> dict:
     return dataset
 
 
-def write_output(payload: dict) -> Path:
+def build_dataset(
+    client: Optional[HttpClient] = None,
+    bih_payload: Optional[dict] = None,
+    metrics: Optional[RunMetrics] = None,
+    checkpoint: Optional[RunCheckpoint] = None,
+    selection: Optional[Selection] = None,
+) -> dict:
+    """Core workflow orchestrating downloads and transformations.
+
+    ``bih_payload`` is merged when given; otherwise bih_locations.json is read
+    from disk if it exists. With a partial ``selection`` only its records are
+    built (see ``merge_into``); GISCO is skipped when only BiH is selected.
+    """
+    metrics = metrics or RunMetrics("eu_locations")
+    checkpoint = checkpoint or RunCheckpoint()
+    selection = selection or Selection()
+    parts: List[dict] = []
+    if selection.reaches_beyond({BIH_STATE_ID}):
+        with metrics.stage("fetch_gisco") as stage:
+            layers = fetch_gisco_datasets(client, checkpoint, selection)
+            stage.records_out = _layer_count(layers)
+        with metrics.stage("gisco_records", records_in=stage.records_out) as stage:
+            parts.append(checkpoint.stage("gisco.records", lambda: build_gisco_records(*layers)))
+            stage.records_out = _record_count(parts[0])
+        with metrics.stage("place_in_regions", records_in=len(parts[0]["cities"])) as stage:
+            stage.records_out = place_in_regions(parts[0], layers[1], layers[2])
+        parts[0] = selection.filter(parts[0])
+
+    if selection.includes_state(BIH_STATE_ID):
+        if bih_payload is None:
+            bih_payload = load_bih_payload()
+        if bih_payload is not None:
+            print("Merging Bosnia & Herzegovina dataset...")
+            with metrics.stage("bih_records", records_in=len(bih_payload.get("cities", []))) as stage:
+                parts.append(selection.filter(bih_records(bih_payload)))
+                stage.records_out = _record_count(parts[-1])
+
+    with metrics.stage("assemble", records_in=sum(_record_count(part) for part in parts)) as stage:
+        dataset = assemble_dataset(parts)
+        stage.records_out = _record_count(dataset)
+    return dataset
+
+
+def _layer_count(layers: GiscoLayers) -> int:
+    return sum(len(layer) for layer in layers)
+
+
+def _record_count(part: dict) -> int:
+    return sum(len(part.get(table, [])) for table in ("states", "regions", "cities"))
+
+
+def write_output(payload: dict, output_path: Path = OUTPUT_PATH) -> Path:
     """Persist the dataset to the standard location."""
-    output_path = Path(__file__).resolve().parents[2] / "data" / "geo" / "eu_locations.json"
     output_path.parent.mkdir(parents=True, exist_ok=True)
     with output_path.open("w", encoding="utf-8") as stream:
         json.dump(payload, stream, ensure_ascii=False, indent=2)
     return output_path
 
 
-def main() -> int:
+def publish_dataset(
+    dataset: dict,
+    output_path: Path = OUTPUT_PATH,
+    parquet: bool = False,
+    spatial_index: bool = False,
+    pg_copy: bool = False,
+) -> Path:
+    """Write the dataset plus its changeset, autocomplete, state shards and optional sidecars."""
+    output_path = write_output(dataset, output_path)
+    autocomplete_path = write_index(build_index(dataset), autocomplete_path_for(output_path))
+    print(f"   Autocomplete index written to: {autocomplete_path}")
+    manifest_path = write_shards(dataset, shards_dir_for(output_path))
+    print(f"   {describe_shards(manifest_path)} written to: {manifest_path.parent}")
+    if parquet:
+        for path in export_eu_dataset(dataset, output_path):
+            print(f"   Columnar table written to: {path}")
+    if spatial_index:
+        tree = CityKDTree.from_cities(dataset["cities"])
+        spatial_path = tree.save(spatial_index_path_for(output_path))
+        print(f"   Spatial index ({len(tree)} cities) written to: {spatial_path}")
+    if pg_copy:
+        copy_dir = copy_dir_for(output_path)
+        rows = write_copy_files(dataset, copy_dir, source=output_path.name)
+        print(f"   COPY files ({', '.join(f'{table} {count}' for table, count in rows.items())}) written to: {copy_dir}")
+    # Diff against what the database holds, so runs between two seeds
+    # accumulate into one changeset instead of replacing each other's.
+    changeset_path = changeset_path_for(output_path)
+    seeded = load_dataset(seeded_path_for(output_path))
+    if seeded is None:
+        if changeset_path.exists():
+            changeset_path.unlink()
+            print(f"   No seeded dataset to diff against; removed stale {changeset_path.name}")
+        return output_path
+    changeset = build_changeset(seeded, dataset)
+    write_changeset(changeset, changeset_path)
+    if is_empty(changeset):
+        print("   No geography changes since the seeded dataset")
+    else:
+        print(f"   Changeset vs seeded dataset: {summarize(changeset)}")
+    print(f"   Changeset written to: {changeset_path}")
+    return output_path
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build data/geo/eu_locations.json from Eurostat / GISCO.")
+    add_cache_arguments(parser)
+    add_client_arguments(parser, default_concurrency=GISCO_CONCURRENCY)
+    add_metrics_arguments(parser)
+    add_checkpoint_arguments(parser)
+    add_selection_arguments(parser)
+    add_publish_arguments(parser)
+    parser.add_argument(
+        "--lau",
+        action="store_true",
+        help="Also stream every LAU municipality into eu_lau.ndjson (large download; ijson recommended).",
+    )
+    parser.add_argument(
+        "--lau-nuts-csv",
+        type=Path,
+        help="Eurostat LAU -> NUTS 3 correspondence table as CSV, used to link LAUs to regions.",
+    )
+    parser.add_argument(
+        "--lau-chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help=f"LAU records buffered per NDJSON write (default {DEFAULT_CHUNK_SIZE}).",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    selection = selection_from_args(args)
+    previous = load_dataset(OUTPUT_PATH) if selection.partial else None
+    if selection.partial and previous is None:
+        print(f"❌ A partial build merges into {OUTPUT_PATH}, which does not exist; run a full build first")
+        return 1
+    cache = cache_from_args(args)
+    client = create_client(cache, **client_options_from_args(args))
+    checkpoint = checkpoint_from_args(args, selection.run_name("eu_locations"))
+    metrics = RunMetrics(
+        "eu_locations",
+        probes=http_probes(client),
+        profile_dir=profile_dir_for(OUTPUT_PATH) if args.profile else None,
+    )
+    metrics_path = metrics_path_for(OUTPUT_PATH)
+
     print("=" * 72)
     print("Building EU Geography dataset from Eurostat / GISCO resources")
+    if selection.partial:
+        print(f"Partial build: {selection.describe()}; other states are kept from {OUTPUT_PATH.name}")
     print("=" * 72)
 
     try:
-        dataset = build_dataset()
+        dataset = build_dataset(client=client, metrics=metrics, checkpoint=checkpoint, selection=selection)
+        if selection.partial and not _record_count(dataset):
+            print(f"\n❌ Nothing matched {selection.describe()}; {OUTPUT_PATH.name} is left unchanged")
+            return 1
+        if selection.partial:
+            with metrics.stage("merge_partial", records_in=_record_count(dataset)) as stage:
+                dataset = merge_into(previous, dataset, selection)
+                stage.records_out = _record_count(dataset)
+        if args.lau:
+            with metrics.stage("lau", records_in=len(dataset["regions"])) as stage:
+                lau_stats = ingest_lau(dataset, client, args.lau_nuts_csv, chunk_size=args.lau_chunk_size)
+                stage.records_out = lau_stats["written"]
     except DataFetchError as error:
         print(f"\n❌ Data download failed: {error}")
+        print(f"   Finished stages are kept in {checkpoint.run_dir}; rerun with --resume to continue.")
         return 1
-
-    output_path = write_output(dataset)
+    finally:
+        client.close()
+        cache.evict()
+        metrics.write(metrics_path)
+    print(f"   {client.request_count} HTTP requests ({client.controller.summary()}), {cache.summary()}")
+    if args.resume:
+        print(f"   Resumed: {checkpoint.summary()}")
+
+    with metrics.stage("publish", records_in=_record_count(dataset)):
+        output_path = publish_dataset(
+            dataset, parquet=args.parquet, spatial_index=args.spatial_index, pg_copy=args.pg_copy
+        )
+    metrics.write(metrics_path)
+    checkpoint.finish()
 
     print("\nSuccess!")
     print(f"   States: {dataset['metadata']['counts']['states']}")
     print(f"   Regions: {dataset['metadata']['counts']['regions']}")
     print(f"   Cities: {dataset['metadata']['counts']['cities']}")
     print(f"Output written to: {output_path}")
+    print(f"Run metrics written to: {metrics_path}")
     return 0
 
 
@@ -0,0 +1,180 @@
+"""
+Precomputed autocomplete index over city and region names.
+
+Every ``name`` and ``slug`` is folded through ``transliteration.search_folds``
+and split into terms. The index maps each term prefix (up to
+``PREFIX_MAX`` characters) and each term trigram to a sorted postings list
+of entry positions. Entries are ordered by rank (cities before regions,
+official cities first, then by name), so the first N postings of a list are
+already the best N answers.
+
+A consumer folds the query the same way, intersects the prefix postings of
+its terms (checking ``terms`` when a term is longer than ``PREFIX_MAX``), and
+falls back to trigram overlap for typos and infix matches. ``query`` below is
+the reference implementation.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from collections import Counter, defaultdict
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set
+
+from transliteration import search_folds
+
+PREFIX_MAX = 6
+TRIGRAM_MIN_SHARE = 0.5
+
+FIELDS = ("kind", "id", "name", "state_id", "parent_id", "terms")
+KIND_RANK = {"city": 0, "region": 1}
+
+_TERM_SPLIT = re.compile(r"[^a-z0-9]+")
+
+
+def terms_for(*values: Optional[str]) -> List[str]:
+    terms: Dict[str, None] = {}
+    for value in values:
+        if not value:
+            continue
+        for folded in search_folds(value):
+            for term in _TERM_SPLIT.split(folded):
+                if term:
+                    terms[term] = None
+    return list(terms)
+
+
+def trigrams(term: str) -> Set[str]:
+    padded = f" {term}"
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def _entries(dataset: dict) -> List[list]:
+    entries = []
+    for city in dataset.get("cities", []):
+        entries.append(
+            [
+                "city",
+                city.get("city_id"),
+                city.get("name"),
+                city.get("state_id"),
+                city.get("region_id"),
+                terms_for(city.get("name"), city.get("slug")),
+                not city.get("is_official_city", False),
+            ]
+        )
+    for region in dataset.get("regions", []):
+        entries.append(
+            [
+                "region",
+                region.get("region_id"),
+                region.get("name"),
+                region.get("state_id"),
+                region.get("parent_region_id"),
+                terms_for(region.get("name")),
+                False,
+            ]
+        )
+    entries = [entry for entry in entries if entry[1] and entry[2]]
+    entries.sort(key=lambda entry: (KIND_RANK[entry[0]], entry[6], " ".join(entry[5]), entry[1]))
+    return [entry[:6] for entry in entries]
+
+
+def build_index(dataset: dict, prefix_max: int = PREFIX_MAX) -> dict:
+    entries = _entries(dataset)
+    prefixes: Dict[str, List[int]] = defaultdict(list)
+    grams: Dict[str, List[int]] = defaultdict(list)
+    for position, entry in enumerate(entries):
+        keys: Set[str] = set()
+        entry_grams: Set[str] = set()
+        for term in entry[5]:
+            keys.update(term[:length] for length in range(1, min(len(term), prefix_max) + 1))
+            entry_grams |= trigrams(term)
+        for key in keys:
+            prefixes[key].append(position)
+        for gram in entry_grams:
+            grams[gram].append(position)
+
+    return {
+        "metadata": {
+            "generated_at": datetime.now(UTC).isoformat(timespec="seconds"),
+            "dataset_generated_at": (dataset.get("metadata") or {}).get("generated_at"),
+            "prefix_max": prefix_max,
+            "counts": {"entries": len(entries), "prefixes": len(prefixes), "trigrams": len(grams)},
+        },
+        "fields": list(FIELDS),
+        "entries": entries,
+        "prefixes": dict(sorted(prefixes.items())),
+        "trigrams": dict(sorted(grams.items())),
+    }
+
+
+def _prefix_matches(index: dict, term: str) -> Optional[Set[int]]:
+    prefix_max = index["metadata"]["prefix_max"]
+    postings = index["prefixes"].get(term[:prefix_max])
+    if postings is None:
+        return None
+    if len(term) <= prefix_max:
+        return set(postings)
+    entries = index["entries"]
+    return {position for position in postings if any(t.startswith(term) for t in entries[position][5])}
+
+
+def query(
+    index: dict,
+    text: str,
+    limit: int = 10,
+    kinds: Optional[Iterable[str]] = None,
+    state_id: Optional[str] = None,
+) -> List[dict]:
+    """Reference lookup: prefix match on every query term, trigram fallback."""
+    entries = index["entries"]
+    wanted_kinds = set(kinds) if kinds else None
+
+    def accept(position: int) -> bool:
+        entry = entries[position]
+        return (wanted_kinds is None or entry[0] in wanted_kinds) and (state_id is None or entry[3] == state_id)
+
+    query_terms = terms_for(text)
+    if not query_terms:
+        return []
+
+    matched: Optional[Set[int]] = None
+    for term in query_terms:
+        positions = _prefix_matches(index, term) or set()
+        matched = positions if matched is None else matched & positions
+    ranked = sorted(position for position in matched or () if accept(position))
+
+    if len(ranked) < limit:
+        query_grams: Set[str] = set()
+        for term in query_terms:
+            query_grams |= trigrams(term)
+        scores: Counter = Counter()
+        for gram in query_grams:
+            scores.update(index["trigrams"].get(gram, ()))
+        threshold = max(1, int(len(query_grams) * TRIGRAM_MIN_SHARE))
+        seen = set(ranked)
+        fuzzy = sorted(
+            (position for position, score in scores.items() if score >= threshold and position not in seen),
+            key=lambda position: (-scores[position], position),
+        )
+        ranked.extend(position for position in fuzzy if accept(position))
+
+    return [dict(zip(FIELDS, entries[position])) for position in ranked[:limit]]
+
+
+def autocomplete_path_for(output_path: Path) -> Path:
+    return output_path.with_name(f"{output_path.stem}.autocomplete.json")
+
+
+def write_index(index: dict, path: Path) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as stream:
+        json.dump(index, stream, ensure_ascii=False, separators=(",", ":"))
+    return path
+
+
+def describe(results: Sequence[Dict[str, Any]]) -> str:
+    return ", ".join(f"{result['name']} ({result['kind']})" for result in results)
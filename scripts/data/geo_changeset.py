@@ -0,0 +1,120 @@
+"""
+Diff two geography datasets into a compact changeset.
+
+States, regions and cities are keyed on ``state_id``, ``region_id`` and
+``city_id``. Each table gets ``insert`` (full records), ``update`` (only the
+fields that changed, ``None`` for removed fields) and ``delete`` (keys)
+lists. Region inserts are ordered parents-first and deletes children-first
+so the seed can apply them without violating the self-referencing FK.
+``metadata.base_generated_at`` names the dataset the diff starts from; the
+seed only applies a changeset whose base is the dataset it last loaded.
+"""
+
+from __future__ import annotations
+
+import json
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+TABLE_KEYS = (
+    ("states", "state_id"),
+    ("regions", "region_id"),
+    ("cities", "city_id"),
+)
+
+
+def _region_depths(regions: List[dict]) -> Dict[str, int]:
+    parents = {region["region_id"]: region.get("parent_region_id") for region in regions}
+    depths: Dict[str, int] = {}
+    for region_id in parents:
+        chain = []
+        current: Optional[str] = region_id
+        while current in parents and current not in depths and current not in chain:
+            chain.append(current)
+            current = parents[current]
+        base = depths.get(current, -1) if current else -1
+        for offset, node in enumerate(reversed(chain), start=1):
+            depths[node] = base + offset
+    return depths
+
+
+def diff_records(previous: List[dict], current: List[dict], key: str) -> Dict[str, list]:
+    before = {record[key]: record for record in previous if record.get(key)}
+    after = {record[key]: record for record in current if record.get(key)}
+
+    inserts = [record for record_id, record in after.items() if record_id not in before]
+    updates = []
+    for record_id, record in after.items():
+        old = before.get(record_id)
+        if old is None or old == record:
+            continue
+        changes = {field: value for field, value in record.items() if old.get(field) != value}
+        changes.update({field: None for field in old if field not in record})
+        updates.append({"key": record_id, "changes": changes})
+    deletes = [record_id for record_id in before if record_id not in after]
+    return {"insert": inserts, "update": updates, "delete": deletes}
+
+
+def build_changeset(previous: dict, current: dict) -> dict:
+    tables: Dict[str, Dict[str, list]] = {}
+    for table, key in TABLE_KEYS:
+        tables[table] = diff_records(previous.get(table, []), current.get(table, []), key)
+
+    new_depths = _region_depths(current.get("regions", []))
+    old_depths = _region_depths(previous.get("regions", []))
+    tables["regions"]["insert"].sort(key=lambda region: new_depths.get(region["region_id"], 0))
+    tables["regions"]["delete"].sort(key=lambda region_id: -old_depths.get(region_id, 0))
+
+    return {
+        "metadata": {
+            "generated_at": datetime.now(UTC).isoformat(timespec="seconds"),
+            "base_generated_at": (previous.get("metadata") or {}).get("generated_at"),
+            "target_generated_at": (current.get("metadata") or {}).get("generated_at"),
+            "keys": dict(TABLE_KEYS),
+            "counts": {
+                table: {operation: len(items) for operation, items in changes.items()}
+                for table, changes in tables.items()
+            },
+        },
+        **tables,
+    }
+
+
+def is_empty(changeset: dict) -> bool:
+    return not any(
+        items for table, _ in TABLE_KEYS for items in changeset.get(table, {}).values()
+    )
+
+
+def load_dataset(path: Path) -> Optional[dict]:
+    if not path.exists():
+        return None
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except ValueError:
+        return None
+
+
+def changeset_path_for(output_path: Path) -> Path:
+    return output_path.with_name(f"{output_path.stem}.changeset.json")
+
+
+def seeded_path_for(output_path: Path) -> Path:
+    """Copy of the dataset the database was last seeded from (written by backend/prisma/seed.ts)."""
+    return output_path.with_name(f"{output_path.stem}.seeded.json")
+
+
+def write_changeset(changeset: dict, path: Path) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as stream:
+        json.dump(changeset, stream, ensure_ascii=False, separators=(",", ":"))
+    return path
+
+
+def summarize(changeset: dict) -> str:
+    parts = []
+    for table, _ in TABLE_KEYS:
+        counts: Dict[str, Any] = changeset["metadata"]["counts"][table]
+        parts.append(f"{table} +{counts['insert']} ~{counts['update']} -{counts['delete']}")
+    return ", ".join(parts)
@@ -0,0 +1,183 @@
+"""
+Stage checkpoints for resumable runs of the geography fetch scripts.
+
+Every named stage (the municipality table, the title -> QID map, each GISCO
+layer, the transformed records, ...) is written to the run directory as
+gzip-compressed JSON as soon as it completes. Work that arrives in chunks,
+such as Wikidata entities, is appended to a ``Journal`` one chunk per line,
+so a failure mid-stage keeps the chunks that already came back.
+
+A plain run starts by deleting the checkpoint files of an earlier run.
+``--resume`` restores every stage and journal chunk found there and only
+computes the rest. Once the run succeeds its files are deleted (and the
+directory, if nothing else is left in it), so a later ``--resume`` never
+picks up a finished run. Only files this module writes are ever deleted: a
+run directory is marked with a ``.geo-checkpoint`` file, and a non-empty
+directory without the marker is refused rather than cleared.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Iterator, List, Optional, TypeVar
+
+ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_RUNS_DIR = ROOT / "data" / "geo" / ".runs"
+MARKER_NAME = ".geo-checkpoint"
+# Everything RunCheckpoint writes: stages, journals and interrupted stage writes.
+CHECKPOINT_PATTERNS = ("*.json.gz", "*.jsonl", "*.json.gz.*.tmp")
+
+T = TypeVar("T")
+
+
+class Journal:
+    """Append-only JSON lines file of stage chunks."""
+
+    def __init__(self, path: Optional[Path]):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __iter__(self) -> Iterator[Any]:
+        if self.path is None or not self.path.exists():
+            return
+        with self.path.open("r", encoding="utf-8") as stream:
+            for line in stream:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # The run died while writing this chunk; it is fetched again.
+                    return
+
+    def append(self, chunk: Any) -> None:
+        if self.path is None:
+            return
+        line = json.dumps(chunk, ensure_ascii=False, separators=(",", ":"))
+        with self._lock, self.path.open("a", encoding="utf-8") as stream:
+            stream.write(line + "\n")
+            stream.flush()
+            os.fsync(stream.fileno())
+
+
+class RunCheckpoint:
+    def __init__(self, run_dir: Optional[Path] = None, resume: bool = False):
+        self.run_dir = run_dir
+        self.resume = resume
+        self.restored: List[str] = []
+        self._lock = threading.Lock()
+        if run_dir is not None:
+            if not is_checkpoint_dir(run_dir):
+                raise RuntimeError(f"{run_dir} is not empty and holds no checkpoints; choose another --run-dir")
+            if not resume:
+                self._remove_files()
+            run_dir.mkdir(parents=True, exist_ok=True)
+            (run_dir / MARKER_NAME).touch()
+
+    @property
+    def enabled(self) -> bool:
+        return self.run_dir is not None
+
+    def _remove_files(self) -> None:
+        for pattern in CHECKPOINT_PATTERNS:
+            for path in self.run_dir.glob(pattern):
+                path.unlink(missing_ok=True)
+
+    def _path(self, name: str) -> Path:
+        return self.run_dir / f"{name}.json.gz"
+
+    def has(self, name: str) -> bool:
+        """Whether ``load(name)`` will restore a value."""
+        return self.enabled and self.resume and self._path(name).exists()
+
+    def load(self, name: str) -> Optional[Any]:
+        if not self.has(name):
+            return None
+        with gzip.open(self._path(name), "rt", encoding="utf-8") as stream:
+            value = json.load(stream)
+        with self._lock:
+            self.restored.append(name)
+        return value
+
+    def save(self, name: str, value: Any) -> None:
+        if not self.enabled:
+            return
+        path = self._path(name)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=5) as stream:
+            json.dump(value, stream, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def stage(self, name: str, compute: Callable[[], T], decode: Optional[Callable[[Any], T]] = None) -> T:
+        """
+        Return the checkpointed value of ``name`` when resuming, otherwise
+        compute and checkpoint it. ``decode`` rebuilds what JSON flattens
+        (tuples come back as lists).
+        """
+        stored = self.load(name)
+        if stored is not None:
+            return decode(stored) if decode else stored
+        value = compute()
+        self.save(name, value)
+        return value
+
+    def journal(self, name: str) -> Journal:
+        if not self.enabled:
+            return Journal(None)
+        path = self.run_dir / f"{name}.jsonl"
+        if self.resume and path.exists():
+            with self._lock:
+                self.restored.append(name)
+        return Journal(path)
+
+    def finish(self) -> None:
+        """Delete the run's checkpoint files, and its directory if that leaves it empty."""
+        if not self.enabled:
+            return
+        self._remove_files()
+        (self.run_dir / MARKER_NAME).unlink(missing_ok=True)
+        try:
+            self.run_dir.rmdir()
+        except OSError:
+            pass  # holds files this module did not write
+
+    def summary(self) -> str:
+        if not self.restored:
+            return "no checkpoints restored"
+        return f"restored {len(self.restored)} checkpoint(s): {', '.join(sorted(self.restored))}"
+
+
+def is_checkpoint_dir(path: Path) -> bool:
+    """Whether ``path`` may hold checkpoints: missing, empty or marked by an earlier run."""
+    if not path.exists():
+        return True
+    if not path.is_dir():
+        return False
+    return (path / MARKER_NAME).exists() or not any(path.iterdir())
+
+
+def _run_dir(value: str) -> Path:
+    path = Path(value)
+    if not is_checkpoint_dir(path):
+        raise argparse.ArgumentTypeError(f"{path} is not empty and holds no checkpoints")
+    return path
+
+
+def add_checkpoint_arguments(parser: Any) -> None:
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue a failed run from the stages and chunks checkpointed in its run directory.",
+    )
+    parser.add_argument(
+        "--run-dir",
+        type=_run_dir,
+        help=f"Checkpoint directory (default: {DEFAULT_RUNS_DIR.relative_to(ROOT)}/<script>).",
+    )
+
+
+def checkpoint_from_args(args: Any, run: str) -> RunCheckpoint:
+    return RunCheckpoint(args.run_dir or DEFAULT_RUNS_DIR / run, resume=args.resume)
@@ -0,0 +1,207 @@
+"""
+Columnar (Arrow / Parquet) export of the geography datasets.
+
+States, regions and cities are written as one typed Parquet file per table.
+Identifier columns that repeat across rows (``state_id``, ``region_id``,
+``nuts*`` and friends) are dictionary-encoded, so loaders can read just the
+columns they need without parsing the JSON tree.
+
+Requires ``pyarrow`` (``pip install pyarrow``); the JSON outputs do not.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+ColumnSpec = Tuple[str, str, Callable[[dict], Any]]
+
+PARQUET_COMPRESSION = "zstd"
+
+
+def _field(name: str) -> Callable[[dict], Any]:
+    return lambda record: record.get(name)
+
+
+def _nested(*path: str) -> Callable[[dict], Any]:
+    def getter(record: dict) -> Any:
+        value: Any = record
+        for key in path:
+            value = (value or {}).get(key)
+        return value
+
+    return getter
+
+
+def _spec(*columns: Tuple[str, str]) -> List[ColumnSpec]:
+    return [(name, kind, _field(name)) for name, kind in columns]
+
+
+EU_STATE_COLUMNS = _spec(
+    ("state_id", "dict"),
+    ("name", "string"),
+    ("iso2", "dict"),
+    ("iso3", "dict"),
+    ("nuts_id", "dict"),
+    ("capital", "string"),
+)
+
+EU_REGION_COLUMNS = _spec(
+    ("region_id", "string"),
+    ("state_id", "dict"),
+    ("name", "string"),
+    ("nuts_id", "string"),
+    ("nuts_level", "int8"),
+    ("code", "string"),
+    ("type", "dict"),
+    ("parent_region_id", "dict"),
+    ("latitude", "float64"),
+    ("longitude", "float64"),
+)
+
+EU_CITY_COLUMNS = _spec(
+    ("city_id", "string"),
+    ("name", "string"),
+    ("state_id", "dict"),
+    ("country_code", "dict"),
+    ("slug", "string"),
+    ("city_code", "string"),
+    ("ura_code", "string"),
+    ("category", "dict"),
+    ("nuts3_id", "dict"),
+    ("nuts2_id", "dict"),
+    ("region_id", "dict"),
+    ("functional_area_code", "string"),
+    ("area_km2", "float64"),
+    ("latitude", "float64"),
+    ("longitude", "float64"),
+    ("is_official_city", "bool"),
+)
+
+BIH_STATE_COLUMNS = _spec(
+    ("state_id", "dict"),
+    ("name", "string"),
+    ("iso2", "dict"),
+    ("wikidata_id", "string"),
+)
+
+BIH_REGION_COLUMNS = _spec(
+    ("region_id", "string"),
+    ("state_id", "dict"),
+    ("name", "string"),
+    ("code", "string"),
+    ("type", "dict"),
+    ("wikidata_id", "string"),
+    ("parent_region_id", "dict"),
+    ("seat", "string"),
+    ("latitude", "float64"),
+    ("longitude", "float64"),
+)
+
+BIH_CITY_COLUMNS: List[ColumnSpec] = _spec(
+    ("city_id", "string"),
+    ("code", "string"),
+    ("name", "string"),
+    ("slug", "string"),
+    ("wikidata_id", "string"),
+    ("wikipedia_title", "string"),
+    ("is_official_city", "bool"),
+    ("state_id", "dict"),
+) + [
+    ("num_settlements", "int32", _nested("metrics", "num_settlements")),
+    ("population_2013", "int32", _nested("metrics", "population_2013")),
+    ("density_per_km2", "float64", _nested("metrics", "density_per_km2")),
+    ("area_km2", "float64", _nested("metrics", "area_km2")),
+    ("latitude", "float64", _nested("coordinates", "latitude")),
+    ("longitude", "float64", _nested("coordinates", "longitude")),
+    ("municipality_wikidata_id", "string", _nested("municipality", "wikidata_id")),
+    ("municipality_name", "string", _nested("municipality", "name")),
+    ("region_id", "dict", _nested("region", "region_id")),
+    ("region_code", "dict", _nested("region", "code")),
+    ("region_type", "dict", _nested("region", "type")),
+    ("entity_region_id", "dict", _nested("entity", "region_id")),
+    ("entity_code", "dict", _nested("entity", "code")),
+]
+
+
+def _require_pyarrow() -> Any:
+    try:
+        import pyarrow
+        import pyarrow.parquet  # noqa: F401
+    except ImportError as error:  # pragma: no cover - optional dependency
+        raise RuntimeError("Columnar export needs pyarrow: pip install pyarrow") from error
+    return pyarrow
+
+
+def build_table(records: Sequence[dict], columns: Sequence[ColumnSpec], metadata: Dict[str, str]) -> Any:
+    pa = _require_pyarrow()
+    types = {
+        "string": pa.string(),
+        "bool": pa.bool_(),
+        "int8": pa.int8(),
+        "int32": pa.int32(),
+        "float64": pa.float64(),
+    }
+    arrays = []
+    fields = []
+    for name, kind, getter in columns:
+        values = [getter(record) for record in records]
+        if kind == "dict":
+            array = pa.array(values, type=pa.string()).dictionary_encode()
+        else:
+            array = pa.array(values, type=types[kind])
+        arrays.append(array)
+        fields.append(pa.field(name, array.type))
+    schema = pa.schema(fields, metadata=metadata)
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def write_tables(
+    output_dir: Path,
+    tables: Dict[str, Tuple[Sequence[dict], Sequence[ColumnSpec]]],
+    metadata: Dict[str, Any],
+) -> List[Path]:
+    """Write ``{name: (records, columns)}`` as ``output_dir/<name>.parquet``."""
+    pa = _require_pyarrow()
+    output_dir.mkdir(parents=True, exist_ok=True)
+    schema_metadata = {str(key): str(value) for key, value in metadata.items() if value is not None}
+    written = []
+    for name, (records, columns) in tables.items():
+        table = build_table(records, columns, schema_metadata)
+        path = output_dir / f"{name}.parquet"
+        pa.parquet.write_table(table, path, compression=PARQUET_COMPRESSION)
+        written.append(path)
+    return written
+
+
+def columnar_dir_for(output_path: Path) -> Path:
+    """data/geo/eu_locations.json -> data/geo/parquet/eu_locations/"""
+    return output_path.parent / "parquet" / output_path.stem
+
+
+def export_eu_dataset(payload: dict, output_path: Path) -> List[Path]:
+    return write_tables(
+        columnar_dir_for(output_path),
+        {
+            "states": (payload.get("states", []), EU_STATE_COLUMNS),
+            "regions": (payload.get("regions", []), EU_REGION_COLUMNS),
+            "cities": (payload.get("cities", []), EU_CITY_COLUMNS),
+        },
+        {"generated_at": payload.get("metadata", {}).get("generated_at")},
+    )
+
+
+def export_bih_dataset(payload: dict, output_path: Path) -> List[Path]:
+    state = payload.get("state")
+    return write_tables(
+        columnar_dir_for(output_path),
+        {
+            "states": ([state] if state else [], BIH_STATE_COLUMNS),
+            "regions": (payload.get("regions", []), BIH_REGION_COLUMNS),
+            "cities": (payload.get("cities", []), BIH_CITY_COLUMNS),
+        },
+        {
+            "generated_at": payload.get("metadata", {}).get("generated_at"),
+            "source": payload.get("metadata", {}).get("source"),
+        },
+    )
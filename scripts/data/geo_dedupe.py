@@ -0,0 +1,224 @@
+"""
+Cross-source entity resolution for city records.
+
+When several sources contribute cities (GISCO, the BiH scraper, ...), the
+same place can arrive twice under different ids. ``merge_duplicate_cities``
+walks the sources in order and matches every city of a later source against
+the cities already accepted from other sources:
+
+* blocking: candidates share the country, the folded name prefix and a
+  geohash cell (the city's cell or one of its eight neighbours), so each
+  city is compared with a handful of others instead of every city;
+* matching: transliterated names must be at least ``NAME_THRESHOLD``
+  similar and the points at most ``MAX_DISTANCE_KM`` apart. Cities without
+  coordinates only match on an identical folded name. Names are folded
+  with and without German umlaut expansion, so both spellings block together.
+
+A matched city is folded into the first one: the surviving record keeps its
+``city_id`` (a foreign key target), takes over fields it was missing, and
+gets a ``provenance`` list naming every source record merged into it, so
+consumers can remap the dropped ids.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+from collections import defaultdict
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from transliteration import search_folds
+
+GEOHASH_PRECISION = 4  # ~39 x 20 km cells; with neighbours, covers MAX_DISTANCE_KM
+NAME_PREFIX_LENGTH = 3
+NAME_THRESHOLD = 0.85
+MAX_DISTANCE_KM = 10.0
+EARTH_RADIUS_KM = 6371.0088
+
+# Never copied from a merged duplicate: the survivor's identity and references.
+IDENTITY_FIELDS = {"city_id", "slug", "city_code", "state_id", "region_id", "provenance"}
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+BlockKey = Tuple[str, str, str]
+
+
+def geohash(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        target, bounds = (longitude, lng_range) if even else (latitude, lat_range)
+        middle = (bounds[0] + bounds[1]) / 2
+        value <<= 1
+        if target >= middle:
+            value |= 1
+            bounds[0] = middle
+        else:
+            bounds[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def geohash_cell_size(precision: int = GEOHASH_PRECISION) -> Tuple[float, float]:
+    """(latitude, longitude) extent of a cell in degrees."""
+    lng_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2**lat_bits, 360.0 / 2**lng_bits
+
+
+def neighbourhood(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> List[str]:
+    """The point's geohash cell and its eight neighbours."""
+    height, width = geohash_cell_size(precision)
+    cells: Dict[str, None] = {}
+    for d_lat in (0, -1, 1):
+        for d_lng in (0, -1, 1):
+            lat = min(90.0, max(-90.0, latitude + d_lat * height))
+            lng = (longitude + d_lng * width + 180.0) % 360.0 - 180.0
+            cells[geohash(lat, lng, precision)] = None
+    return list(cells)
+
+
+def fold_names(name: Optional[str]) -> Tuple[str, ...]:
+    """Every ASCII spelling of ``name`` (Düren -> duren, dueren), punctuation folded to spaces."""
+    return tuple(dict.fromkeys(_NON_ALNUM.sub(" ", fold).strip() for fold in search_folds(name or "")))
+
+
+def name_score(folds: Sequence[str], other_folds: Sequence[str]) -> float:
+    if set(folds) & set(other_folds):
+        return 1.0
+    return max(SequenceMatcher(None, fold, other).ratio() for fold in folds for other in other_folds)
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _has_point(city: dict) -> bool:
+    return city.get("latitude") is not None and city.get("longitude") is not None
+
+
+class CityBlockIndex:
+    """Accepted cities bucketed by (country, geohash cell, name prefix)."""
+
+    def __init__(self) -> None:
+        self.cities: List[Tuple[dict, str, Tuple[str, ...]]] = []  # (record, source, name folds)
+        self._blocks: Dict[BlockKey, List[int]] = defaultdict(list)
+        self.comparisons = 0
+
+    @staticmethod
+    def _prefixes(folds: Sequence[str]) -> List[str]:
+        return list(dict.fromkeys(fold.replace(" ", "")[:NAME_PREFIX_LENGTH] for fold in folds))
+
+    def add(self, city: dict, source: str) -> None:
+        folds = fold_names(city.get("name"))
+        cell = geohash(city["latitude"], city["longitude"]) if _has_point(city) else ""
+        for prefix in self._prefixes(folds):
+            self._blocks[(city.get("country_code") or "", cell, prefix)].append(len(self.cities))
+        self.cities.append((city, source, folds))
+
+    def _candidates(self, city: dict, folds: Sequence[str]) -> Iterable[int]:
+        country = city.get("country_code") or ""
+        cells = neighbourhood(city["latitude"], city["longitude"]) if _has_point(city) else [""]
+        seen = set()
+        for cell in cells:
+            for prefix in self._prefixes(folds):
+                for position in self._blocks.get((country, cell, prefix), ()):
+                    if position not in seen:
+                        seen.add(position)
+                        yield position
+
+    def best_match(self, city: dict, source: str) -> Optional[Tuple[int, float, Optional[float]]]:
+        """Position of the most similar accepted city from another source, with name score and distance."""
+        folds = fold_names(city.get("name"))
+        best: Optional[Tuple[int, float, Optional[float]]] = None
+        for position in self._candidates(city, folds):
+            other, other_source, other_folds = self.cities[position]
+            if other_source == source:
+                continue
+            self.comparisons += 1
+            score = name_score(folds, other_folds)
+            if score < NAME_THRESHOLD:
+                continue
+            distance = None
+            if _has_point(city) and _has_point(other):
+                distance = haversine_km(city["latitude"], city["longitude"], other["latitude"], other["longitude"])
+                if distance > MAX_DISTANCE_KM:
+                    continue
+            elif score < 1.0:
+                continue
+            if best is None or (score, -(distance or 0.0)) > (best[1], -(best[2] or 0.0)):
+                best = (position, score, distance)
+        return best
+
+
+def merged_record(
+    survivor: dict,
+    survivor_source: str,
+    duplicate: dict,
+    source: str,
+    score: float,
+    distance: Optional[float],
+) -> dict:
+    """``survivor`` with ``duplicate`` folded in and recorded in ``provenance``."""
+    merged = dict(survivor)
+    provenance = list(survivor.get("provenance") or [{"source": survivor_source, "city_id": survivor["city_id"]}])
+    provenance.append(
+        {
+            "source": source,
+            "city_id": duplicate.get("city_id"),
+            "name": duplicate.get("name"),
+            "name_score": round(score, 3),
+            "distance_km": round(distance, 3) if distance is not None else None,
+        }
+    )
+    merged["provenance"] = provenance
+    same_state = duplicate.get("state_id") == survivor.get("state_id")
+    for field, value in duplicate.items():
+        if value is None or merged.get(field) is not None:
+            continue
+        if field in IDENTITY_FIELDS and not (field == "region_id" and same_state):
+            continue
+        merged[field] = value
+    return merged
+
+
+def merge_duplicate_cities(parts: List[dict]) -> Tuple[List[dict], Dict[str, int]]:
+    """
+    Return ``parts`` with cities of later parts folded into matching cities
+    of earlier ones, plus match counters. A part's ``source`` key names it in
+    provenance records. The input parts are not modified.
+    """
+    index = CityBlockIndex()
+    kept: List[List[dict]] = []
+    slots: List[Tuple[int, int]] = []  # index position -> (part, position in kept)
+    merged = 0
+    for part_number, part in enumerate(parts):
+        source = part.get("source") or f"part{part_number}"
+        cities: List[dict] = []
+        kept.append(cities)
+        for city in part.get("cities", []):
+            match = index.best_match(city, source) if part_number else None
+            if match is None:
+                slots.append((part_number, len(cities)))
+                index.add(city, source)
+                cities.append(city)
+                continue
+            position, score, distance = match
+            survivor, survivor_source, folds = index.cities[position]
+            record = merged_record(survivor, survivor_source, city, source, score, distance)
+            index.cities[position] = (record, survivor_source, folds)
+            owner, offset = slots[position]
+            kept[owner][offset] = record
+            merged += 1
+    result = [{**part, "cities": cities} for part, cities in zip(parts, kept)]
+    return result, {"merged": merged, "comparisons": index.comparisons}
@@ -0,0 +1,145 @@
+"""
+Per-stage run metrics for the geography fetch scripts.
+
+``RunMetrics.stage`` wraps one pipeline stage. It records the wall time, how
+much each registered counter moved (HTTP requests, bytes downloaded, HTTP and
+Wikidata resolver cache hits/misses, ...), the records in and out, and the
+process peak RSS when the stage finished. ``write`` dumps the run as JSON next
+to the output file (``<stem>.metrics.json``). With ``profile_dir`` set, each
+stage also runs under cProfile and leaves a ``<stem>.<stage>.prof`` file for
+``python -m pstats``. cProfile only sees the thread that runs the stage, so
+work done in download pools shows up as time spent waiting on futures.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import json
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+Probe = Callable[[], int]
+
+
+def peak_rss_bytes() -> Optional[int]:
+    try:
+        import resource
+    except ImportError:  # pragma: no cover - not available on Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+@dataclass
+class StageMetrics:
+    name: str
+    seconds: float = 0.0
+    records_in: Optional[int] = None
+    records_out: Optional[int] = None
+    counters: Dict[str, int] = field(default_factory=dict)
+    peak_rss_bytes: Optional[int] = None
+    profile: Optional[str] = None
+    failed: bool = False
+
+
+class RunMetrics:
+    def __init__(
+        self,
+        run: str,
+        probes: Optional[Dict[str, Probe]] = None,
+        profile_dir: Optional[Path] = None,
+    ):
+        self.run = run
+        self.probes: Dict[str, Probe] = dict(probes or {})
+        self.profile_dir = profile_dir
+        self.stages: List[StageMetrics] = []
+        self.started_at = datetime.now(UTC).isoformat(timespec="seconds")
+        self._started = time.perf_counter()
+
+    def add_probes(self, **probes: Probe) -> None:
+        self.probes.update(probes)
+
+    def _snapshot(self) -> Dict[str, int]:
+        return {name: probe() for name, probe in self.probes.items()}
+
+    @contextmanager
+    def stage(self, name: str, records_in: Optional[int] = None) -> Iterator[StageMetrics]:
+        """Measure the enclosed block; set ``records_out`` on the yielded object."""
+        metrics = StageMetrics(name, records_in=records_in)
+        before = self._snapshot()
+        profiler = cProfile.Profile() if self.profile_dir else None
+        started = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        try:
+            yield metrics
+        except BaseException:
+            metrics.failed = True
+            raise
+        finally:
+            if profiler:
+                profiler.disable()
+            metrics.seconds = round(time.perf_counter() - started, 4)
+            after = self._snapshot()
+            metrics.counters = {key: value - before.get(key, 0) for key, value in after.items()}
+            metrics.peak_rss_bytes = peak_rss_bytes()
+            if profiler:
+                self.profile_dir.mkdir(parents=True, exist_ok=True)
+                path = self.profile_dir / f"{self.run}.{name}.prof"
+                profiler.dump_stats(str(path))
+                metrics.profile = str(path)
+            self.stages.append(metrics)
+
+    def to_dict(self) -> Dict[str, Any]:
+        totals: Dict[str, int] = {}
+        for stage in self.stages:
+            for key, value in stage.counters.items():
+                totals[key] = totals.get(key, 0) + value
+        return {
+            "run": self.run,
+            "started_at": self.started_at,
+            "seconds": round(time.perf_counter() - self._started, 4),
+            "peak_rss_bytes": peak_rss_bytes(),
+            "counters": totals,
+            "stages": [asdict(stage) for stage in self.stages],
+        }
+
+    def write(self, path: Path) -> Path:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_dict(), indent=2), encoding="utf-8")
+        return path
+
+
+def http_probes(client: Any) -> Dict[str, Probe]:
+    """Request, retry, byte and HTTP cache counters of an ``HttpClient``."""
+    return {
+        "http_requests": lambda: client.request_count,
+        "http_retries": lambda: client.controller.retries,
+        "http_throttled": lambda: client.controller.throttled,
+        "bytes_downloaded": lambda: client.bytes_downloaded,
+        "http_cache_hits": lambda: client.cache.hits,
+        "http_cache_revalidated": lambda: client.cache.revalidated,
+        "http_cache_misses": lambda: client.cache.misses,
+    }
+
+
+def metrics_path_for(output_path: Path) -> Path:
+    return output_path.with_name(f"{output_path.stem}.metrics.json")
+
+
+def profile_dir_for(output_path: Path) -> Path:
+    return output_path.with_name(f"{output_path.stem}.profile")
+
+
+def add_metrics_arguments(parser: Any) -> None:
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Dump a cProfile .prof file per stage into <output>.profile/ next to the metrics JSON.",
+    )
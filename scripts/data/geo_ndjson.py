@@ -0,0 +1,48 @@
+"""
+Newline-delimited JSON for geography tables too large to hold in memory.
+
+``write_ndjson`` consumes a record iterator and writes one compact JSON
+object per line, flushing every ``chunk_size`` records, so a producer that
+streams (see ``geojson_stream.iter_features``) keeps memory bounded by the
+chunk rather than by the row count. The file is written to a temporary name
+and moved into place at the end, so readers never see a partial table.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def write_ndjson(records: Iterable[Dict[str, Any]], path: Path, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """Write ``records`` to ``path`` and return how many were written."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    written = 0
+    buffer: List[str] = []
+    try:
+        with tmp_path.open("w", encoding="utf-8") as stream:
+            for record in records:
+                buffer.append(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+                if len(buffer) >= chunk_size:
+                    stream.write("\n".join(buffer) + "\n")
+                    written += len(buffer)
+                    buffer.clear()
+            if buffer:
+                stream.write("\n".join(buffer) + "\n")
+                written += len(buffer)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    return written
+
+
+def iter_ndjson(path: Path) -> Iterator[Dict[str, Any]]:
+    with path.open("r", encoding="utf-8") as stream:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
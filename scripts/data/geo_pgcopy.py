@@ -0,0 +1,210 @@
+"""
+PostgreSQL COPY files for bulk-loading the geography tables.
+
+``write_copy_files`` turns a dataset into tab-separated files in COPY's text
+format (``\\N`` for NULL, backslash escapes) for ``geo_states``,
+``geo_regions``, ``geo_cities`` and ``admin_regions``, plus ``load.sql``,
+which loads them in one transaction::
+
+    cd data/geo/eu_locations.pgcopy && psql "$DATABASE_URL" -v ON_ERROR_STOP=1 -f load.sql
+
+Geo rows have the same columns as the rows backend/prisma/seed.ts creates.
+Each table is copied into a temporary table, upserted, and rows that are no
+longer in the dataset are deleted (cities first), so a reload equals the
+seed's wipe-and-insert while rows referenced by branches keep their identity.
+
+``admin_regions`` is what backend/scripts/sync-admin-regions.ts would derive
+from those tables: ``level``/``kind`` come from ``ADMIN_LEVEL_BY_TYPE`` and
+rows are ordered parents first. Regions whose parent chain does not reach a
+state are left out, as the script does. Admin regions are only upserted,
+never deleted, because hand-made ones (e.g. the seed's ``DE-BER``) live in
+the same table.
+"""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Mirrors LEVEL_BY_TYPE in backend/scripts/sync-admin-regions.ts.
+ADMIN_LEVEL_BY_TYPE = {
+    "state": 1,
+    "entity": 2,
+    "district": 2,
+    "canton": 3,
+    "municipality": 4,
+    "province": 2,
+    "prefectorate": 2,
+    "nuts2": 2,
+    "nuts3": 3,
+}
+DEFAULT_ADMIN_LEVEL = 2
+LOAD_SCRIPT = "load.sql"
+
+Column = Tuple[str, Callable[[dict], Any]]
+
+
+def _field(name: str) -> Callable[[dict], Any]:
+    return lambda record: record.get(name)
+
+
+def _null(record: dict) -> None:
+    return None
+
+
+def _columns(*names: str, nulls: Sequence[str] = ()) -> List[Column]:
+    null_names = set(nulls)
+    return [(name, _null if name in null_names else _field(name)) for name in names]
+
+
+# Same columns and NULLs as toStateRow / toRegionRow / toCityRow in seed.ts.
+STATE_COLUMNS = _columns(
+    "state_id", "name", "iso2", "iso3", "wikidata_id", "latitude", "longitude",
+    nulls=("wikidata_id", "latitude", "longitude"),
+)  # fmt: skip
+REGION_COLUMNS = _columns(
+    "region_id", "state_id", "parent_region_id", "name", "name_native", "code", "type", "seat",
+    "wikidata_id", "latitude", "longitude",
+    nulls=("name_native", "seat", "wikidata_id"),
+)  # fmt: skip
+CITY_COLUMNS = _columns(
+    "city_id", "state_id", "region_id", "entity_region_id", "name", "slug", "city_code", "wikidata_id",
+    "is_official_city", "latitude", "longitude", "population_2013", "num_settlements", "density_per_km2",
+    "area_km2",
+    nulls=("entity_region_id", "wikidata_id", "population_2013", "num_settlements", "density_per_km2"),
+)  # fmt: skip
+ADMIN_REGION_COLUMNS = _columns(
+    "region_id", "name", "code", "country", "level", "kind", "parent_region_id", "geo_state_id", "geo_region_id",
+)  # fmt: skip
+
+# table -> (columns, primary key, delete rows missing from the dataset)
+TABLES: Dict[str, Tuple[List[Column], str, bool]] = {
+    "geo_states": (STATE_COLUMNS, "state_id", True),
+    "geo_regions": (REGION_COLUMNS, "region_id", True),
+    "geo_cities": (CITY_COLUMNS, "city_id", True),
+    "admin_regions": (ADMIN_REGION_COLUMNS, "region_id", False),
+}
+
+_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def copy_dir_for(output_path: Path) -> Path:
+    return output_path.with_name(f"{output_path.stem}.pgcopy")
+
+
+def copy_value(value: Any) -> str:
+    """One field in COPY text format."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, float):
+        return repr(value)
+    return str(value).translate(_ESCAPES)
+
+
+def admin_level(region_type: Optional[str]) -> int:
+    if not region_type:
+        return DEFAULT_ADMIN_LEVEL
+    return ADMIN_LEVEL_BY_TYPE.get(region_type.lower(), DEFAULT_ADMIN_LEVEL)
+
+
+def admin_region_records(dataset: dict) -> Tuple[List[dict], int]:
+    """
+    ``admin_regions`` rows, parents before children, and the number of
+    regions skipped because their parent chain never reaches a state.
+    """
+    state_names = {state["state_id"]: state["name"] for state in dataset["states"]}
+    records = [
+        {
+            "region_id": state["state_id"],
+            "name": state["name"],
+            "code": state.get("iso2") or state["state_id"].upper(),
+            "country": state["name"],
+            "level": 1,
+            "kind": "state",
+            "parent_region_id": None,
+            "geo_state_id": state["state_id"],
+            "geo_region_id": None,
+        }
+        for state in sorted(dataset["states"], key=lambda state: state["name"])
+    ]
+
+    pending = sorted(dataset["regions"], key=lambda region: (region["state_id"], region["name"]))
+    inserted = set(state_names)
+    while pending:
+        # One pass per depth: a region is emitted once its parent has been.
+        ready = [region for region in pending if (region.get("parent_region_id") or region["state_id"]) in inserted]
+        if not ready:
+            break
+        for region in ready:
+            records.append(
+                {
+                    "region_id": region["region_id"],
+                    "name": region["name"],
+                    "code": region.get("code") or region["region_id"].upper(),
+                    "country": state_names.get(region["state_id"]),
+                    "level": admin_level(region.get("type")),
+                    "kind": region.get("type") or "region",
+                    "parent_region_id": region.get("parent_region_id") or region["state_id"],
+                    "geo_state_id": region["state_id"],
+                    "geo_region_id": region["region_id"],
+                }
+            )
+        inserted.update(region["region_id"] for region in ready)
+        pending = [region for region in pending if region["region_id"] not in inserted]
+    return records, len(pending)
+
+
+def _write_tsv(path: Path, records: Sequence[dict], columns: Sequence[Column]) -> int:
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with tmp_path.open("w", encoding="utf-8", newline="\n") as stream:
+        for record in records:
+            stream.write("\t".join(copy_value(getter(record)) for _, getter in columns) + "\n")
+    os.replace(tmp_path, path)
+    return len(records)
+
+
+def _load_sql(source: str) -> str:
+    lines = [
+        f"-- Generated by scripts/data/geo_pgcopy.py from {source}; do not edit.",
+        f'-- Run from this directory: psql "$DATABASE_URL" -v ON_ERROR_STOP=1 -f {LOAD_SCRIPT}',
+        "BEGIN;",
+        "",
+    ]
+    for table, (columns, key, _) in TABLES.items():
+        names = [name for name, _ in columns]
+        column_list = ", ".join(names)
+        updates = ", ".join(f"{name} = EXCLUDED.{name}" for name in names if name != key)
+        lines += [
+            f"CREATE TEMP TABLE {table}_load ON COMMIT DROP AS SELECT {column_list} FROM {table} WITH NO DATA;",
+            f"\\copy {table}_load ({column_list}) FROM '{table}.tsv'",
+            f"INSERT INTO {table} ({column_list}, updated_at)",
+            f"SELECT {column_list}, now() FROM {table}_load",
+            f"ON CONFLICT ({key}) DO UPDATE SET {updates}, updated_at = EXCLUDED.updated_at;",
+            "",
+        ]
+    for table in ("geo_cities", "geo_regions", "geo_states"):
+        _, key, prune = TABLES[table]
+        if prune:
+            lines.append(f"DELETE FROM {table} WHERE {key} NOT IN (SELECT {key} FROM {table}_load);")
+    lines += ["", "COMMIT;", ""]
+    return "\n".join(lines)
+
+
+def write_copy_files(dataset: dict, directory: Path, source: str = "eu_locations.json") -> Dict[str, int]:
+    """Write the four TSV files and ``load.sql``; return rows written per table."""
+    directory.mkdir(parents=True, exist_ok=True)
+    admin_regions, skipped = admin_region_records(dataset)
+    if skipped:
+        print(f"   ⚠️ {skipped} regions have no parent chain to a state; left out of admin_regions")
+    rows = {
+        "geo_states": dataset["states"],
+        "geo_regions": dataset["regions"],
+        "geo_cities": dataset["cities"],
+        "admin_regions": admin_regions,
+    }
+    written = {table: _write_tsv(directory / f"{table}.tsv", rows[table], TABLES[table][0]) for table in TABLES}
+    (directory / LOAD_SCRIPT).write_text(_load_sql(source), encoding="utf-8")
+    return written
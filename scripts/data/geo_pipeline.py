@@ -0,0 +1,189 @@
+"""
+Source adapters and a dependency-graph stage scheduler for the geography build.
+
+A source adapter wraps one upstream fetcher (GISCO, the BiH Wikipedia/Wikidata
+scraper, ...). It contributes a ``<name>.fetch`` stage that does the network
+work and a ``<name>.transform`` stage that maps the raw result onto the
+state/region/city record layout of eu_locations.json; adapters may add more
+stages (e.g. writing a per-source output file). ``run_stages`` starts every
+stage on a thread pool as soon as its dependencies have finished, so
+independent sources download concurrently and the in-memory merge runs once
+the last transform is done.
+
+New sources subclass ``SourceAdapter`` and are added to ``SOURCES`` with
+``@register_source``; build_geo_dataset.py runs them.
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Type
+
+from geo_checkpoint import RunCheckpoint
+from geo_selection import selection_from_args
+from http_cache import HttpCache
+
+StageFn = Callable[[Dict[str, Any]], Any]
+MERGE_STAGE = "merge"
+
+
+class PipelineError(RuntimeError):
+    """Raised when the stage graph is malformed."""
+
+
+@dataclass
+class Stage:
+    """One unit of work; ``run`` receives the results of ``deps`` by name."""
+
+    name: str
+    run: StageFn
+    deps: Tuple[str, ...] = ()
+
+
+class SourceAdapter(ABC):
+    """Base class for a geography source taking part in the merged build."""
+
+    name = ""
+    description = ""
+
+    def __init__(self, args: argparse.Namespace, cache: HttpCache, checkpoint: Optional[RunCheckpoint] = None):
+        self.args = args
+        self.cache = cache
+        self.checkpoint = checkpoint or RunCheckpoint()
+        self.selection = selection_from_args(args)
+
+    @abstractmethod
+    def fetch(self) -> Any:
+        """Download the source's raw data."""
+
+    @abstractmethod
+    def transform(self, raw: Any) -> dict:
+        """Return ``{"states": [...], "regions": [...], "cities": [...]}``."""
+
+    def sources(self) -> Dict[str, str]:
+        """Upstream URLs recorded under ``metadata.source`` of the merged output."""
+        return {}
+
+    def covers_selection(self) -> bool:
+        """Whether the source can contribute to ``self.selection`` (``--states``/``--regions``)."""
+        return True
+
+    @property
+    def request_count(self) -> int:
+        return 0
+
+    def close(self) -> None:
+        pass
+
+    @property
+    def fetch_stage(self) -> str:
+        return f"{self.name}.fetch"
+
+    @property
+    def transform_stage(self) -> str:
+        return f"{self.name}.transform"
+
+    def stages(self) -> List[Stage]:
+        return [
+            Stage(self.fetch_stage, lambda results: self.fetch()),
+            Stage(
+                self.transform_stage,
+                lambda results: self.transform(results[self.fetch_stage]),
+                (self.fetch_stage,),
+            ),
+        ]
+
+
+SOURCES: Dict[str, Type[SourceAdapter]] = {}
+
+
+def add_publish_arguments(parser: Any) -> None:
+    """Optional sidecars written next to eu_locations.json by ``publish_dataset``."""
+    parser.add_argument(
+        "--parquet",
+        action="store_true",
+        help="Also write typed Parquet tables under data/geo/parquet/ (needs pyarrow).",
+    )
+    parser.add_argument(
+        "--spatial-index",
+        action="store_true",
+        help="Also write a KD-tree over city coordinates to eu_locations.spatial.npz (needs numpy).",
+    )
+    parser.add_argument(
+        "--pg-copy",
+        action="store_true",
+        help="Also write PostgreSQL COPY files and load.sql for the geo and admin_regions tables "
+        "to eu_locations.pgcopy/.",
+    )
+
+
+def register_source(adapter: Type[SourceAdapter]) -> Type[SourceAdapter]:
+    if not adapter.name:
+        raise PipelineError(f"{adapter.__name__} has no name")
+    if adapter.name in SOURCES:
+        raise PipelineError(f"Source {adapter.name!r} is already registered")
+    SOURCES[adapter.name] = adapter
+    return adapter
+
+
+def build_stages(adapters: Sequence[SourceAdapter], merge: Callable[[List[dict]], dict]) -> List[Stage]:
+    """All adapter stages plus a ``merge`` stage over their transforms, in adapter order."""
+    stages = [stage for adapter in adapters for stage in adapter.stages()]
+    transforms = tuple(adapter.transform_stage for adapter in adapters)
+    stages.append(Stage(MERGE_STAGE, lambda results: merge([results[name] for name in transforms]), transforms))
+    return stages
+
+
+def _validate(stages: Sequence[Stage]) -> None:
+    names = set()
+    for stage in stages:
+        if stage.name in names:
+            raise PipelineError(f"Duplicate stage {stage.name!r}")
+        names.add(stage.name)
+    for stage in stages:
+        unknown = [dep for dep in stage.deps if dep not in names]
+        if unknown:
+            raise PipelineError(f"Stage {stage.name!r} depends on unknown stages {unknown}")
+
+
+def run_stages(
+    stages: Sequence[Stage],
+    max_workers: Optional[int] = None,
+    on_done: Optional[Callable[[str, float], None]] = None,
+) -> Dict[str, Any]:
+    """Run ``stages`` as a dependency graph and return their results by name.
+
+    The first stage to fail stops further scheduling; stages already running
+    are allowed to finish and the original exception is re-raised.
+    """
+    _validate(stages)
+    pending = {stage.name: stage for stage in stages}
+    results: Dict[str, Any] = {}
+    running: Dict[Future, Tuple[str, float]] = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers or max(1, len(stages))) as pool:
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if all(dep in results for dep in stage.deps):
+                    inputs = {dep: results[dep] for dep in stage.deps}
+                    running[pool.submit(stage.run, inputs)] = (name, time.perf_counter())
+                    del pending[name]
+            if not running:
+                raise PipelineError(f"Stages never became ready (dependency cycle?): {sorted(pending)}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, started = running.pop(future)
+                error = future.exception()
+                if error is not None:
+                    pending.clear()
+                    wait(running)
+                    raise error
+                results[name] = future.result()
+                if on_done:
+                    on_done(name, time.perf_counter() - started)
+    return results
@@ -0,0 +1,211 @@
+"""
+Vectorized point-in-polygon lookups over NUTS region polygons.
+
+``RegionPolygons`` flattens every ring of every (Multi)Polygon into one array
+of edges, with each polygon owning a contiguous slice, and keeps a bounding
+box per polygon. ``locate`` sorts the points by longitude once; for each
+polygon a binary search plus a latitude mask picks the points inside its
+bounding box, and only those are ray-cast against the polygon's edges in a
+single NumPy broadcast (chunked so the candidate x edge matrix stays small).
+Crossings are counted even-odd over all rings, so holes and multi-part
+regions need no special casing. 100k points against the ~1,200 NUTS 3
+regions take well under a second.
+
+Polygons and points can carry a group key (the country code): a point is
+only tested against polygons of its own group, which keeps generalized
+borders from pulling a city into the neighbouring country.
+
+Centroids are area-weighted (outer rings minus holes) and returned with the
+bounding boxes by ``summaries`` for region coordinates.
+
+Requires ``numpy`` (``pip install numpy``).
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+AVAILABLE = np is not None
+# Upper bound on candidate points x polygon edges evaluated per broadcast.
+MAX_CELLS = 1 << 20
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise RuntimeError("Point-in-polygon lookups need numpy: pip install numpy")
+
+
+def _polygons_of(geometry: Optional[Dict[str, Any]]) -> List[list]:
+    if not geometry:
+        return []
+    if geometry.get("type") == "Polygon":
+        return [geometry.get("coordinates") or []]
+    if geometry.get("type") == "MultiPolygon":
+        return geometry.get("coordinates") or []
+    return []
+
+
+def _coordinates(values: Sequence[Optional[float]]) -> "np.ndarray":
+    return np.asarray([np.nan if value is None else value for value in values], dtype=np.float64)
+
+
+def _ring_array(ring: Sequence[Sequence[float]]) -> "np.ndarray":
+    points = np.asarray([position[:2] for position in ring], dtype=np.float64)
+    if len(points) and not np.array_equal(points[0], points[-1]):
+        points = np.vstack((points, points[:1]))
+    return points
+
+
+def _ring_area_centroid(points: "np.ndarray") -> Tuple[float, float, float]:
+    x0, y0, x1, y1 = points[:-1, 0], points[:-1, 1], points[1:, 0], points[1:, 1]
+    cross = x0 * y1 - x1 * y0
+    area = cross.sum() / 2
+    if area == 0:
+        return 0.0, float(points[:, 0].mean()), float(points[:, 1].mean())
+    cx = ((x0 + x1) * cross).sum() / (6 * area)
+    cy = ((y0 + y1) * cross).sum() / (6 * area)
+    return abs(float(area)), float(cx), float(cy)
+
+
+class RegionPolygons:
+    def __init__(
+        self,
+        ids: Sequence[str],
+        geometries: Sequence[Optional[Dict[str, Any]]],
+        groups: Optional[Sequence[Optional[str]]] = None,
+    ):
+        _require_numpy()
+        edges: List["np.ndarray"] = []
+        self.ids: List[str] = []
+        self.centroids: List[Tuple[float, float]] = []
+        group_codes: Dict[Optional[str], int] = {}
+        starts, stops, boxes, owner_groups = [], [], [], []
+        offset = 0
+
+        for index, (region_id, geometry) in enumerate(zip(ids, geometries)):
+            rings = [
+                (ring_index == 0, _ring_array(ring))
+                for polygon in _polygons_of(geometry)
+                for ring_index, ring in enumerate(polygon)
+                if len(ring) >= 3
+            ]
+            if not rings:
+                continue
+            weight = sum_x = sum_y = 0.0
+            for outer, points in rings:
+                area, cx, cy = _ring_area_centroid(points)
+                sign = 1.0 if outer else -1.0
+                weight += sign * area
+                sum_x += sign * area * cx
+                sum_y += sign * area * cy
+                edges.append(np.hstack((points[:-1], points[1:])))
+            vertices = np.vstack([points for _, points in rings])
+            if weight > 0:
+                self.centroids.append((sum_x / weight, sum_y / weight))
+            else:
+                self.centroids.append((float(vertices[:, 0].mean()), float(vertices[:, 1].mean())))
+
+            count = sum(len(points) - 1 for _, points in rings)
+            starts.append(offset)
+            stops.append(offset + count)
+            offset += count
+            boxes.append((*vertices.min(axis=0), *vertices.max(axis=0)))
+            group = groups[index] if groups is not None else None
+            owner_groups.append(group_codes.setdefault(group, len(group_codes)))
+            self.ids.append(region_id)
+
+        self.edges = np.vstack(edges) if edges else np.empty((0, 4))
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.stops = np.asarray(stops, dtype=np.int64)
+        self.boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        self.groups = np.asarray(owner_groups, dtype=np.int64)
+        self._group_codes = group_codes
+
+    @classmethod
+    def from_features(
+        cls, features: Iterable[Dict[str, Any]], id_key: str, group_key: Optional[str] = None
+    ) -> "RegionPolygons":
+        """Build from ``iter_features(..., keep_geometry=True)`` output."""
+        ids, geometries, groups = [], [], []
+        for feature in features:
+            props = feature.get("properties") or {}
+            ids.append(props.get(id_key))
+            geometries.append(feature.get("geometry"))
+            groups.append(props.get(group_key) if group_key else None)
+        return cls(ids, geometries, groups if group_key else None)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def summaries(self) -> Dict[str, Dict[str, Any]]:
+        """Region id -> ``{"latitude", "longitude", "bbox": [minx, miny, maxx, maxy]}``."""
+        return {
+            region_id: {
+                "latitude": round(cy, 6),
+                "longitude": round(cx, 6),
+                "bbox": [round(float(value), 6) for value in box],
+            }
+            for region_id, (cx, cy), box in zip(self.ids, self.centroids, self.boxes)
+        }
+
+    def _contains(self, polygon: int, x: "np.ndarray", y: "np.ndarray") -> "np.ndarray":
+        ex0, ey0, ex1, ey1 = self.edges[self.starts[polygon] : self.stops[polygon]].T
+        inside = np.zeros(len(x), dtype=bool)
+        step = max(1, MAX_CELLS // max(1, len(ex0)))
+        for start in range(0, len(x), step):
+            px = x[start : start + step, None]
+            py = y[start : start + step, None]
+            straddles = (ey0 > py) != (ey1 > py)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                crossing_x = ex0 + (py - ey0) * (ex1 - ex0) / (ey1 - ey0)
+            crossings = np.count_nonzero(straddles & (px < crossing_x), axis=1)
+            inside[start : start + step] = crossings % 2 == 1
+        return inside
+
+    def locate_indices(
+        self,
+        longitudes: Sequence[float],
+        latitudes: Sequence[float],
+        groups: Optional[Sequence[Optional[str]]] = None,
+    ) -> "np.ndarray":
+        """Index of the polygon containing each point, or -1 (first match wins)."""
+        x = _coordinates(longitudes)
+        y = _coordinates(latitudes)
+        result = np.full(len(x), -1, dtype=np.int64)
+        point_groups = None
+        polygons: Iterable[int] = range(len(self.ids))
+        if groups is not None:
+            point_groups = np.asarray([self._group_codes.get(group, -1) for group in groups], dtype=np.int64)
+            polygons = np.flatnonzero(np.isin(self.groups, point_groups))
+
+        valid = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+        order = valid[np.argsort(x[valid], kind="stable")]
+        sorted_x = x[order]
+        for polygon in polygons:
+            min_x, min_y, max_x, max_y = self.boxes[polygon]
+            lo = np.searchsorted(sorted_x, min_x, side="left")
+            hi = np.searchsorted(sorted_x, max_x, side="right")
+            if lo >= hi:
+                continue
+            candidates = order[lo:hi]
+            mask = (y[candidates] >= min_y) & (y[candidates] <= max_y) & (result[candidates] < 0)
+            if point_groups is not None:
+                mask &= point_groups[candidates] == self.groups[polygon]
+            candidates = candidates[mask]
+            if len(candidates):
+                result[candidates[self._contains(polygon, x[candidates], y[candidates])]] = polygon
+        return result
+
+    def locate(
+        self,
+        longitudes: Sequence[float],
+        latitudes: Sequence[float],
+        groups: Optional[Sequence[Optional[str]]] = None,
+    ) -> List[Optional[str]]:
+        """Id of the polygon containing each point, or None."""
+        return [self.ids[index] if index >= 0 else None for index in self.locate_indices(longitudes, latitudes, groups)]
@@ -0,0 +1,199 @@
+"""
+Partial geography builds restricted to some states or NUTS regions.
+
+``--states de,bih`` limits a build to whole states (by ``state_id``).
+``--regions DE1,AT13`` limits it to the NUTS 2/3 regions whose code starts
+with one of the prefixes, plus the cities inside them. The two can be
+combined. Fetchers keep only the selected countries' features, and sources
+that cannot contribute (BiH for an EU-only selection, GISCO for ``bih``)
+are skipped. ``merge_into`` then splices the result into the existing
+output: records in the selection's scope are replaced in place (new ones
+next to their neighbours in a full build, missing ones dropped), and every
+other state's records are kept as they were. A partial run needs that
+output, so there must have been a full build first.
+
+The selectors live on fetch_eu_locations.py and build_geo_dataset.py, the
+two scripts that write eu_locations.json; fetch_bih_locations.py has none.
+BiH is selected as a whole (``--states bih``): a municipality's entity and
+canton are only known once its P131 chain has been resolved on Wikidata,
+which is the costly part of that fetcher, so a canton selector could not
+skip any of it. Warm runs resolve from the local entity store anyway (see
+wikidata_store.py).
+
+GISCO publishes each layer as one EU-wide file, so a partial run still
+revalidates those files in the HTTP cache. Parsing, record building and
+point-in-polygon placement are limited to the selection, which is where the
+time goes.
+"""
+
+from __future__ import annotations
+
+import argparse
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from geo_changeset import TABLE_KEYS
+
+TABLES = tuple(table for table, _ in TABLE_KEYS)
+_NUTS_PREFIX = re.compile(r"^[A-Z]{2}[0-9A-Z]{0,3}$")
+
+
+@dataclass(frozen=True)
+class Selection:
+    states: FrozenSet[str] = frozenset()
+    regions: Tuple[str, ...] = ()
+
+    @property
+    def partial(self) -> bool:
+        return bool(self.states or self.regions)
+
+    @property
+    def touched_states(self) -> FrozenSet[str]:
+        """States whose records may change: whole states plus the countries of region prefixes."""
+        return self.states | {prefix[:2].lower() for prefix in self.regions}
+
+    def includes_state(self, state_id: Optional[str]) -> bool:
+        return not self.partial or state_id in self.touched_states
+
+    def reaches_beyond(self, state_ids: Iterable[str]) -> bool:
+        """Whether anything outside ``state_ids`` is selected (always true for a full build)."""
+        return not self.partial or bool(self.regions) or bool(self.states - set(state_ids))
+
+    def _in_regions(self, state_id: Optional[str], nuts_id: Optional[str]) -> bool:
+        nuts_id = (nuts_id or "").upper()
+        return any(state_id == prefix[:2].lower() and nuts_id.startswith(prefix) for prefix in self.regions)
+
+    def keeps_nuts(self, nuts_id: str) -> bool:
+        """NUTS regions a fetcher keeps: selected ones and their ancestors (for parent links)."""
+        if not self.partial or nuts_id[:2].lower() in self.states:
+            return True
+        return any(nuts_id.startswith(prefix) or prefix.startswith(nuts_id) for prefix in self.regions)
+
+    def includes(self, table: str, record: dict) -> bool:
+        """Whether ``record`` of ``table`` is in scope, i.e. rebuilt by this selection."""
+        if not self.partial:
+            return True
+        state_id = record.get("state_id")
+        if table == "states":
+            return state_id in self.touched_states
+        if state_id in self.states:
+            return True
+        nuts_id = record.get("nuts_id") if table == "regions" else record.get("nuts3_id")
+        return self._in_regions(state_id, nuts_id)
+
+    def filter(self, part: dict) -> dict:
+        """``part`` with only the in-scope records of each table."""
+        if not self.partial:
+            return part
+        return {**part, **{table: [r for r in part.get(table, []) if self.includes(table, r)] for table in TABLES}}
+
+    def run_name(self, name: str) -> str:
+        """Checkpoint run name; partial runs get their own directory."""
+        if not self.partial:
+            return name
+        return f"{name}.{'+'.join(sorted(self.states) + list(self.regions))}"
+
+    def describe(self) -> str:
+        parts = []
+        if self.states:
+            parts.append(f"states {', '.join(sorted(self.states))}")
+        if self.regions:
+            parts.append(f"NUTS {', '.join(self.regions)}")
+        return "; ".join(parts) or "everything"
+
+
+def _merge_table(previous: List[dict], fresh: List[dict], key: str, in_scope: Callable[[dict], bool]) -> List[dict]:
+    """
+    ``previous`` with in-scope records replaced by their ``fresh`` version (or
+    dropped when gone), in place. A record new in ``fresh`` goes right after
+    the fresh record it follows, so a rebuild keeps the order a full run has.
+    """
+    fresh_by_key = {record[key]: record for record in fresh}
+    kept_keys = {record[key] for record in previous if in_scope(record)} & set(fresh_by_key)
+    following: Dict[Optional[str], List[dict]] = defaultdict(list)
+    anchor: Optional[str] = None
+    for record in fresh:
+        if record[key] in kept_keys:
+            anchor = record[key]
+        else:
+            following[anchor].append(record)
+
+    merged: List[dict] = []
+    for record in previous:
+        if not in_scope(record):
+            merged.append(record)
+            continue
+        merged.extend(following.pop(None, []))
+        if record[key] in fresh_by_key:
+            merged.append(fresh_by_key[record[key]])
+            merged.extend(following.pop(record[key], []))
+    for records in following.values():
+        merged.extend(records)
+    return merged
+
+
+def merge_into(previous: dict, partial: dict, selection: Selection) -> dict:
+    """
+    Replace the selection's records in ``previous`` with those of ``partial``;
+    records of other states are kept unchanged and in order.
+    """
+    partial = selection.filter(partial)
+    merged = {
+        table: _merge_table(
+            previous.get(table, []),
+            partial.get(table, []),
+            key,
+            lambda record, table=table: selection.includes(table, record),
+        )
+        for table, key in TABLE_KEYS
+    }
+
+    previous_metadata = previous.get("metadata") or {}
+    partial_metadata = partial.get("metadata") or {}
+    metadata = {
+        "generated_at": datetime.now(UTC).isoformat(timespec="seconds"),
+        "source": {**previous_metadata.get("source", {}), **partial_metadata.get("source", {})},
+        "counts": {table: len(merged[table]) for table in TABLES},
+        # Merged cities keep a provenance entry per folded record, so the total
+        # is recounted; comparisons only cover what this run matched.
+        "dedupe": {
+            "merged": sum(len(city.get("provenance") or [None]) - 1 for city in merged["cities"]),
+            "comparisons": (partial_metadata.get("dedupe") or {}).get("comparisons", 0),
+        },
+        "partial": {"states": sorted(selection.states), "regions": list(selection.regions)},
+    }
+    return {"metadata": metadata, **merged}
+
+
+def _state_list(value: str) -> FrozenSet[str]:
+    return frozenset(item.strip().lower() for item in value.split(",") if item.strip())
+
+
+def _region_list(value: str) -> Tuple[str, ...]:
+    prefixes = tuple(dict.fromkeys(item.strip().upper() for item in value.split(",") if item.strip()))
+    invalid = [prefix for prefix in prefixes if not _NUTS_PREFIX.match(prefix)]
+    if invalid:
+        raise argparse.ArgumentTypeError(f"not NUTS code prefixes: {', '.join(invalid)}")
+    return prefixes
+
+
+def add_selection_arguments(parser: Any) -> None:
+    parser.add_argument(
+        "--states",
+        type=_state_list,
+        default=frozenset(),
+        help="Comma-separated state_ids (e.g. de,at,bih) to rebuild and merge into the existing output.",
+    )
+    parser.add_argument(
+        "--regions",
+        type=_region_list,
+        default=(),
+        help="Comma-separated NUTS code prefixes (e.g. DE1,AT13) to rebuild and merge into the existing output.",
+    )
+
+
+def selection_from_args(args: Any) -> Selection:
+    return Selection(getattr(args, "states", frozenset()), getattr(args, "regions", ()))
@@ -0,0 +1,148 @@
+"""
+Per-state shards of a geography dataset, plus a manifest.
+
+``write_shards`` splits a dataset (``states``/``regions``/``cities``) by
+``state_id`` and writes each state as minified JSON next to precompressed
+``.gz`` and, when ``brotli`` is installed, ``.br`` copies, so a web server can
+hand out the encoding a client accepts without compressing on the fly.
+
+``manifest.json`` lists every shard with its record counts, byte sizes and
+the SHA-256 of the minified JSON. Shards carry no timestamp, so the hash only
+changes when a state's records do: consumers load the manifest, fetch just
+the states they need and cache them by hash. ``load_shard`` is the reference
+reader.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+from collections import defaultdict
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+TABLES = ("states", "regions", "cities")
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+
+def shards_dir_for(output_path: Path) -> Path:
+    return output_path.with_name(f"{output_path.stem}.shards")
+
+
+def _minified(payload: Any) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _write_bytes(path: Path, body: bytes) -> None:
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_bytes(body)
+    os.replace(tmp_path, path)
+
+
+def _encodings(body: bytes) -> Dict[str, tuple]:
+    """Encoding name -> (file suffix, encoded bytes)."""
+    # mtime=0 keeps the gzip bytes identical across rebuilds of the same shard.
+    encoded = {"gzip": (".gz", gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0))}
+    if brotli is not None:
+        encoded["br"] = (".br", brotli.compress(body, quality=BROTLI_QUALITY))
+    return encoded
+
+
+def split_by_state(dataset: dict) -> Dict[str, Dict[str, List[dict]]]:
+    """state_id -> the dataset's tables restricted to that state, in dataset order."""
+    shards: Dict[str, Dict[str, List[dict]]] = defaultdict(lambda: {table: [] for table in TABLES})
+    for table in TABLES:
+        for record in dataset.get(table, []):
+            shards[record["state_id"]][table].append(record)
+    return dict(shards)
+
+
+def write_shards(dataset: dict, directory: Path) -> Path:
+    """Write one shard per state plus ``manifest.json``; return the manifest path."""
+    directory.mkdir(parents=True, exist_ok=True)
+    sources = dataset.get("metadata", {}).get("source", {})
+    entries: Dict[str, dict] = {}
+    keep = {MANIFEST_NAME}
+
+    for state_id, tables in split_by_state(dataset).items():
+        counts = {table: len(tables[table]) for table in TABLES}
+        body = _minified({"metadata": {"state_id": state_id, "source": sources, "counts": counts}, **tables})
+        filename = f"{state_id}.json"
+        _write_bytes(directory / filename, body)
+        keep.add(filename)
+        encodings = {}
+        for encoding, (suffix, encoded) in _encodings(body).items():
+            _write_bytes(directory / f"{filename}{suffix}", encoded)
+            keep.add(f"{filename}{suffix}")
+            encodings[encoding] = {"file": f"{filename}{suffix}", "bytes": len(encoded)}
+        state = next(iter(tables["states"]), {})
+        entries[state_id] = {
+            "name": state.get("name"),
+            "iso2": state.get("iso2"),
+            "file": filename,
+            "bytes": len(body),
+            "sha256": hashlib.sha256(body).hexdigest(),
+            "counts": counts,
+            "encodings": encodings,
+        }
+
+    for stale in directory.iterdir():
+        if stale.is_file() and stale.name not in keep:
+            stale.unlink()
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "generated_at": datetime.now(UTC).isoformat(timespec="seconds"),
+        "hash": "sha256",
+        "counts": {table: sum(entry["counts"][table] for entry in entries.values()) for table in TABLES},
+        "states": dict(sorted(entries.items())),
+    }
+    manifest_path = directory / MANIFEST_NAME
+    _write_bytes(manifest_path, json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8"))
+    return manifest_path
+
+
+def load_manifest(directory: Path) -> Optional[dict]:
+    path = directory / MANIFEST_NAME
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def load_shard(directory: Path, state_id: str, manifest: Optional[dict] = None) -> dict:
+    """Read one state's shard, preferring the gzip copy, and check it against the manifest hash."""
+    manifest = manifest or load_manifest(directory)
+    if manifest is None or state_id not in manifest["states"]:
+        raise KeyError(f"No shard for state {state_id!r} in {directory}")
+    entry = manifest["states"][state_id]
+    gzip_entry = entry["encodings"].get("gzip")
+    if gzip_entry and (directory / gzip_entry["file"]).exists():
+        body = gzip.decompress((directory / gzip_entry["file"]).read_bytes())
+    else:
+        body = (directory / entry["file"]).read_bytes()
+    if hashlib.sha256(body).hexdigest() != entry["sha256"]:
+        raise ValueError(f"Shard {entry['file']} does not match its manifest hash")
+    return json.loads(body)
+
+
+def describe(manifest_path: Path) -> str:
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    states = manifest["states"].values()
+    raw = sum(entry["bytes"] for entry in states)
+    encoded = {
+        encoding: sum(entry["encodings"][encoding]["bytes"] for entry in states if encoding in entry["encodings"])
+        for encoding in ("gzip", "br")
+    }
+    sizes = ", ".join(f"{encoding} {size / 1024:.0f} KB" for encoding, size in encoded.items() if size)
+    return f"{len(manifest['states'])} state shards ({raw / 1024:.0f} KB minified; {sizes})"
@@ -0,0 +1,216 @@
+"""
+KD-tree over city coordinates for nearest-city and radius lookups.
+
+Latitude/longitude pairs are mapped to unit vectors on the sphere, where
+straight-line (chord) distance orders points exactly like great-circle
+distance, so an ordinary 3-D KD-tree answers geographic queries. The tree is
+implicit: points are permuted so every node owns a contiguous index range,
+and each node stores its range and bounding box. Queries visit O(log n)
+nodes and compare leaf buckets with vectorized NumPy distance math.
+
+``CityKDTree.save`` writes the permuted points and node arrays to an ``.npz``
+file at pipeline time; ``CityKDTree.load`` restores it without rebuilding.
+
+Requires ``numpy`` (``pip install numpy``).
+"""
+
+from __future__ import annotations
+
+import heapq
+import math
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+EARTH_RADIUS_KM = 6371.0088
+DEFAULT_LEAF_SIZE = 16
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise RuntimeError("The spatial index needs numpy: pip install numpy")
+
+
+def to_unit_vectors(latitudes: Sequence[float], longitudes: Sequence[float]) -> "np.ndarray":
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lng = np.radians(np.asarray(longitudes, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lng), cos_lat * np.sin(lng), np.sin(lat)))
+
+
+def chord_to_km(chord: "np.ndarray") -> "np.ndarray":
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0.0, 1.0))
+
+
+def km_to_chord(distance_km: float) -> float:
+    return 2 * math.sin(min(distance_km / EARTH_RADIUS_KM, math.pi) / 2)
+
+
+class CityKDTree:
+    def __init__(
+        self,
+        ids: Sequence[str],
+        latitudes: Sequence[float],
+        longitudes: Sequence[float],
+        leaf_size: int = DEFAULT_LEAF_SIZE,
+    ):
+        _require_numpy()
+        self.leaf_size = max(1, leaf_size)
+        points = to_unit_vectors(latitudes, longitudes)
+        order = np.arange(len(ids))
+
+        starts: List[int] = []
+        stops: List[int] = []
+        children: List[Tuple[int, int]] = []
+        stack = [(0, len(ids), -1, 0)]  # (start, stop, parent, side)
+        while stack:
+            start, stop, parent, side = stack.pop()
+            node = len(starts)
+            starts.append(start)
+            stops.append(stop)
+            children.append((-1, -1))
+            if parent >= 0:
+                left, right = children[parent]
+                children[parent] = (node, right) if side == 0 else (left, node)
+            if stop - start <= self.leaf_size:
+                continue
+            segment = order[start:stop]
+            axis = int(np.argmax(np.ptp(points[segment], axis=0)))
+            mid = (stop - start) // 2
+            partitioned = segment[np.argpartition(points[segment, axis], mid)]
+            order[start:stop] = partitioned
+            stack.append((start + mid, stop, node, 1))
+            stack.append((start, start + mid, node, 0))
+
+        self.points = points[order]
+        self.ids = np.asarray(ids, dtype=object)[order]
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.stops = np.asarray(stops, dtype=np.int64)
+        self.children = np.asarray(children, dtype=np.int64).reshape(-1, 2)
+        self._compute_boxes()
+
+    def _compute_boxes(self) -> None:
+        count = len(self.starts)
+        self.box_min = np.zeros((count, 3))
+        self.box_max = np.zeros((count, 3))
+        for node in range(count):
+            segment = self.points[self.starts[node] : self.stops[node]]
+            if len(segment):
+                self.box_min[node] = segment.min(axis=0)
+                self.box_max[node] = segment.max(axis=0)
+
+    @classmethod
+    def from_cities(cls, cities: Iterable[dict], leaf_size: int = DEFAULT_LEAF_SIZE) -> "CityKDTree":
+        ids, latitudes, longitudes = [], [], []
+        for city in cities:
+            coordinates = city.get("coordinates") or {}
+            lat = city.get("latitude", coordinates.get("latitude"))
+            lng = city.get("longitude", coordinates.get("longitude"))
+            if city.get("city_id") and lat is not None and lng is not None:
+                ids.append(city["city_id"])
+                latitudes.append(lat)
+                longitudes.append(lng)
+        return cls(ids, latitudes, longitudes, leaf_size=leaf_size)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _box_distance(self, node: int, point: "np.ndarray") -> float:
+        gap = np.maximum(np.maximum(self.box_min[node] - point, point - self.box_max[node]), 0.0)
+        return float(np.sqrt(gap @ gap))
+
+    def _is_leaf(self, node: int) -> bool:
+        return self.children[node, 0] < 0
+
+    def nearest(self, latitude: float, longitude: float, count: int = 5) -> List[Tuple[str, float]]:
+        """The ``count`` closest cities as ``(city_id, distance_km)``, nearest first."""
+        if not len(self) or count <= 0:
+            return []
+        point = to_unit_vectors([latitude], [longitude])[0]
+        best: List[Tuple[float, int]] = []  # max-heap via negated chord
+        frontier = [(0.0, 0)]
+        while frontier:
+            bound, node = heapq.heappop(frontier)
+            if len(best) == count and bound > -best[0][0]:
+                break
+            if self._is_leaf(node):
+                start, stop = self.starts[node], self.stops[node]
+                chords = np.linalg.norm(self.points[start:stop] - point, axis=1)
+                for offset, chord in enumerate(chords):
+                    if len(best) < count:
+                        heapq.heappush(best, (-chord, start + offset))
+                    elif chord < -best[0][0]:
+                        heapq.heapreplace(best, (-chord, start + offset))
+                continue
+            for child in self.children[node]:
+                heapq.heappush(frontier, (self._box_distance(child, point), int(child)))
+
+        ranked = sorted((-negated, index) for negated, index in best)
+        distances = chord_to_km(np.asarray([chord for chord, _ in ranked]))
+        return [(self.ids[index], float(km)) for (_, index), km in zip(ranked, distances)]
+
+    def within(self, latitude: float, longitude: float, radius_km: float) -> List[Tuple[str, float]]:
+        """All cities within ``radius_km`` as ``(city_id, distance_km)``, nearest first."""
+        if not len(self):
+            return []
+        point = to_unit_vectors([latitude], [longitude])[0]
+        limit = km_to_chord(radius_km)
+        hits: List[Tuple[float, int]] = []
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            if self._box_distance(node, point) > limit:
+                continue
+            if self._is_leaf(node):
+                start, stop = self.starts[node], self.stops[node]
+                chords = np.linalg.norm(self.points[start:stop] - point, axis=1)
+                for offset in np.nonzero(chords <= limit)[0]:
+                    hits.append((float(chords[offset]), int(start + offset)))
+                continue
+            stack.extend(int(child) for child in self.children[node])
+        hits.sort()
+        distances = chord_to_km(np.asarray([chord for chord, _ in hits]))
+        return [(self.ids[index], float(km)) for (_, index), km in zip(hits, distances)]
+
+    def save(self, path: Path) -> Path:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(
+            path,
+            ids=self.ids.astype(str),
+            points=self.points,
+            starts=self.starts,
+            stops=self.stops,
+            children=self.children,
+            box_min=self.box_min,
+            box_max=self.box_max,
+            leaf_size=np.asarray(self.leaf_size),
+        )
+        return path
+
+    @classmethod
+    def load(cls, path: Path) -> "CityKDTree":
+        _require_numpy()
+        with np.load(path, allow_pickle=False) as data:
+            tree = cls.__new__(cls)
+            tree.ids = data["ids"].astype(object)
+            tree.points = data["points"]
+            tree.starts = data["starts"]
+            tree.stops = data["stops"]
+            tree.children = data["children"]
+            tree.box_min = data["box_min"]
+            tree.box_max = data["box_max"]
+            tree.leaf_size = int(data["leaf_size"])
+        return tree
+
+
+def spatial_index_path_for(output_path: Path) -> Path:
+    return output_path.with_name(f"{output_path.stem}.spatial.npz")
+
+
+def nearest_city(tree: CityKDTree, latitude: float, longitude: float) -> Optional[Tuple[str, float]]:
+    matches = tree.nearest(latitude, longitude, 1)
+    return matches[0] if matches else None
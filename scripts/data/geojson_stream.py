@@ -0,0 +1,228 @@
+"""
+Incremental GeoJSON feature reader for the large GISCO downloads.
+
+``iter_features`` walks a FeatureCollection event by event and only builds
+Python objects for each feature's ``properties`` (plus the coordinates of
+Point geometries when asked). Polygon coordinate arrays are tokenized and
+dropped, so memory stays flat regardless of the dataset resolution. With
+``summarize_geometry`` each vertex is folded into a running bounding box and
+vertex-mean centroid (ring closing vertices excluded) as it streams past, which is enough to place a LAU
+polygon without ever holding its rings. ``keep_geometry`` builds the full
+geometry instead, for small layers whose polygons are needed (NUTS regions
+for point-in-polygon lookups, see geo_polygons.py).
+
+Streaming needs ``ijson`` (``pip install ijson``; the yajl2_c backend is
+picked automatically when available). Without it the reader falls back to
+``json.load`` and yields the same records from the fully parsed document.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import ijson
+except ImportError:  # pragma: no cover - optional dependency
+    ijson = None
+
+FEATURE_PREFIX = "features.item"
+PROPERTIES_PREFIX = f"{FEATURE_PREFIX}.properties"
+GEOMETRY_PREFIX = f"{FEATURE_PREFIX}.geometry"
+GEOMETRY_TYPE_PREFIX = f"{GEOMETRY_PREFIX}.type"
+COORDINATES_PREFIX = f"{GEOMETRY_PREFIX}.coordinates"
+POINT_COORD_PREFIX = f"{COORDINATES_PREFIX}.item"
+
+STREAMING = ijson is not None
+
+
+def _is_position(value: Any) -> bool:
+    return isinstance(value, (list, tuple)) and bool(value) and isinstance(value[0], (int, float))
+
+
+class VertexSummary:
+    """
+    Running bounding box and vertex mean over ``[lon, lat, ...]`` positions.
+    A ring's closing position repeats its first one and is left out of the
+    mean, so it does not pull the centroid towards the first vertex.
+    """
+
+    __slots__ = (
+        "count",
+        "sum_x",
+        "sum_y",
+        "min_x",
+        "min_y",
+        "max_x",
+        "max_y",
+        "_axis",
+        "_x",
+        "_depth",
+        "_position_depth",
+        "_ring_first",
+        "_ring_last",
+        "_ring_size",
+    )
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.sum_x = self.sum_y = 0.0
+        self.min_x = self.min_y = float("inf")
+        self.max_x = self.max_y = float("-inf")
+        self._axis = 0
+        self._x = 0.0
+        self._depth = 0
+        self._position_depth: Optional[int] = None
+        self._ring_first: Optional[Tuple[float, float]] = None
+        self._ring_last: Optional[Tuple[float, float]] = None
+        self._ring_size = 0
+
+    def start_array(self) -> None:
+        self._depth += 1
+        self._axis = 0
+
+    def end_array(self) -> None:
+        if self._position_depth is not None and self._depth == self._position_depth - 1:
+            self.end_ring()
+        self._depth -= 1
+
+    def add_number(self, value: float) -> None:
+        self._position_depth = self._depth
+        if self._axis == 0:
+            self._x = value
+        elif self._axis == 1:
+            self.add(self._x, value)
+        self._axis += 1
+
+    def add(self, x: float, y: float) -> None:
+        self.count += 1
+        self.sum_x += x
+        self.sum_y += y
+        self.min_x, self.max_x = min(self.min_x, x), max(self.max_x, x)
+        self.min_y, self.max_y = min(self.min_y, y), max(self.max_y, y)
+        if self._ring_first is None:
+            self._ring_first = (x, y)
+        self._ring_last = (x, y)
+        self._ring_size += 1
+
+    def end_ring(self) -> None:
+        if self._ring_size > 1 and self._ring_last == self._ring_first:
+            self.count -= 1
+            self.sum_x -= self._ring_last[0]
+            self.sum_y -= self._ring_last[1]
+        self._ring_first = self._ring_last = None
+        self._ring_size = 0
+
+    def add_coordinates(self, coordinates: Any) -> None:
+        if coordinates and isinstance(coordinates[0], (int, float)):
+            if len(coordinates) >= 2:
+                self.add(coordinates[0], coordinates[1])
+            return
+        for item in coordinates or ():
+            self.add_coordinates(item)
+        if coordinates and _is_position(coordinates[0]):
+            self.end_ring()
+
+    def geometry(self, geometry_type: Optional[str]) -> Optional[Dict[str, Any]]:
+        if not self.count:
+            return None
+        return {
+            "type": geometry_type,
+            "bbox": [self.min_x, self.min_y, self.max_x, self.max_y],
+            "centroid": [self.sum_x / self.count, self.sum_y / self.count],
+        }
+
+
+def _slim_feature(
+    feature: Dict[str, Any], keep_point_geometry: bool, summarize_geometry: bool, keep_geometry: bool
+) -> Dict[str, Any]:
+    geometry = feature.get("geometry") or {}
+    slim: Dict[str, Any] = {"properties": feature.get("properties") or {}, "geometry": None}
+    if keep_geometry:
+        slim["geometry"] = feature.get("geometry")
+    elif keep_point_geometry and geometry.get("type") == "Point":
+        slim["geometry"] = {"type": "Point", "coordinates": geometry.get("coordinates")}
+    elif summarize_geometry:
+        summary = VertexSummary()
+        summary.add_coordinates(geometry.get("coordinates"))
+        slim["geometry"] = summary.geometry(geometry.get("type"))
+    return slim
+
+
+def _iter_loaded(
+    stream: IO[bytes], keep_point_geometry: bool, summarize_geometry: bool, keep_geometry: bool
+) -> Iterator[Dict[str, Any]]:
+    payload = json.load(stream)
+    for feature in payload.get("features", []):
+        yield _slim_feature(feature, keep_point_geometry, summarize_geometry, keep_geometry)
+
+
+def iter_features(
+    stream: IO[bytes],
+    keep_point_geometry: bool = False,
+    summarize_geometry: bool = False,
+    keep_geometry: bool = False,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield ``{"properties": {...}, "geometry": None | {"type": "Point", ...}}``
+    for every feature in a GeoJSON FeatureCollection read from ``stream``.
+    With ``summarize_geometry`` other geometries come back as
+    ``{"type": ..., "bbox": [minx, miny, maxx, maxy], "centroid": [x, y]}``.
+    ``keep_geometry`` yields every geometry as parsed and overrides both.
+    """
+    if ijson is None:
+        yield from _iter_loaded(stream, keep_point_geometry, summarize_geometry, keep_geometry)
+        return
+
+    builder: Optional[Any] = None
+    geometry_builder: Optional[Any] = None
+    full_geometry: Optional[Dict[str, Any]] = None
+    geometry_type: Optional[str] = None
+    point: List[float] = []
+    properties: Dict[str, Any] = {}
+    summary = VertexSummary()
+
+    for prefix, event, value in ijson.parse(stream, use_float=True):
+        if prefix == FEATURE_PREFIX:
+            if event == "start_map":
+                properties, geometry_type, point, full_geometry = {}, None, [], None
+                if summarize_geometry:
+                    summary = VertexSummary()
+            elif event == "end_map":
+                geometry = None
+                if keep_geometry:
+                    geometry = full_geometry
+                elif keep_point_geometry and geometry_type == "Point" and len(point) >= 2:
+                    geometry = {"type": "Point", "coordinates": point}
+                elif summarize_geometry:
+                    geometry = summary.geometry(geometry_type)
+                yield {"properties": properties, "geometry": geometry}
+        elif prefix.startswith(PROPERTIES_PREFIX):
+            if prefix == PROPERTIES_PREFIX and event == "start_map":
+                builder = ijson.ObjectBuilder()
+            if builder is not None:
+                builder.event(event, value)
+                if prefix == PROPERTIES_PREFIX and event == "end_map":
+                    properties = builder.value
+                    builder = None
+        elif keep_geometry and prefix.startswith(GEOMETRY_PREFIX):
+            if prefix == GEOMETRY_PREFIX and event == "start_map":
+                geometry_builder = ijson.ObjectBuilder()
+            if geometry_builder is not None:
+                geometry_builder.event(event, value)
+                if prefix == GEOMETRY_PREFIX and event == "end_map":
+                    full_geometry = geometry_builder.value
+                    geometry_builder = None
+        elif prefix == GEOMETRY_TYPE_PREFIX:
+            geometry_type = value
+        elif summarize_geometry and prefix.startswith(COORDINATES_PREFIX):
+            if event == "start_array":
+                summary.start_array()
+            elif event == "end_array":
+                summary.end_array()
+            elif event == "number":
+                summary.add_number(value)
+                if keep_point_geometry and prefix == POINT_COORD_PREFIX:
+                    point.append(value)
+        elif keep_point_geometry and prefix == POINT_COORD_PREFIX and event == "number":
+            point.append(value)
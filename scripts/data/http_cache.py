@@ -0,0 +1,349 @@
+"""
+On-disk HTTP response cache shared by the geography fetch scripts.
+
+Responses are keyed by URL and query parameters and stored gzip-compressed
+under data/geo/.cache. Entries younger than ``fresh_seconds`` are served
+without touching the network, older entries are revalidated with
+ETag / Last-Modified, and entries past ``ttl_seconds`` or beyond the
+``max_bytes`` budget are evicted (least recently used first).
+
+In offline mode every request is answered from the cache regardless of age;
+a request that was never cached raises ``CacheMiss``.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+
+ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_CACHE_DIR = ROOT / "data" / "geo" / ".cache"
+
+DEFAULT_FRESH_SECONDS = 24 * 3600
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+STREAM_CHUNK_BYTES = 1024 * 1024
+
+
+class CacheMiss(RuntimeError):
+    """Raised in offline mode when a request has no cached response."""
+
+
+@dataclass
+class CacheEntry:
+    key: str
+    url: str
+    body_path: Path
+    meta_path: Path
+    fetched_at: float
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    size: int = 0
+
+    def age(self, now: Optional[float] = None) -> float:
+        return (now or time.time()) - self.fetched_at
+
+
+def make_key(url: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """Stable cache key for a URL plus (order-insensitive) query parameters."""
+    canonical = json.dumps(
+        [url, sorted((str(k), str(v)) for k, v in (params or {}).items())],
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class HttpCache:
+    def __init__(
+        self,
+        root: Path = DEFAULT_CACHE_DIR,
+        *,
+        fresh_seconds: float = DEFAULT_FRESH_SECONDS,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        offline: bool = False,
+        enabled: bool = True,
+    ):
+        self.root = Path(root)
+        self.fresh_seconds = fresh_seconds
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.enabled = enabled or offline
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.bytes_downloaded = 0
+        self._lock = threading.Lock()
+
+    def _count(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    @staticmethod
+    def _tmp_path(path: Path) -> Path:
+        # Unique per thread so concurrent fetches of the same key never collide.
+        return path.with_name(f"{path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+
+    def _paths(self, key: str) -> Tuple[Path, Path]:
+        folder = self.root / key[:2]
+        return folder / f"{key}.gz", folder / f"{key}.json"
+
+    def lookup(self, url: str, params: Optional[Dict[str, Any]] = None) -> Optional[CacheEntry]:
+        if not self.enabled:
+            return None
+        key = make_key(url, params)
+        body_path, meta_path = self._paths(key)
+        if not body_path.exists() or not meta_path.exists():
+            return None
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        return CacheEntry(
+            key=key,
+            url=meta.get("url", url),
+            body_path=body_path,
+            meta_path=meta_path,
+            fetched_at=float(meta.get("fetched_at", 0)),
+            etag=meta.get("etag"),
+            last_modified=meta.get("last_modified"),
+            size=body_path.stat().st_size,
+        )
+
+    def open(self, entry: CacheEntry) -> IO[bytes]:
+        """Open a cached body as a decompressed binary stream."""
+        os.utime(entry.body_path)  # bump recency for LRU eviction
+        return gzip.open(entry.body_path, "rb")
+
+    def read(self, entry: CacheEntry) -> bytes:
+        with self.open(entry) as stream:
+            return stream.read()
+
+    def _write_meta(self, entry: CacheEntry) -> None:
+        meta = {
+            "url": entry.url,
+            "fetched_at": entry.fetched_at,
+            "etag": entry.etag,
+            "last_modified": entry.last_modified,
+        }
+        tmp_path = self._tmp_path(entry.meta_path)
+        tmp_path.write_text(json.dumps(meta), encoding="utf-8")
+        os.replace(tmp_path, entry.meta_path)
+
+    def store(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]],
+        chunks: Any,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> CacheEntry:
+        """Compress an iterable of body chunks to disk and record validators."""
+        key = make_key(url, params)
+        body_path, meta_path = self._paths(key)
+        body_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._tmp_path(body_path)
+        received = 0
+        with gzip.open(tmp_path, "wb", compresslevel=6) as stream:
+            for chunk in chunks:
+                if chunk:
+                    stream.write(chunk)
+                    received += len(chunk)
+        os.replace(tmp_path, body_path)
+        self._count("bytes_downloaded", received)
+
+        headers = headers or {}
+        entry = CacheEntry(
+            key=key,
+            url=url,
+            body_path=body_path,
+            meta_path=meta_path,
+            fetched_at=time.time(),
+            etag=headers.get("ETag"),
+            last_modified=headers.get("Last-Modified"),
+            size=body_path.stat().st_size,
+        )
+        self._write_meta(entry)
+        return entry
+
+    def refresh(self, entry: CacheEntry) -> None:
+        """Mark an entry as fresh again after a 304 Not Modified response."""
+        entry.fetched_at = time.time()
+        self._write_meta(entry)
+        os.utime(entry.body_path)
+
+    def fetch(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        *,
+        session: Optional[requests.Session] = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: float = 120,
+        before_request: Optional[Callable[[], None]] = None,
+        send: Optional[Callable[..., requests.Response]] = None,
+    ) -> CacheEntry:
+        """
+        Return a cache entry for the request, going to the network only when
+        the cached copy is missing or stale. Non-2xx responses raise
+        ``requests.HTTPError``. ``send(url, params, headers, timeout, stream=True)``
+        replaces the plain ``session.get`` (the client's retrying sender).
+        """
+        entry = self.lookup(url, params)
+        if entry and (self.offline or entry.age() < self.fresh_seconds):
+            self._count("hits")
+            return entry
+        if self.offline:
+            raise CacheMiss(f"No cached response for {url} (offline mode)")
+
+        request_headers = dict(headers or {})
+        if entry and entry.etag:
+            request_headers["If-None-Match"] = entry.etag
+        if entry and entry.last_modified:
+            request_headers["If-Modified-Since"] = entry.last_modified
+
+        if send:
+            response = send(url, params, request_headers, timeout, stream=True)
+        else:
+            if before_request:
+                before_request()
+            response = (session or requests).get(
+                url,
+                params=params,
+                headers=request_headers,
+                timeout=timeout,
+                stream=True,
+            )
+        try:
+            if entry and response.status_code == 304:
+                self._count("revalidated")
+                self.refresh(entry)
+                return entry
+            response.raise_for_status()
+            self._count("misses")
+            if not self.enabled:
+                return self._spool(url, params, response)
+            return self.store(
+                url,
+                params,
+                response.iter_content(chunk_size=STREAM_CHUNK_BYTES),
+                headers=dict(response.headers),
+            )
+        finally:
+            response.close()
+
+    def _spool(self, url: str, params: Optional[Dict[str, Any]], response: requests.Response) -> CacheEntry:
+        # With caching disabled the body still goes through a throwaway entry so
+        # callers have a single code path; it is removed on the next eviction.
+        key = make_key(url, params)
+        spool_root = self.root / "_spool"
+        spool_root.mkdir(parents=True, exist_ok=True)
+        body_path = self._tmp_path(spool_root / f"{key}.gz")
+        received = 0
+        with gzip.open(body_path, "wb", compresslevel=1) as stream:
+            for chunk in response.iter_content(chunk_size=STREAM_CHUNK_BYTES):
+                if chunk:
+                    stream.write(chunk)
+                    received += len(chunk)
+        self._count("bytes_downloaded", received)
+        return CacheEntry(
+            key=key,
+            url=url,
+            body_path=body_path,
+            meta_path=spool_root / f"{key}.json",
+            fetched_at=time.time(),
+            size=body_path.stat().st_size,
+        )
+
+    def get(self, url: str, params: Optional[Dict[str, Any]] = None, **kwargs: Any) -> bytes:
+        """Fetch (or replay) a request and return the decompressed body."""
+        return self.read(self.fetch(url, params, **kwargs))
+
+    def get_json(self, url: str, params: Optional[Dict[str, Any]] = None, **kwargs: Any) -> Any:
+        return json.loads(self.get(url, params, **kwargs))
+
+    def evict(self) -> int:
+        """Drop expired entries, then the least recently used ones over budget."""
+        if self.offline or not self.root.exists():
+            return 0
+        shutil.rmtree(self.root / "_spool", ignore_errors=True)
+
+        now = time.time()
+        removed = 0
+        survivors: List[Tuple[float, int, Path, Path]] = []
+        for meta_path in self.root.glob("*/*.json"):
+            body_path = meta_path.with_suffix(".gz")
+            try:
+                meta = json.loads(meta_path.read_text(encoding="utf-8"))
+                stat = body_path.stat()
+            except (OSError, ValueError):
+                meta_path.unlink(missing_ok=True)
+                body_path.unlink(missing_ok=True)
+                removed += 1
+                continue
+            if now - float(meta.get("fetched_at", 0)) > self.ttl_seconds:
+                meta_path.unlink(missing_ok=True)
+                body_path.unlink(missing_ok=True)
+                removed += 1
+                continue
+            survivors.append((stat.st_mtime, stat.st_size, body_path, meta_path))
+
+        total = sum(size for _, size, _, _ in survivors)
+        for _, size, body_path, meta_path in sorted(survivors):
+            if total <= self.max_bytes:
+                break
+            meta_path.unlink(missing_ok=True)
+            body_path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        return removed
+
+    def summary(self) -> str:
+        return f"cache: {self.hits} hits, {self.revalidated} revalidated, {self.misses} downloaded"
+
+
+def add_cache_arguments(parser: Any) -> None:
+    """Register the shared cache flags on an argparse parser."""
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Build from cached responses only; fail if something was never fetched.",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Bypass the on-disk HTTP cache and always download.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=DEFAULT_CACHE_DIR,
+        help=f"HTTP cache directory (default: {DEFAULT_CACHE_DIR.relative_to(ROOT)}).",
+    )
+    parser.add_argument(
+        "--cache-max-age",
+        type=float,
+        default=DEFAULT_FRESH_SECONDS / 3600,
+        help="Hours a cached response is reused before revalidation (default: 24).",
+    )
+
+
+def cache_from_args(args: Any) -> HttpCache:
+    return HttpCache(
+        args.cache_dir,
+        fresh_seconds=args.cache_max_age * 3600,
+        offline=args.offline,
+        enabled=not args.no_cache,
+    )
@@ -0,0 +1,252 @@
+"""
+Pooled, concurrent HTTP client shared by the geography fetch scripts.
+
+One ``HttpClient`` owns a keep-alive ``requests.Session`` sized for the
+configured parallelism, a default timeout, the on-disk ``HttpCache`` and a
+per-host token-bucket rate limiter that is shared by every request the
+client makes, no matter which worker thread issues it. ``map`` runs
+independent requests (e.g. 40-ID Wikidata chunks) on a bounded thread pool,
+and ``fetch_entry`` downloads large files to disk once per run even when
+several stages ask for them concurrently.
+
+Every request goes through a ``RequestController`` (see http_control.py),
+which retries throttled and transient failures with jittered backoff, honours
+``Retry-After`` and MediaWiki ``maxlag``, and adapts the number of requests in
+flight per host.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, Optional, TypeVar
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from http_cache import CacheEntry, HttpCache, make_key
+from http_control import (
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_MAXLAG_SECONDS,
+    RequestController,
+    add_control_arguments,
+    check_response,
+)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_RATE_PER_SECOND = 10.0
+DEFAULT_BURST = 4
+DEFAULT_TIMEOUT_SECONDS = 60.0
+
+
+class TokenBucket:
+    """Thread-safe token bucket; callers reserve a token and sleep off any debt."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.capacity = max(1.0, burst)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if delay > 0:
+            time.sleep(delay)
+
+
+class RateLimiter:
+    """One token bucket per host, created on first use."""
+
+    def __init__(
+        self,
+        rate: float = DEFAULT_RATE_PER_SECOND,
+        burst: float = DEFAULT_BURST,
+        host_rates: Optional[Dict[str, float]] = None,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.host_rates = host_rates or {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, url: str) -> TokenBucket:
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.host_rates.get(host, self.rate), self.burst)
+            return self._buckets[host]
+
+    def wait(self, url: str) -> None:
+        self.bucket(url).acquire()
+
+
+class HttpClient:
+    def __init__(
+        self,
+        *,
+        user_agent: str,
+        cache: Optional[HttpCache] = None,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        rate: float = DEFAULT_RATE_PER_SECOND,
+        burst: float = DEFAULT_BURST,
+        timeout: float = DEFAULT_TIMEOUT_SECONDS,
+        headers: Optional[Dict[str, str]] = None,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        maxlag: Optional[int] = DEFAULT_MAXLAG_SECONDS,
+    ):
+        self.cache = cache if cache is not None else HttpCache(enabled=False)
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.headers = {"User-Agent": user_agent, **(headers or {})}
+        self.limiter = RateLimiter(rate, burst)
+        self.controller = RequestController(self.concurrency, max_retries=max_retries, maxlag=maxlag)
+        self.request_count = 0
+        self._direct_bytes = 0
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Future] = {}
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _send(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]],
+        headers: Dict[str, str],
+        timeout: float,
+        stream: bool = False,
+    ) -> requests.Response:
+        """One network attempt; ``maxlag`` is added here so it never reaches the cache key."""
+        self.limiter.wait(url)
+        with self._lock:
+            self.request_count += 1
+        response = self.session.get(
+            url,
+            params=self.controller.params_for(url, params),
+            headers=headers,
+            timeout=timeout,
+            stream=stream,
+        )
+        check_response(response)
+        return response
+
+    @property
+    def bytes_downloaded(self) -> int:
+        """Response body bytes received, whether or not they went through the cache."""
+        return self._direct_bytes + self.cache.bytes_downloaded
+
+    def get_json(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Any:
+        merged_headers = {**self.headers, **(headers or {})}
+        if self.cache.enabled:
+            return self.controller.call(
+                url,
+                lambda: self.cache.get_json(
+                    url, params, headers=merged_headers, timeout=self.timeout, send=self._send
+                ),
+            )
+
+        def attempt() -> Any:
+            response = self._send(url, params, merged_headers, self.timeout)
+            response.raise_for_status()
+            with self._lock:
+                self._direct_bytes += len(response.content)
+            return response.json()
+
+        return self.controller.call(url, attempt)
+
+    def fetch_entry(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> CacheEntry:
+        """
+        Download a response body to disk (cache entry, or a spool file when the
+        cache is disabled). Concurrent and repeated calls for the same request
+        share a single download for the lifetime of the client.
+        """
+        key = make_key(url, params)
+        with self._lock:
+            future = self._entries.get(key)
+            owner = future is None
+            if owner:
+                future = self._entries[key] = Future()
+        if owner:
+            try:
+                future.set_result(
+                    self.controller.call(
+                        url,
+                        lambda: self.cache.fetch(
+                            url,
+                            params,
+                            headers={**self.headers, **(headers or {})},
+                            timeout=self.timeout,
+                            send=self._send,
+                        ),
+                    )
+                )
+            except BaseException as error:
+                future.set_exception(error)
+        return future.result()
+
+    @contextmanager
+    def open_stream(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Iterator[IO[bytes]]:
+        entry = self.fetch_entry(url, params, headers)
+        with self.cache.open(entry) as stream:
+            yield stream
+
+    def map(self, fn: Callable[[T], R], items: Iterable[T]) -> List[R]:
+        """Apply ``fn`` to every item with bounded parallelism, preserving order."""
+        items = list(items)
+        if len(items) <= 1 or self.concurrency <= 1:
+            return [fn(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(items))) as pool:
+            return list(pool.map(fn, items))
+
+    def close(self) -> None:
+        self.session.close()
+
+
+def chunked(values: List[T], size: int) -> List[List[T]]:
+    return [values[i : i + size] for i in range(0, len(values), size)]
+
+
+def add_client_arguments(parser: Any, default_concurrency: int = DEFAULT_CONCURRENCY) -> None:
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=default_concurrency,
+        help=f"Parallel HTTP requests (default: {default_concurrency}).",
+    )
+    add_control_arguments(parser)
+
+
+def client_options_from_args(args: Any) -> Dict[str, Any]:
+    """``HttpClient`` keyword arguments for the flags of ``add_client_arguments``."""
+    return {"concurrency": args.concurrency, "max_retries": args.max_retries, "maxlag": args.maxlag}
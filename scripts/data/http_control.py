@@ -0,0 +1,220 @@
+"""
+Adaptive retry and concurrency control for the geography HTTP client.
+
+``RequestController.call`` runs one request attempt at a time inside a
+per-host slot and retries the transient failures: connection errors and
+timeouts, HTTP 429/502/503/504, and MediaWiki ``maxlag`` refusals (HTTP 200
+with a ``MediaWiki-API-Error: maxlag`` header). Each retry waits an
+exponentially growing, fully jittered delay; a ``Retry-After`` header
+replaces that delay and also pauses every other request to the same host.
+
+The number of slots per host follows AIMD: it starts at the client's
+concurrency, is halved by the first failure of a window (failures of
+requests that were already in flight do not halve it again), and grows by
+one slot after a window's worth of consecutive successes, so throughput
+climbs back once the server is healthy.
+
+``maxlag`` is added to MediaWiki Action API requests (``.../api.php``) when
+they are sent, not to the cache key, so cached responses stay valid.
+"""
+
+from __future__ import annotations
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional, TypeVar
+from urllib.parse import urlsplit
+
+import requests
+
+T = TypeVar("T")
+
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_MAXLAG_SECONDS = 5
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+MAX_RETRY_AFTER_SECONDS = 300.0
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+MAXLAG_ERROR = "maxlag"
+
+RETRYABLE_ERRORS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+    requests.HTTPError,
+)
+
+
+class Throttled(requests.HTTPError):
+    """A 2xx response that still asks the client to back off (MediaWiki maxlag)."""
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """Seconds to wait from a ``Retry-After`` header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - (now or time.time())
+        except (TypeError, ValueError):
+            return None
+    return min(max(0.0, seconds), MAX_RETRY_AFTER_SECONDS)
+
+
+def is_mediawiki_api(url: str) -> bool:
+    return urlsplit(url).path.endswith("/api.php")
+
+
+def check_response(response: requests.Response) -> None:
+    """Raise ``Throttled`` for a maxlag refusal; other statuses are left to the caller."""
+    if response.headers.get("MediaWiki-API-Error") == MAXLAG_ERROR:
+        response.close()
+        raise Throttled(f"{MAXLAG_ERROR} from {response.url}", response=response)
+
+
+def _retry_status(error: BaseException) -> Optional[int]:
+    if isinstance(error, Throttled):
+        return None
+    response = getattr(error, "response", None)
+    return response.status_code if response is not None else None
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, Throttled):
+        return True
+    if isinstance(error, requests.HTTPError):
+        return _retry_status(error) in RETRY_STATUSES
+    return isinstance(error, RETRYABLE_ERRORS)
+
+
+class HostWindow:
+    """AIMD concurrency window and shared pause for one host."""
+
+    def __init__(self, max_limit: int):
+        self.max_limit = max(1, max_limit)
+        self.limit = self.max_limit
+        self.in_flight = 0
+        self.successes = 0
+        self.generation = 0
+        self.paused_until = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> int:
+        """Wait for a free slot (and the end of any pause); return the window generation."""
+        with self._cond:
+            while True:
+                delay = self.paused_until - time.monotonic()
+                if delay <= 0 and self.in_flight < self.limit:
+                    self.in_flight += 1
+                    return self.generation
+                self._cond.wait(timeout=delay if delay > 0 else None)
+
+    def release(self, generation: int, ok: Optional[bool]) -> None:
+        """``ok`` is None for outcomes that say nothing about server health (404, cache miss)."""
+        with self._cond:
+            self.in_flight -= 1
+            if ok:
+                self.successes += 1
+                if self.successes >= self.limit and self.limit < self.max_limit:
+                    self.limit += 1
+                    self.successes = 0
+            elif ok is False and generation == self.generation:
+                self.limit = max(1, self.limit // 2)
+                self.successes = 0
+                self.generation += 1
+            self._cond.notify_all()
+
+    def pause(self, seconds: float) -> None:
+        with self._cond:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class RequestController:
+    def __init__(
+        self,
+        max_concurrency: int,
+        *,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        maxlag: Optional[int] = DEFAULT_MAXLAG_SECONDS,
+        backoff_base: float = BACKOFF_BASE_SECONDS,
+        backoff_max: float = BACKOFF_MAX_SECONDS,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max(0, max_retries)
+        self.maxlag = maxlag
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retries = 0
+        self.throttled = 0
+        self._windows: Dict[str, HostWindow] = {}
+        self._lock = threading.Lock()
+
+    def window(self, url: str) -> HostWindow:
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._windows:
+                self._windows[host] = HostWindow(self.max_concurrency)
+            return self._windows[host]
+
+    def params_for(self, url: str, params: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Request parameters as sent: MediaWiki API calls also carry ``maxlag``."""
+        if self.maxlag is None or not is_mediawiki_api(url):
+            return params
+        return {**(params or {}), "maxlag": self.maxlag}
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Full-jitter exponential delay, or the server's ``Retry-After`` plus a little jitter."""
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.backoff_base)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    def call(self, url: str, attempt_fn: Callable[[], T]) -> T:
+        """Run ``attempt_fn`` in a slot of the host's window, retrying transient failures."""
+        window = self.window(url)
+        attempt = 0
+        while True:
+            generation = window.acquire()
+            try:
+                result = attempt_fn()
+            except BaseException as error:
+                retryable = isinstance(error, Exception) and is_retryable(error)
+                window.release(generation, ok=False if retryable else None)
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                response = getattr(error, "response", None)
+                retry_after = parse_retry_after(response.headers.get("Retry-After")) if response is not None else None
+                delay = self.backoff(attempt, retry_after)
+                if retry_after is not None:
+                    window.pause(delay)
+                with self._lock:
+                    self.retries += 1
+                    if isinstance(error, Throttled) or _retry_status(error) in (429, 503):
+                        self.throttled += 1
+                time.sleep(delay)
+                attempt += 1
+                continue
+            window.release(generation, ok=True)
+            return result
+
+    def summary(self) -> str:
+        return f"{self.retries} retried ({self.throttled} throttled)"
+
+
+def add_control_arguments(parser: Any) -> None:
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=DEFAULT_MAX_RETRIES,
+        help=f"Retries per request on 429/5xx, maxlag and connection errors (default: {DEFAULT_MAX_RETRIES}).",
+    )
+    parser.add_argument(
+        "--maxlag",
+        type=int,
+        default=DEFAULT_MAXLAG_SECONDS,
+        help=f"maxlag sent to the MediaWiki/Wikidata APIs, in seconds (default: {DEFAULT_MAXLAG_SECONDS}).",
+    )
@@ -0,0 +1,131 @@
+import random
+from collections import deque
+from typing import Dict, List, Optional, Set, Tuple
+
+import pytest
+
+import fetch_bih_locations as bih
+from fetch_bih_locations import (
+    CANTON_TYPE,
+    ENTITY_QIDS,
+    MUNICIPALITY_TYPES,
+    STATE_QID,
+    AncestorGraph,
+    resolve_hierarchy,
+)
+
+
+class GraphResolver:
+    """P131 graph in memory; qids without types are missing entities."""
+
+    def __init__(self, types: Dict[str, Set[str]], parents: Dict[str, List[str]]):
+        self.types = types
+        self.parents = parents
+
+    def get_types(self, qid: str) -> Set[str]:
+        if qid not in self.types:
+            raise KeyError(qid)
+        return self.types[qid]
+
+    def get_parents(self, qid: str) -> List[str]:
+        if qid not in self.types:
+            raise KeyError(qid)
+        return self.parents.get(qid, [])
+
+
+def bfs_hierarchy(resolver: GraphResolver, qid: str) -> Dict[str, Optional[str]]:
+    """The per-row breadth-first walk resolve_hierarchy used before AncestorGraph."""
+    result = {"municipality": None, "region": None, "entity": None, "state": None}
+    queue: deque[Tuple[str, int]] = deque([(qid, 0)])
+    visited: Set[str] = set()
+    while queue:
+        current, depth = queue.popleft()
+        if depth > 5 or current in visited:
+            continue
+        visited.add(current)
+        try:
+            types = resolver.get_types(current)
+        except KeyError:
+            continue
+        if current != qid and not result["municipality"] and (types & MUNICIPALITY_TYPES):
+            result["municipality"] = current
+        if not result["region"]:
+            if CANTON_TYPE in types:
+                result["region"] = current
+            elif current in ENTITY_QIDS or current == "Q194483":
+                result["region"] = current
+        if not result["entity"] and current in ENTITY_QIDS:
+            result["entity"] = current
+        if not result["state"] and current == STATE_QID:
+            result["state"] = current
+        for parent in resolver.get_parents(current):
+            queue.append((parent, depth + 1))
+
+    if not result["entity"] and result["region"]:
+        for parent in resolver.get_parents(result["region"]):
+            if parent in ENTITY_QIDS:
+                result["entity"] = parent
+                break
+    if not result["entity"]:
+        parents = resolver.get_parents(result["municipality"]) if result["municipality"] else []
+        for parent in parents:
+            if parent in ENTITY_QIDS:
+                result["entity"] = parent
+                break
+    if not result["state"] and result["entity"]:
+        parent_entities = resolver.get_parents(result["entity"])
+        if STATE_QID in parent_entities or not parent_entities:
+            result["state"] = STATE_QID
+    if not result["municipality"]:
+        result["municipality"] = qid
+    if not result["region"]:
+        result["region"] = result["entity"]
+    if not result["entity"]:
+        result["entity"] = "Q194483" if result["region"] == "Q194483" else None
+    if not result["state"]:
+        result["state"] = STATE_QID
+    return result
+
+
+def random_graph(seed: int, size: int = 14, cyclic: bool = True) -> GraphResolver:
+    rng = random.Random(seed)
+    special = [STATE_QID, *ENTITY_QIDS]
+    plain = [f"Q{900000 + number}" for number in range(size)]
+    nodes = special + plain
+    types: Dict[str, Set[str]] = {}
+    parents: Dict[str, List[str]] = {}
+    for position, qid in enumerate(nodes):
+        if rng.random() < 0.08 and qid not in special:
+            continue  # missing entity
+        types[qid] = set(rng.sample([*sorted(MUNICIPALITY_TYPES), CANTON_TYPE, "Q5", "Q515"], rng.randint(0, 2)))
+        pool = nodes if cyclic else nodes[:position]
+        parents[qid] = rng.sample(pool, min(len(pool), rng.randint(0, 3)))
+    return GraphResolver(types, parents)
+
+
+@pytest.mark.parametrize("cyclic", [False, True])
+def test_matches_breadth_first_walk(cyclic):
+    compared = 0
+    for seed in range(300):
+        resolver = random_graph(seed, cyclic=cyclic)
+        graph = AncestorGraph(resolver)
+        rows = [qid for qid in resolver.types if qid.startswith("Q9")]
+        random.Random(seed).shuffle(rows)  # memoized answers must not depend on row order
+        for qid in rows:
+            assert resolve_hierarchy(resolver, qid, graph) == bfs_hierarchy(resolver, qid), (seed, qid)
+            compared += 1
+    assert compared > 1000
+
+
+def test_cycle_through_entity_keeps_nearest_region():
+    # row -> a -> b -> a (cycle), b -> Republika Srpska; reaching b first through
+    # another row must not memoize a cut-short answer for a.
+    resolver = GraphResolver(
+        types={"Q1": set(), "Q2": set(), "Q3": set(), "Q4": set(), "Q11196": set(), STATE_QID: set()},
+        parents={"Q1": ["Q3"], "Q2": ["Q4"], "Q3": ["Q4"], "Q4": ["Q3", "Q11196"], "Q11196": [STATE_QID]},
+    )
+    graph = AncestorGraph(resolver)
+    for qid in ("Q2", "Q1"):
+        result = resolve_hierarchy(resolver, qid, graph)
+        assert result == bfs_hierarchy(resolver, qid)
+        assert result["region"] == result["entity"] == "Q11196"
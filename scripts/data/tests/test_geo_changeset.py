@@ -0,0 +1,95 @@
+import copy
+from typing import Dict
+
+from geo_changeset import TABLE_KEYS, build_changeset, is_empty
+
+
+def dataset(generated_at: str, states, regions, cities) -> dict:
+    return {"metadata": {"generated_at": generated_at}, "states": states, "regions": regions, "cities": cities}
+
+
+def region(region_id: str, parent=None, **fields) -> dict:
+    return {"region_id": region_id, "state_id": "de", "name": region_id, "parent_region_id": parent, **fields}
+
+
+def city(city_id: str, region_id: str, **fields) -> dict:
+    return {"city_id": city_id, "state_id": "de", "region_id": region_id, "name": city_id, **fields}
+
+
+BASE = dataset(
+    "2026-01-01T00:00:00+00:00",
+    [{"state_id": "de", "name": "Deutschland"}, {"state_id": "lu", "name": "Luxembourg"}],
+    [region("DE1"), region("DE11", "DE1"), region("DE111", "DE11"), region("LU0")],
+    [city("de-stuttgart", "DE111", population=630000), city("lu-luxembourg", "LU0", area_km2=51.5)],
+)
+
+
+def apply(previous: dict, changeset: dict) -> Dict[str, Dict[str, dict]]:
+    """What backend/prisma/seed.ts does to the geo tables, on dicts keyed like the tables."""
+    tables = {table: {record[key]: dict(record) for record in previous[table]} for table, key in TABLE_KEYS}
+    for table, key in TABLE_KEYS:
+        for record in changeset[table]["insert"]:
+            if table == "regions" and record.get("parent_region_id"):
+                assert record["parent_region_id"] in tables["regions"], "parent inserted after child"
+            tables[table][record[key]] = dict(record)
+    for table, _ in TABLE_KEYS:
+        for update in changeset[table]["update"]:
+            row = tables[table][update["key"]]
+            for field, value in update["changes"].items():
+                if value is None:
+                    row.pop(field, None)
+                else:
+                    row[field] = value
+    for table in ("cities", "regions", "states"):
+        for record_id in changeset[table]["delete"]:
+            if table == "regions":
+                children = [r for r in tables["regions"].values() if r.get("parent_region_id") == record_id]
+                assert not children, "region deleted before its children"
+            del tables[table][record_id]
+    return tables
+
+
+def keyed(data: dict) -> Dict[str, Dict[str, dict]]:
+    return {table: {record[key]: record for record in data[table]} for table, key in TABLE_KEYS}
+
+
+def test_identical_datasets_give_an_empty_changeset():
+    changeset = build_changeset(BASE, copy.deepcopy(BASE))
+    assert is_empty(changeset)
+
+
+def test_round_trip_reproduces_the_new_dataset():
+    current = copy.deepcopy(BASE)
+    current["metadata"]["generated_at"] = "2026-02-01T00:00:00+00:00"
+    current["states"].append({"state_id": "at", "name": "Österreich"})
+    # New subtree, listed children-first to check the inserts get reordered.
+    current["regions"] += [region("AT130", "AT13"), region("AT13", "AT1"), region("AT1")]
+    current["regions"] = [r for r in current["regions"] if r["region_id"] not in ("LU0",)]
+    current["states"] = [s for s in current["states"] if s["state_id"] != "lu"]
+    current["cities"] = [city("de-stuttgart", "DE111", population=635000, area_km2=207.4), city("at-wien", "AT130")]
+    # Removing a region subtree must delete children before parents.
+    current["regions"] = [r for r in current["regions"] if not r["region_id"].startswith("DE1")]
+    current["cities"][0]["region_id"] = "AT130"
+
+    changeset = build_changeset(BASE, current)
+
+    assert not is_empty(changeset)
+    assert changeset["metadata"]["base_generated_at"] == "2026-01-01T00:00:00+00:00"
+    assert changeset["metadata"]["target_generated_at"] == "2026-02-01T00:00:00+00:00"
+    assert [r["region_id"] for r in changeset["regions"]["insert"]] == ["AT1", "AT13", "AT130"]
+    assert changeset["regions"]["delete"][:3] == ["DE111", "DE11", "DE1"]
+    assert apply(BASE, changeset) == keyed(current)
+
+
+def test_updates_carry_only_changed_and_removed_fields():
+    current = copy.deepcopy(BASE)
+    current["cities"][0]["population"] = 640000
+    del current["cities"][1]["area_km2"]
+
+    changeset = build_changeset(BASE, current)
+
+    assert changeset["cities"]["update"] == [
+        {"key": "de-stuttgart", "changes": {"population": 640000}},
+        {"key": "lu-luxembourg", "changes": {"area_km2": None}},
+    ]
+    assert apply(BASE, changeset) == keyed(current)
@@ -0,0 +1,126 @@
+import argparse
+import copy
+
+import pytest
+
+from geo_selection import Selection, _merge_table, add_selection_arguments, merge_into, selection_from_args
+
+
+def region(nuts_id: str) -> dict:
+    state_id = nuts_id[:2].lower()
+    return {"region_id": f"{state_id}-{nuts_id.lower()}", "state_id": state_id, "nuts_id": nuts_id, "name": nuts_id}
+
+
+def city(city_id: str, nuts3_id: str) -> dict:
+    return {"city_id": city_id, "state_id": nuts3_id[:2].lower(), "nuts3_id": nuts3_id, "name": city_id}
+
+
+def full_build() -> dict:
+    # NUTS 2 before NUTS 3 and cities in source order, so no state is contiguous.
+    return {
+        "metadata": {
+            "generated_at": "2026-01-01T00:00:00+00:00",
+            "source": {"nuts": "https://gisco/nuts"},
+            "counts": {"states": 2, "regions": 6, "cities": 5},
+            "dedupe": {"merged": 7, "comparisons": 900},
+            "stale": "from the previous run",
+        },
+        "states": [{"state_id": "at", "name": "Österreich"}, {"state_id": "de", "name": "Deutschland"}],
+        "regions": [region(n) for n in ("AT13", "DE30", "DE11", "AT130", "DE300", "DE111")],
+        "cities": [
+            city("de-berlin", "DE300"),
+            city("at-wien", "AT130"),
+            city("de-stuttgart", "DE111"),
+            {**city("de-esslingen", "DE111"), "provenance": [{"source": "eu"}, {"source": "x"}]},
+            city("at-schwechat", "AT130"),
+        ],
+    }
+
+
+def rename(records, new_name):
+    return [{**record, "name": new_name} for record in records]
+
+
+def test_merge_table_replaces_in_place_and_keeps_other_records():
+    previous = [{"id": key, "v": 0} for key in "abcdef"]
+    fresh = [{"id": "b", "v": 1}, {"id": "x", "v": 1}, {"id": "f", "v": 1}, {"id": "y", "v": 1}]
+
+    merged = _merge_table(previous, fresh, "id", lambda record: record["id"] in "bdf")
+
+    # d is gone, x follows b (its predecessor in the fresh list), y follows f.
+    assert [(r["id"], r["v"]) for r in merged] == [
+        ("a", 0),
+        ("b", 1),
+        ("x", 1),
+        ("c", 0),
+        ("e", 0),
+        ("f", 1),
+        ("y", 1),
+    ]
+
+
+def test_merge_table_places_leading_and_unanchored_records():
+    previous = [{"id": "a"}, {"id": "b"}, {"id": "c"}]
+    # A new record with no fresh predecessor goes right before the first in-scope one.
+    lead = _merge_table(previous, [{"id": "n"}, {"id": "b"}], "id", lambda r: r["id"] == "b")
+    assert [r["id"] for r in lead] == ["a", "n", "b", "c"]
+    # Nothing in scope before: the fresh records go at the end.
+    appended = _merge_table(previous, [{"id": "n"}], "id", lambda r: False)
+    assert [r["id"] for r in appended] == ["a", "b", "c", "n"]
+
+
+def test_state_rebuild_matches_full_build_order():
+    full = full_build()
+    previous = copy.deepcopy(full)
+    for table in ("regions", "cities"):
+        previous[table] = [
+            {**record, "name": "MUTATED"} if record["state_id"] == "de" else record for record in previous[table]
+        ]
+    previous["cities"] = [c for c in previous["cities"] if c["city_id"] != "de-esslingen"]
+    selection = Selection(states=frozenset({"de"}))
+
+    merged = merge_into(previous, selection.filter(copy.deepcopy(full)), selection)
+
+    for table in ("states", "regions", "cities"):
+        assert merged[table] == full[table]
+
+
+def test_region_rebuild_only_touches_the_prefix():
+    full = full_build()
+    previous = copy.deepcopy(full)
+    previous["regions"] = rename(previous["regions"], "OLD")
+    previous["cities"] = rename(previous["cities"], "OLD")
+    selection = Selection(regions=("DE1",))
+
+    merged = merge_into(previous, full, selection)  # filters the fresh part itself
+
+    changed = {r["nuts_id"] for r in merged["regions"] if r["name"] != "OLD"}
+    assert changed == {"DE11", "DE111"}
+    assert {c["city_id"] for c in merged["cities"] if c["name"] != "OLD"} == {"de-stuttgart", "de-esslingen"}
+    assert [r["region_id"] for r in merged["regions"]] == [r["region_id"] for r in full["regions"]]
+
+
+def test_merged_metadata_is_rebuilt():
+    full = full_build()
+    partial = Selection(states=frozenset({"at"})).filter(copy.deepcopy(full))
+    partial["metadata"] = {"source": {"urau": "https://gisco/urau"}, "dedupe": {"merged": 0, "comparisons": 12}}
+    selection = Selection(states=frozenset({"at"}))
+
+    metadata = merge_into(full, partial, selection)["metadata"]
+
+    assert "stale" not in metadata
+    assert metadata["generated_at"] != full["metadata"]["generated_at"]
+    assert metadata["source"] == {"nuts": "https://gisco/nuts", "urau": "https://gisco/urau"}
+    assert metadata["counts"] == {"states": 2, "regions": 6, "cities": 5}
+    assert metadata["dedupe"] == {"merged": 1, "comparisons": 12}
+    assert metadata["partial"] == {"states": ["at"], "regions": []}
+
+
+def test_selection_arguments():
+    parser = argparse.ArgumentParser()
+    add_selection_arguments(parser)
+    selection = selection_from_args(parser.parse_args(["--states", "DE, bih", "--regions", "at13,AT13,de1"]))
+    assert selection == Selection(frozenset({"de", "bih"}), ("AT13", "DE1"))
+    assert selection.touched_states == {"de", "bih", "at"}
+    with pytest.raises(SystemExit):
+        parser.parse_args(["--regions", "D1"])
@@ -0,0 +1,34 @@
+import io
+import json
+
+import pytest
+
+import geojson_stream
+from geojson_stream import iter_features
+
+SQUARE = [[[16.0, 48.2], [16.6, 48.2], [16.6, 48.8], [16.0, 48.8], [16.0, 48.2]]]
+TRIANGLE = [[[10.0, 10.0], [11.0, 10.0], [11.0, 11.0], [10.0, 10.0]]]
+
+
+def collection(*geometries) -> bytes:
+    features = [{"type": "Feature", "properties": {"n": n}, "geometry": g} for n, g in enumerate(geometries)]
+    return json.dumps({"type": "FeatureCollection", "features": features}).encode()
+
+
+@pytest.fixture(params=["streaming", "loaded"])
+def reader(request, monkeypatch):
+    if request.param == "streaming" and not geojson_stream.STREAMING:
+        pytest.skip("ijson is not installed")
+    if request.param == "loaded":
+        monkeypatch.setattr(geojson_stream, "ijson", None)
+    return lambda data: [f["geometry"] for f in iter_features(io.BytesIO(data), summarize_geometry=True)]
+
+
+def test_closing_vertex_does_not_bias_the_centroid(reader):
+    polygon, multipolygon = reader(
+        collection({"type": "Polygon", "coordinates": SQUARE}, {"type": "MultiPolygon", "coordinates": [SQUARE, TRIANGLE]})
+    )
+    assert polygon["bbox"] == [16.0, 48.2, 16.6, 48.8]
+    assert polygon["centroid"] == pytest.approx([16.3, 48.5])
+    # Four square corners and three triangle corners, each counted once.
+    assert multipolygon["centroid"] == pytest.approx([97.2 / 7, (48.2 * 2 + 48.8 * 2 + 10 + 10 + 11) / 7])
@@ -0,0 +1,161 @@
+import random
+import re
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+from fetch_bih_locations import (
+    CANTON_TYPE,
+    STATE_QID,
+    WIKIDATA_API,
+    SparqlWikidataResolver,
+    WikidataResolver,
+    prefetch_hierarchy,
+    resolve_hierarchy,
+)
+
+ENTITY_URI = "http://www.wikidata.org/entity/"
+SPARQL_ENDPOINT = "http://sparql.test/sparql"
+
+
+def claim(target: str) -> Dict[str, Any]:
+    return {"mainsnak": {"datavalue": {"value": {"id": target}}}}
+
+
+def uri(qid: str) -> Dict[str, str]:
+    return {"type": "uri", "value": ENTITY_URI + qid}
+
+
+def literal(value: Any, **extra: str) -> Dict[str, str]:
+    return {"type": "literal", "value": str(value), **extra}
+
+
+def entity(qid: str, labels: Dict[str, str], types=(), parents=(), point=None) -> Dict[str, Any]:
+    claims: Dict[str, list] = {"P31": [claim(t) for t in types], "P131": [claim(p) for p in parents]}
+    if point:
+        claims["P625"] = [{"mainsnak": {"datavalue": {"value": {"latitude": point[0], "longitude": point[1]}}}}]
+    return {
+        "id": qid,
+        "labels": {lang: {"language": lang, "value": value} for lang, value in labels.items()},
+        "claims": claims,
+    }
+
+
+# Parents are listed in ascending numeric order: SPARQL has no statement order.
+ENTITIES = {
+    e["id"]: e
+    for e in [
+        entity(STATE_QID, {"bs": "Bosna i Hercegovina", "en": "Bosnia and Herzegovina"}),
+        entity("Q11198", {"bs": "Federacija Bosne i Hercegovine"}, parents=[STATE_QID], point=(43.9, 17.7)),
+        entity("Q11196", {"sr": "Република Српска"}, parents=[STATE_QID], point=(44.7, 17.2)),
+        entity("Q18250", {"hr": "Tuzlanska županija", "bs": "Tuzlanski kanton"}, [CANTON_TYPE], ["Q11198"]),
+        entity("Q500001", {"bs": "Tuzla"}, ["Q17268368"], ["Q18250"], (44.54, 18.67)),
+        entity("Q500002", {"sr": "Бијељина"}, ["Q57315116"], ["Q11196"], (44.76, 19.21)),
+        entity("Q500003", {"en": "Gornja Tuzla"}, ["Q486972"], ["Q500001"], (44.55, 18.78)),
+        # P131 cycle between two settlements, below a municipality.
+        entity("Q500004", {"bs": "Ljubače"}, ["Q486972"], ["Q500001", "Q500005"]),
+        entity("Q500005", {"bs": "Lipnica"}, ["Q486972"], ["Q500004"]),
+        entity("Q500006", {"bs": "Janja"}, ["Q486972"], ["Q500002", "Q999999"]),  # parent missing
+    ]
+}
+
+
+class StubEndpoints:
+    """Answers wbgetentities and the resolver's SPARQL queries from ``ENTITIES``."""
+
+    def __init__(self, seed: int = 0):
+        self.rng = random.Random(seed)
+        self.requests: List[str] = []
+
+    def map(self, fn, items):
+        return [fn(item) for item in items]
+
+    def get_json(self, url: str, params: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        if url == WIKIDATA_API:
+            assert params["action"] == "wbgetentities"
+            self.requests.append("wbgetentities")
+            entities = {
+                qid: ENTITIES.get(qid, {"id": qid, "missing": ""}) for qid in params["ids"].split("|")
+            }
+            return {"entities": entities}
+        assert url == SPARQL_ENDPOINT
+        self.requests.append("sparql")
+        return {"results": {"bindings": self.sparql(params["query"])}}
+
+    def sparql(self, query: str) -> List[Dict[str, Any]]:
+        values = re.search(r"VALUES \?\w+ \{([^}]*)\}", query).group(1)
+        items = re.findall(r"wd:(Q\d+)", values)
+        if "(p:P131/ps:P131)*" in query:
+            seen, frontier = set(), list(items)
+            while frontier:
+                qid = frontier.pop()
+                if qid in seen or qid not in ENTITIES:
+                    continue
+                seen.add(qid)
+                frontier += [c["mainsnak"]["datavalue"]["value"]["id"] for c in ENTITIES[qid]["claims"]["P131"]]
+            return [{"item": uri(qid)} for qid in seen]
+
+        languages = re.findall(r'"(\w+)"', re.search(r"IN \(([^)]*)\)", query).group(1))
+        rows = []
+        for qid in items:
+            data = ENTITIES.get(qid)
+            if data is None:
+                continue
+            rows.append({"item": uri(qid), "property": literal("sitelinks"), "value": literal(3)})
+            for prop in ("P31", "P131"):
+                for claim in data["claims"].get(prop, []):
+                    target = claim["mainsnak"]["datavalue"]["value"]["id"]
+                    rows.append({"item": uri(qid), "property": literal(prop), "value": uri(target)})
+            for claim in data["claims"].get("P625", []):
+                value = claim["mainsnak"]["datavalue"]["value"]
+                rows.append(
+                    {
+                        "item": uri(qid),
+                        "property": literal("P625"),
+                        "lat": literal(value["latitude"]),
+                        "lon": literal(value["longitude"]),
+                    }
+                )
+            for lang, label in data["labels"].items():
+                if lang in languages:
+                    value = literal(label["value"], **{"xml:lang": lang})
+                    rows.append({"item": uri(qid), "property": literal("label"), "value": value})
+        self.rng.shuffle(rows)  # SPARQL results come in no particular order
+        return rows
+
+
+ROWS = ["Q500001", "Q500002", "Q500003", "Q500004", "Q500005", "Q500006"]
+
+
+def resolved(resolver: WikidataResolver) -> Dict[str, Any]:
+    prefetch_hierarchy(resolver, ROWS)
+    return {
+        qid: (
+            resolve_hierarchy(resolver, qid),
+            resolver.best_label(qid),
+            resolver.get_coordinates(qid),
+            sorted(resolver.get_types(qid)),
+        )
+        for qid in ROWS
+    }
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_sparql_resolver_matches_the_api_resolver(seed):
+    api = resolved(WikidataResolver(StubEndpoints()))
+    sparql_client = StubEndpoints(seed)
+    sparql = resolved(SparqlWikidataResolver(sparql_client, endpoint=SPARQL_ENDPOINT))
+
+    assert sparql == api
+    assert api["Q500003"][0]["region"] == "Q18250"
+    assert api["Q500006"][0]["entity"] == "Q11196"
+    assert set(sparql_client.requests) == {"sparql"}
+
+
+def test_missing_items_stay_missing():
+    for resolver in (
+        WikidataResolver(StubEndpoints()),
+        SparqlWikidataResolver(StubEndpoints(), endpoint=SPARQL_ENDPOINT),
+    ):
+        with pytest.raises(KeyError):
+            resolver.get_entity("Q999999")
@@ -0,0 +1,162 @@
+"""
+Table-driven transliteration shared by the geography scripts.
+
+Every rule lives in a ``str.translate`` table built once at import, so folding
+a name is a single pass whatever the number of rules:
+
+``LATIN_TO_ASCII``
+    Bosnian/Croatian Latin (``đ`` -> ``dj``), Serbian Cyrillic, the EU
+    letters Unicode does not decompose (``ł``, ``ø``, ``æ``, ``ß`` ...) and
+    every decomposable Latin diacritic (``ţ``, ``ő``, ``ą`` ...), plus
+    typographic dashes, quotes and spaces.
+``GERMAN_TO_ASCII``
+    The same with German umlauts expanded (``ü`` -> ``ue``).
+``GERMAN_UMLAUTS``
+    Only the umlaut expansion; EU slugs keep every other letter because
+    published city ids such as ``it-forlì`` are foreign keys.
+``CYRILLIC_TO_LATIN``
+    Serbian Cyrillic to Gaj's Latin alphabet, keeping diacritics, for
+    display labels (``Бијељина`` -> ``Bijeljina``).
+
+``search_folds`` combines them into the spellings a user might type, so
+autocomplete keys match "sir" to "Široki" and "duss"/"duess" to "Düsseldorf".
+"""
+
+from __future__ import annotations
+
+import re
+import unicodedata
+from typing import Dict, List
+
+BOSNIAN_LATIN_MAP = {
+    "Đ": "Dj",
+    "đ": "dj",
+}
+
+GERMAN_CHAR_MAP = {
+    "ä": "ae",
+    "ö": "oe",
+    "ü": "ue",
+    "ß": "ss",
+    "Ä": "ae",
+    "Ö": "oe",
+    "Ü": "ue",
+}
+
+# Letters with no Unicode decomposition, so NFKD leaves them alone.
+EU_LETTER_MAP = {
+    "Æ": "AE",
+    "æ": "ae",
+    "Œ": "OE",
+    "œ": "oe",
+    "Ø": "O",
+    "ø": "o",
+    "Ł": "L",
+    "ł": "l",
+    "Ħ": "H",
+    "ħ": "h",
+    "Ð": "D",
+    "ð": "d",
+    "Þ": "Th",
+    "þ": "th",
+    "ı": "i",
+    "Ŀ": "L",
+    "ŀ": "l",
+    "ß": "ss",
+    "ẞ": "SS",
+}
+
+PUNCTUATION_MAP = {
+    "\u00a0": " ",  # no-break space
+    "\u2010": "-",  # hyphen
+    "\u2011": "-",  # non-breaking hyphen
+    "\u2012": "-",  # figure dash
+    "\u2013": "-",  # en dash
+    "\u2014": "-",  # em dash
+    "\u2018": "'",
+    "\u2019": "'",
+    "\u201c": '"',
+    "\u201d": '"',
+}
+
+SERBIAN_CYRILLIC_MAP = {
+    "А": "A", "Б": "B", "В": "V", "Г": "G", "Д": "D", "Ђ": "Đ", "Е": "E", "Ж": "Ž",
+    "З": "Z", "И": "I", "Ј": "J", "К": "K", "Л": "L", "Љ": "Lj", "М": "M", "Н": "N",
+    "Њ": "Nj", "О": "O", "П": "P", "Р": "R", "С": "S", "Т": "T", "Ћ": "Ć", "У": "U",
+    "Ф": "F", "Х": "H", "Ц": "C", "Ч": "Č", "Џ": "Dž", "Ш": "Š",
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "ђ": "đ", "е": "e", "ж": "ž",
+    "з": "z", "и": "i", "ј": "j", "к": "k", "л": "l", "љ": "lj", "м": "m", "н": "n",
+    "њ": "nj", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "ћ": "ć", "у": "u",
+    "ф": "f", "х": "h", "ц": "c", "ч": "č", "џ": "dž", "ш": "š",
+}  # fmt: skip
+
+# Latin-1 Supplement, Latin Extended-A/B and Latin Extended Additional.
+_LATIN_RANGES = ((0x00C0, 0x0250), (0x1E00, 0x1F00))
+_CYRILLIC = re.compile("[\u0400-\u04ff]")
+_NON_ALNUM = re.compile(r"[\W_]+")
+_NON_ASCII_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def _decomposed_latin() -> Dict[str, str]:
+    mapping = {}
+    for start, stop in _LATIN_RANGES:
+        for code in range(start, stop):
+            char = chr(code)
+            base = "".join(c for c in unicodedata.normalize("NFKD", char) if not unicodedata.combining(c))
+            if base and base != char and base.isascii():
+                mapping[char] = base
+    return mapping
+
+
+def _build_ascii_map(*layers: Dict[str, str]) -> Dict[str, str]:
+    mapping: Dict[str, str] = {}
+    for layer in (_decomposed_latin(), EU_LETTER_MAP, BOSNIAN_LATIN_MAP, PUNCTUATION_MAP, *layers):
+        mapping.update(layer)
+    # Cyrillic goes through Gaj's Latin first, then through the Latin rules.
+    for cyrillic, latin in SERBIAN_CYRILLIC_MAP.items():
+        mapping[cyrillic] = "".join(mapping.get(char, char) for char in latin)
+    return mapping
+
+
+def _capitalized(mapping: Dict[str, str]) -> Dict[str, str]:
+    # GERMAN_CHAR_MAP folds capitals to lowercase for slugs; keep case here.
+    return {char: value.capitalize() if char.isupper() else value for char, value in mapping.items()}
+
+
+LATIN_TO_ASCII = str.maketrans(_build_ascii_map())
+GERMAN_TO_ASCII = str.maketrans(_build_ascii_map(_capitalized(GERMAN_CHAR_MAP)))
+GERMAN_UMLAUTS = str.maketrans(GERMAN_CHAR_MAP)
+CYRILLIC_TO_LATIN = str.maketrans(SERBIAN_CYRILLIC_MAP)
+
+
+def to_ascii(value: str, german: bool = False) -> str:
+    """Fold ``value`` to ASCII letters; ``german`` expands umlauts (ü -> ue)."""
+    return value.translate(GERMAN_TO_ASCII if german else LATIN_TO_ASCII)
+
+
+def to_latin(value: str) -> str:
+    """Serbian Cyrillic to Latin script; other text is returned unchanged."""
+    return value.translate(CYRILLIC_TO_LATIN)
+
+
+def contains_cyrillic(value: str) -> bool:
+    return _CYRILLIC.search(value) is not None
+
+
+def fold_german(value: str) -> str:
+    return value.translate(GERMAN_UMLAUTS)
+
+
+def ascii_slug(value: str) -> str:
+    """Lowercase ``a-z0-9`` words joined by dashes (BiH slugs and codes)."""
+    return _NON_ASCII_ALNUM.sub("-", to_ascii(value).lower()).strip("-")
+
+
+def unicode_slug(value: str) -> str:
+    """German umlauts expanded, other letters kept, words joined by dashes (EU slugs)."""
+    return _NON_ALNUM.sub("-", fold_german(value).lower()).strip("-")
+
+
+def search_folds(value: str) -> List[str]:
+    """Distinct lowercase ASCII spellings of ``value`` for search keys."""
+    return list(dict.fromkeys([to_ascii(value, german=True).lower(), to_ascii(value).lower()]))
@@ -0,0 +1,316 @@
+"""
+Declarative extraction of Wikipedia tables.
+
+A ``TableSpec`` names the columns to pull out of a rendered wikitable: each
+``Column`` is found by a header pattern (``header``, matched case-insensitively
+against the header text, so the same spec works on bs/hr/de pages with
+different column orders) or by position (``index``), and turns the cell into
+a value (``text``, ``link_title``, ``link_slug`` or any callable) that is
+optionally run through ``parse`` (e.g. ``parse_numeric_int``). ``row_fields``
+derive values from the row itself, such as the background colour that marks
+official cities on the BiH list.
+
+Tables are parsed with lxml (libxml2, ``pip install lxml``) when it is installed and with
+BeautifulSoup's ``html.parser`` otherwise. ``rowspan``/``colspan`` are
+expanded into a full grid first, so a cell spanning several rows is seen by
+each of them and later cells keep their column. Footnote markers, hidden
+sort keys, comments and inline styles are dropped before text is read.
+
+``extract_table`` handles one page's HTML; ``fetch_tables`` downloads and
+parses many pages through ``HttpClient.map``, so parsing overlaps with the
+network (lxml releases the GIL while it parses).
+
+Numbers use the dot-thousands, comma-decimal style of the bs/hr/sr/de
+Wikipedias (``parse_numeric_int``/``parse_numeric_float``).
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    from lxml import etree
+except ImportError:  # pragma: no cover - optional dependency
+    etree = None
+
+try:
+    from bs4 import BeautifulSoup, Comment
+except ImportError:  # pragma: no cover - optional dependency
+    BeautifulSoup = None
+
+AVAILABLE = etree is not None
+DROP_CLASSES = ("reference", "sortkey", "mw-editsection")
+MAX_SPAN = 1000
+_SPAN = re.compile(r"\s*(\d+)")
+
+
+def parse_numeric_int(text: str) -> Optional[int]:
+    cleaned = text.split("(")[0].strip()
+    if not cleaned:
+        return None
+    cleaned = (
+        cleaned.replace(".", "")
+        .replace(",", "")
+        .replace(" ", "")
+        .replace("\xa0", "")
+        .replace("\u00a0", "")
+    )
+    return int(cleaned) if cleaned.isdigit() else None
+
+
+def parse_numeric_float(text: str) -> Optional[float]:
+    cleaned = text.split("(")[0].strip()
+    if not cleaned:
+        return None
+    cleaned = (
+        cleaned.replace(".", "")
+        .replace(" ", "")
+        .replace("\xa0", "")
+        .replace("\u00a0", "")
+        .replace(",", ".")
+    )
+    try:
+        return float(cleaned)
+    except ValueError:
+        return None
+
+
+@dataclass
+class Cell:
+    text: str
+    link_title: Optional[str] = None
+    link_href: Optional[str] = None
+    header: bool = False
+
+
+@dataclass
+class Row:
+    cells: List[Optional[Cell]]
+    attrs: Dict[str, str]
+
+
+def text(cell: Cell) -> str:
+    return cell.text
+
+
+def link_title(cell: Cell) -> str:
+    """Title of the cell's first link, or its text when it has none."""
+    return cell.link_title or cell.text
+
+
+def link_slug(cell: Cell) -> Optional[str]:
+    """Page slug of the cell's first ``/wiki/`` link."""
+    if cell.link_href and cell.link_href.startswith("/wiki/"):
+        return cell.link_href.split("/wiki/")[1]
+    return None
+
+
+def row_background(color: str) -> Callable[[Row], bool]:
+    """Row field: whether the row's ``bgcolor`` (or inline background) is ``color``."""
+    color = color.lower()
+
+    def matches(row: Row) -> bool:
+        if row.attrs.get("bgcolor", "").lower() == color:
+            return True
+        return re.search(rf"background(-color)?\s*:\s*{re.escape(color)}\b", row.attrs.get("style", "").lower()) is not None
+
+    return matches
+
+
+@dataclass(frozen=True)
+class Column:
+    name: str
+    index: Optional[int] = None
+    header: Optional[str] = None
+    value: Callable[[Cell], Any] = text
+    parse: Optional[Callable[[Any], Any]] = None
+
+
+@dataclass(frozen=True)
+class TableSpec:
+    columns: Tuple[Column, ...]
+    row_fields: Dict[str, Callable[[Row], Any]] = field(default_factory=dict)
+    table_class: str = "wikitable"
+    table_index: int = 0
+
+
+def _require_parser() -> None:
+    if etree is None and BeautifulSoup is None:
+        raise RuntimeError("Wikipedia table extraction needs lxml: pip install lxml")
+
+
+def _span(value: Optional[str]) -> int:
+    if not value or value == "1":
+        return 1
+    digits = _SPAN.match(value)
+    if not digits:
+        return 1
+    span = int(digits.group(1))
+    return MAX_SPAN if span == 0 else min(span, MAX_SPAN)
+
+
+RawRow = Tuple[Dict[str, str], List[Tuple[Cell, int, int]]]
+
+_CLASS_TEST = "contains(concat(' ', normalize-space(@class), ' '), ' {} ')"
+_DROP_XPATH = " | ".join([".//style", *(f".//*[@class][{_CLASS_TEST.format(name)}]" for name in DROP_CLASSES)])
+
+
+def _lxml_cell(element: Any) -> Cell:
+    if len(element) == 0:  # plain text cell, the common case for numbers
+        return Cell((element.text or "").strip(), header=element.tag == "th")
+    link = element.find(".//a")
+    return Cell(
+        text=" ".join(part.strip() for part in element.itertext() if part.strip()),
+        link_title=link.get("title") if link is not None else None,
+        link_href=link.get("href") if link is not None else None,
+        header=element.tag == "th",
+    )
+
+
+def _lxml_tables(html: str, table_class: str) -> List[Any]:
+    if not html.strip():
+        return []
+    root = etree.fromstring(html, etree.HTMLParser())
+    if root is None:
+        return []
+    return root.xpath(f"//table[{_CLASS_TEST.format(table_class)}]")
+
+
+def _lxml_rows(table: Any) -> Iterator[RawRow]:
+    # Emptied rather than removed so their tail text stays a separate string;
+    # comments are already skipped by itertext().
+    for element in table.xpath(_DROP_XPATH):
+        element.clear(keep_tail=True)
+    for tr in table.xpath("./tr | ./thead/tr | ./tbody/tr | ./tfoot/tr"):
+        cells = [
+            (_lxml_cell(cell), _span(cell.get("rowspan")), _span(cell.get("colspan")))
+            for cell in tr
+            if cell.tag in ("td", "th")
+        ]
+        yield dict(tr.attrib), cells
+
+
+def _bs4_cell(element: Any) -> Cell:
+    link = element.find("a")
+    return Cell(
+        text=element.get_text(" ", strip=True),
+        link_title=link.get("title") if link else None,
+        link_href=link.get("href") if link else None,
+        header=element.name == "th",
+    )
+
+
+def _bs4_tables(html: str, table_class: str) -> List[Any]:
+    return BeautifulSoup(html, "html.parser").find_all("table", class_=table_class)
+
+
+def _bs4_rows(table: Any) -> Iterator[RawRow]:
+    for comment in table.find_all(string=lambda value: isinstance(value, Comment)):
+        comment.extract()
+    for element in table.find_all("style") + table.find_all(class_=list(DROP_CLASSES)):
+        element.decompose()
+    for tr in table.find_all("tr"):
+        if tr.find_parent("table") is not table:
+            continue
+        cells = [
+            (_bs4_cell(cell), _span(cell.get("rowspan")), _span(cell.get("colspan")))
+            for cell in tr.find_all(["td", "th"], recursive=False)
+        ]
+        yield {key: " ".join(value) if isinstance(value, list) else value for key, value in tr.attrs.items()}, cells
+
+
+def expand_spans(raw_rows: Iterable[RawRow]) -> List[Row]:
+    """Lay rows out on a grid, repeating rowspan/colspan cells into every slot they cover."""
+    rows: List[Row] = []
+    carried: Dict[int, Tuple[Cell, int]] = {}  # column -> (cell, rows still covered)
+    for attrs, cells in raw_rows:
+        placed: Dict[int, Cell] = {column: cell for column, (cell, _) in carried.items()}
+        carried = {column: (cell, left - 1) for column, (cell, left) in carried.items() if left > 1}
+        column = 0
+        for cell, rowspan, colspan in cells:
+            while column in placed:
+                column += 1
+            for offset in range(colspan):
+                placed[column + offset] = cell
+                if rowspan > 1:
+                    carried[column + offset] = (cell, rowspan - 1)
+            column += colspan
+        width = max(placed) + 1 if placed else 0
+        rows.append(Row([placed.get(index) for index in range(width)], attrs))
+    return rows
+
+
+def _is_header(row: Row) -> bool:
+    cells = [cell for cell in row.cells if cell is not None]
+    return bool(cells) and all(cell.header for cell in cells)
+
+
+def _column_indexes(spec: TableSpec, headers: List[str]) -> List[Optional[int]]:
+    indexes = []
+    for column in spec.columns:
+        position = None
+        if column.header and headers:
+            pattern = re.compile(column.header, re.IGNORECASE)
+            position = next((index for index, title in enumerate(headers) if pattern.search(title)), None)
+        indexes.append(position if position is not None else column.index)
+    return indexes
+
+
+def table_rows(html: str, spec: TableSpec) -> Optional[List[Row]]:
+    """The spec's table as a span-expanded grid, or None when the page has no such table."""
+    _require_parser()
+    tables, rows_of = (
+        (_lxml_tables(html, spec.table_class), _lxml_rows)
+        if etree is not None
+        else (_bs4_tables(html, spec.table_class), _bs4_rows)
+    )
+    if len(tables) <= spec.table_index:
+        return None
+    return expand_spans(rows_of(tables[spec.table_index]))
+
+
+def extract_table(html: str, spec: TableSpec) -> Optional[List[Dict[str, Any]]]:
+    """One dict per data row with the spec's columns and row fields, or None without a table."""
+    grid = table_rows(html, spec)
+    if grid is None:
+        return None
+    is_header = [_is_header(row) for row in grid]
+    header_rows = [row for row, header in zip(grid, is_header) if header]
+    width = max((len(row.cells) for row in header_rows), default=0)
+    headers = [
+        " ".join(
+            dict.fromkeys(row.cells[index].text for row in header_rows if index < len(row.cells) and row.cells[index])
+        )
+        for index in range(width)
+    ]
+    indexes = _column_indexes(spec, headers)
+
+    records = []
+    for row, header in zip(grid, is_header):
+        if header or not any(row.cells):
+            continue
+        record: Dict[str, Any] = {}
+        for column, index in zip(spec.columns, indexes):
+            cell = row.cells[index] if index is not None and index < len(row.cells) else None
+            value = column.value(cell) if cell is not None else None
+            record[column.name] = column.parse(value) if column.parse and value is not None else value
+        for name, derive in spec.row_fields.items():
+            record[name] = derive(row)
+        records.append(record)
+    return records
+
+
+def fetch_tables(client: Any, api_url: str, pages: Sequence[str], spec: TableSpec) -> Dict[str, Optional[List[Dict[str, Any]]]]:
+    """
+    Render ``pages`` through the MediaWiki parse API and extract the spec's
+    table from each, in parallel on the client's pool. Pages without the
+    table map to None.
+    """
+
+    def fetch_and_extract(page: str) -> Optional[List[Dict[str, Any]]]:
+        html = client.get_json(api_url, {"action": "parse", "page": page, "prop": "text", "format": "json"})
+        return extract_table(html["parse"]["text"]["*"], spec)
+
+    return dict(zip(pages, client.map(fetch_and_extract, pages)))
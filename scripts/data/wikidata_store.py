@@ -0,0 +1,242 @@
+"""
+Compact, persistent store of the Wikidata entity facts the resolvers read.
+
+``EntityRecord`` keeps only what ``WikidataResolver`` uses: labels in the
+requested languages, P31 and P131 targets (numeric ids in ``array("I")``,
+in statement order) and the first P625 coordinate. Raw ``wbgetentities``
+entities are reduced to records as soon as a chunk arrives, so the claims
+JSON is never held for the whole run.
+
+``EntityStore`` keeps records in an SQLite file (``wikidata_entities.sqlite3``
+in the HTTP cache directory) with a small in-memory LRU in front, so repeat
+runs start warm and every fetcher that uses the same cache directory shares
+it. Rows are namespaced by resolver and label languages (wbgetentities and
+SPARQL order claims differently), and rows older than ``--cache-max-age``
+count as missing except in offline runs. Without a path the store lives in
+an in-memory SQLite database.
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from http_cache import DEFAULT_FRESH_SECONDS
+
+STORE_FILENAME = "wikidata_entities.sqlite3"
+DEFAULT_MEMORY_ENTRIES = 4096
+QUERY_BATCH = 500  # stays under SQLite's bound-parameter limit
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entities (
+    namespace TEXT NOT NULL,
+    qid TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    types TEXT NOT NULL,
+    parents TEXT NOT NULL,
+    latitude REAL,
+    longitude REAL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (namespace, qid)
+) WITHOUT ROWID
+"""
+
+
+def _claim_ids(entity: Dict[str, Any], prop: str) -> array:
+    ids = array("I")
+    for claim in entity.get("claims", {}).get(prop, []):
+        target = claim.get("mainsnak", {}).get("datavalue", {}).get("value", {}).get("id")
+        if target and target[1:].isdigit():
+            ids.append(int(target[1:]))
+    return ids
+
+
+def _qids(ids: array) -> List[str]:
+    return [f"Q{number}" for number in ids]
+
+
+class EntityRecord:
+    __slots__ = ("qid", "labels", "types", "parents", "latitude", "longitude")
+
+    def __init__(
+        self,
+        qid: str,
+        labels: Tuple[Tuple[str, str], ...],
+        types: array,
+        parents: array,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None,
+    ):
+        self.qid = qid
+        self.labels = labels  # (language, label) pairs in response order
+        self.types = types
+        self.parents = parents
+        self.latitude = latitude
+        self.longitude = longitude
+
+    @classmethod
+    def from_entity(cls, qid: str, entity: Dict[str, Any]) -> "EntityRecord":
+        """Reduce a ``wbgetentities``-shaped entity to the facts the resolver reads."""
+        labels = tuple((lang, data["value"]) for lang, data in entity.get("labels", {}).items())
+        latitude = longitude = None
+        coordinates = entity.get("claims", {}).get("P625", [])
+        if coordinates:
+            value = coordinates[0].get("mainsnak", {}).get("datavalue", {}).get("value")
+            if value:
+                latitude, longitude = value.get("latitude"), value.get("longitude")
+        return cls(qid, labels, _claim_ids(entity, "P31"), _claim_ids(entity, "P131"), latitude, longitude)
+
+    @classmethod
+    def from_row(cls, row: Sequence[Any]) -> "EntityRecord":
+        qid, labels, types, parents, latitude, longitude = row
+        return cls(
+            qid,
+            tuple(tuple(pair) for pair in json.loads(labels)),
+            array("I", (int(value) for value in types.split())),
+            array("I", (int(value) for value in parents.split())),
+            latitude,
+            longitude,
+        )
+
+    def to_row(self) -> Tuple[Any, ...]:
+        return (
+            self.qid,
+            json.dumps(self.labels, ensure_ascii=False, separators=(",", ":")),
+            " ".join(map(str, self.types)),
+            " ".join(map(str, self.parents)),
+            self.latitude,
+            self.longitude,
+        )
+
+    def label_map(self) -> Dict[str, str]:
+        return dict(self.labels)
+
+    def type_ids(self) -> List[str]:
+        return _qids(self.types)
+
+    def parent_ids(self) -> List[str]:
+        return _qids(self.parents)
+
+
+class EntityStore:
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        namespace: str = "",
+        *,
+        memory_entries: int = DEFAULT_MEMORY_ENTRIES,
+        max_age_seconds: Optional[float] = DEFAULT_FRESH_SECONDS,
+    ):
+        self.path = path
+        self.namespace = namespace
+        self.memory_entries = max(1, memory_entries)
+        self.max_age_seconds = max_age_seconds
+        self.memory_hits = 0
+        self.disk_reads = 0
+        self._memory: "OrderedDict[str, EntityRecord]" = OrderedDict()
+        self._lock = threading.Lock()
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path) if path is not None else ":memory:", check_same_thread=False)
+        self._db.execute("PRAGMA busy_timeout = 30000")
+        if path is not None:
+            self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute(SCHEMA)
+        self._db.commit()
+
+    def _oldest(self) -> float:
+        return time.time() - self.max_age_seconds if self.max_age_seconds is not None else float("-inf")
+
+    def _remember(self, record: EntityRecord) -> None:
+        self._memory[record.qid] = record
+        self._memory.move_to_end(record.qid)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _select(self, columns: str, qids: Sequence[str]) -> List[Tuple[Any, ...]]:
+        rows: List[Tuple[Any, ...]] = []
+        for start in range(0, len(qids), QUERY_BATCH):
+            batch = qids[start : start + QUERY_BATCH]
+            rows += self._db.execute(
+                f"SELECT {columns} FROM entities WHERE namespace = ? AND fetched_at >= ? "
+                f"AND qid IN ({', '.join('?' * len(batch))})",
+                (self.namespace, self._oldest(), *batch),
+            ).fetchall()
+        return rows
+
+    def get(self, qid: str) -> Optional[EntityRecord]:
+        with self._lock:
+            record = self._memory.get(qid)
+            if record is not None:
+                self._memory.move_to_end(qid)
+                self.memory_hits += 1
+                return record
+            rows = self._select("qid, labels, types, parents, latitude, longitude", [qid])
+            if not rows:
+                return None
+            record = EntityRecord.from_row(rows[0])
+            self.disk_reads += 1
+            self._remember(record)
+            return record
+
+    def __contains__(self, qid: str) -> bool:
+        return not self.missing([qid])
+
+    def missing(self, qids: Iterable[str]) -> List[str]:
+        """The ``qids`` without a current record, in order."""
+        with self._lock:
+            wanted = [qid for qid in dict.fromkeys(qids) if qid not in self._memory]
+            stored = {row[0] for row in self._select("qid", wanted)}
+        return [qid for qid in wanted if qid not in stored]
+
+    def put_many(self, records: Iterable[EntityRecord]) -> int:
+        records = list(records)
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO entities "
+                "(namespace, qid, labels, types, parents, latitude, longitude, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(self.namespace, *record.to_row(), now) for record in records],
+            )
+            self._db.commit()
+            for record in records:
+                self._remember(record)
+        return len(records)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM entities WHERE namespace = ? AND fetched_at >= ?",
+                (self.namespace, self._oldest()),
+            ).fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def summary(self) -> str:
+        if self.path is None:
+            return f"{self.memory_hits} entity lookups (in-memory store)"
+        return f"{self.memory_hits} entity lookups from memory, {self.disk_reads} from {self.path}"
+
+
+def entity_store_from_args(args: Any, namespace: str) -> EntityStore:
+    """
+    Store next to the HTTP cache; ``--no-cache`` keeps it in memory. Records
+    are refetched after ``--cache-max-age`` hours, like cached responses are
+    revalidated; ``--offline`` ignores age.
+    """
+    if getattr(args, "no_cache", False) or getattr(args, "cache_dir", None) is None:
+        return EntityStore(None, namespace)
+    if getattr(args, "offline", False):
+        max_age = None
+    else:
+        max_age = getattr(args, "cache_max_age", DEFAULT_FRESH_SECONDS / 3600) * 3600
+    return EntityStore(Path(args.cache_dir) / STORE_FILENAME, namespace, max_age_seconds=max_age)